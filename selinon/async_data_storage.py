@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Asynchronous (asyncio) data storage interface."""
+
+import abc
+import asyncio
+from contextlib import nullcontext
+import functools
+
+
+class AsyncDataStorage(metaclass=abc.ABCMeta):
+    """Abstract asynchronous Selinon storage adapter, see DataStorage for semantics of methods."""
+
+    @abc.abstractmethod
+    async def connect(self):
+        """Connect to a resource, if not needed, should be empty."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def is_connected(self):
+        """Check storage connection status.
+
+        :return: True if connected to a resource
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def disconnect(self):
+        """Disconnect from a resource."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def retrieve(self, flow_name, task_name, task_id):
+        """Retrieve result stored in storage.
+
+        :param flow_name: flow name in which task was executed
+        :param task_name: task name that result is going to be retrieved
+        :param task_id: id of the task that result is going to be retrieved
+        :return: task result
+        """
+        raise NotImplementedError()
+
+    async def retrieve_many(self, flow_name, task_name, task_ids):
+        """Retrieve results of multiple tasks, override to retrieve all results in one storage operation.
+
+        :param flow_name: flow name in which tasks were executed
+        :param task_name: task name that results are going to be retrieved
+        :param task_ids: a list of ids of tasks that results are going to be retrieved
+        :return: a list of task results in the same order as task_ids
+        """
+        return list(await asyncio.gather(*(self.retrieve(flow_name, task_name, task_id) for task_id in task_ids)))
+
+    @abc.abstractmethod
+    async def store(self, node_args, flow_name, task_name, task_id, result):  # pylint: disable=too-many-arguments
+        """Store result stored in storage.
+
+        :param node_args: arguments that were passed to node
+        :param flow_name: flow name in which task was executed
+        :param task_name: task name that result is going to be stored
+        :param task_id: id of the task that result is going to be stored
+        :param result: result that should be stored
+        :return: unique ID of stored record
+        """
+        raise NotImplementedError()
+
+    async def delete(self, flow_name, task_name, task_id):
+        """Delete result stored in storage.
+
+        :param flow_name: flow name in which task was executed
+        :param task_name: task name that result is going to be retrieved
+        :param task_id: id of the task that result is going to be retrieved
+        """
+        raise NotImplementedError("delete method is not implemented")
+
+
+class ExecutorDataStorage(AsyncDataStorage):
+    """Asynchronous wrapper of a blocking DataStorage - blocking calls are run in an executor."""
+
+    def __init__(self, storage, lock=None, executor=None):
+        """Wrap a blocking storage adapter.
+
+        :param storage: DataStorage instance to be wrapped
+        :param lock: lock serializing calls on the wrapped storage, if the storage is not thread-safe
+        :param executor: concurrent.futures executor to run blocking calls in, asyncio's default if None
+        """
+        self.storage = storage
+        self._lock = lock
+        self._executor = executor
+
+    def _call(self, method, *args):
+        """Call a method of the wrapped storage while holding the lock, if any.
+
+        :param method: method of the wrapped storage
+        :param args: arguments of the method
+        :return: value returned by the method
+        """
+        with self._lock or nullcontext():
+            return method(*args)
+
+    async def _run(self, method, *args):
+        """Run a method of the wrapped storage in the executor.
+
+        :param method: method of the wrapped storage
+        :param args: arguments of the method
+        :return: value returned by the method
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, method, *args))
+
+    async def connect(self):  # noqa
+        await self._run(self.storage.connect)
+
+    def is_connected(self):  # noqa
+        return self.storage.is_connected()
+
+    async def disconnect(self):  # noqa
+        await self._run(self.storage.disconnect)
+
+    async def retrieve(self, flow_name, task_name, task_id):  # noqa
+        return await self._run(self.storage.retrieve, flow_name, task_name, task_id)
+
+    async def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        return await self._run(self.storage.retrieve_many, flow_name, task_name, task_ids)
+
+    async def store(self, node_args, flow_name, task_name, task_id, result, **kwargs):  # noqa
+        # pylint: disable=arguments-differ
+        # additional keyword arguments (e.g. dispatcher_id) are passed to storages that accept them
+        store = functools.partial(self.storage.store, **kwargs)
+        return await self._run(store, node_args, flow_name, task_name, task_id, result)
+
+    async def delete(self, flow_name, task_name, task_id):  # noqa
+        return await self._run(self.storage.delete, flow_name, task_name, task_id)
@@ -83,6 +83,30 @@ class NaryPredicate(BuiltinPredicate, metaclass=abc.ABCMeta):  # pylint: disable
         """
         return reduce(lambda x, y: x + y.nodes_used(), self._children, [])
 
+    def nodes_inspected(self):
+        """Compute nodes which results are inspected (transitively).
+
+        :return: list of nodes which results are inspected
+        :rtype: List[Node]
+        """
+        return reduce(lambda x, y: x + y.nodes_inspected(), self._children, [])
+
+    def cost(self):
+        """Compute cost class of this predicate - the most expensive child is considered.
+
+        :return: cost class of this predicate
+        :rtype: int
+        """
+        return max(child.cost() for child in self._children)
+
+    def reorder_by_cost(self):
+        """Create an equivalent predicate with children ordered by their cost, the order of equal children is kept.
+
+        :return: predicate with cheap children evaluated first
+        """
+        return self.__class__(sorted((child.reorder_by_cost() for child in self._children),
+                                     key=lambda child: child.cost()))
+
     def check(self):
         """Check predicate for consistency."""
         for child in self._children:
@@ -139,6 +163,29 @@ class UnaryPredicate(BuiltinPredicate, metaclass=abc.ABCMeta):  # pylint: disabl
         """
         return self._child.nodes_used()
 
+    def nodes_inspected(self):
+        """Compute all nodes which results are inspected (transitively) by child/children.
+
+        :return: list of nodes which results are inspected
+        :rtype: List[Node]
+        """
+        return self._child.nodes_inspected()
+
+    def cost(self):
+        """Compute cost class of this predicate.
+
+        :return: cost class of the child
+        :rtype: int
+        """
+        return self._child.cost()
+
+    def reorder_by_cost(self):
+        """Create an equivalent predicate with operands of logical operators in the child ordered by their cost.
+
+        :return: predicate with cheap operands evaluated first
+        """
+        return self.__class__(self._child.reorder_by_cost())
+
     def check(self):
         """Check predicate for consistency."""
         self._child.check()
@@ -278,6 +325,15 @@ class AlwaysTruePredicate(BuiltinPredicate):
     def nodes_used(self):  # noqa
         return []
 
+    def nodes_inspected(self):  # noqa
+        return []
+
+    def cost(self):  # noqa
+        return self.COST_NO_INPUT
+
+    def reorder_by_cost(self):  # noqa
+        return self
+
     def check(self):  # noqa
         """Check predicate for consistency."""
 
@@ -36,3 +36,36 @@ except ImportError:
         @staticmethod
         def retry(*args, **kwargs):
             raise _raise_import_exception()
+
+try:
+    from celery.exceptions import Ignore
+except ImportError:
+    class Ignore(Exception):
+        """Substitute Celery's Ignore exception - a task raising it does not update its state."""
+
+try:
+    from celery.exceptions import Retry
+except ImportError:
+    class Retry(Exception):
+        """Substitute Celery's Retry exception - raised by Task.retry() once the retry message is sent."""
+
+try:
+    from celery.backends.base import KeyValueStoreBackend
+except ImportError:
+    class KeyValueStoreBackend:
+        """Substitute Celery's key-value result backend - operations are not implemented unless overridden."""
+
+        def get(self, key):
+            raise NotImplementedError()
+
+        def mget(self, keys):
+            raise NotImplementedError()
+
+        def set(self, key, value):
+            raise NotImplementedError()
+
+        def delete(self, key):
+            raise NotImplementedError()
+
+        def incr(self, key):
+            raise NotImplementedError()
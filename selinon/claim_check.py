@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Claim-check storage of large payloads that would be otherwise sent in broker messages."""
+
+import json
+import traceback
+import uuid
+
+from .config import Config
+from .data_storage import SelinonMissingDataException
+from .global_config import GlobalConfig
+from .storage_pool import StoragePool
+from .trace import Trace
+
+
+class ClaimCheck:
+    """Claim-check storage of large payloads that would be otherwise sent in broker messages.
+
+    Payloads (dispatcher state and node arguments) which JSON representation exceeds the configured threshold are
+    stored in the configured storage and only a reference to the stored copy is sent in messages. Stored copies are
+    owned by the dispatcher that stored them and they are released by the owner once they are not needed anymore.
+    """
+
+    # Task name used when storing payloads in the configured storage.
+    TASK_NAME = GlobalConfig.CLAIM_CHECK_TASK_NAME
+
+    _REFERENCE_KEY = 'selinon_claim_check'
+
+    def __init__(self):
+        """Unused."""
+        raise NotImplementedError()
+
+    @staticmethod
+    def is_enabled():
+        """Check whether claim-check storage is configured.
+
+        :return: True if large payloads should be stored in the configured storage
+        """
+        return Config.claim_check_storage is not None
+
+    @classmethod
+    def is_reference(cls, value):
+        """Check whether the given value is a reference to a stored copy.
+
+        :param value: value as received in a message
+        :return: True if the value is a reference that needs to be resolved
+        """
+        return isinstance(value, dict) and cls._REFERENCE_KEY in value
+
+    @staticmethod
+    def _exceeds_threshold(payload):
+        """Check whether the payload is large enough to be stored instead of sent in a message.
+
+        :param payload: payload to check
+        :return: True if JSON representation of payload exceeds the configured threshold
+        """
+        try:
+            return len(json.dumps(payload)) > Config.claim_check_threshold
+        except (TypeError, ValueError):
+            # Not JSON serializable, leave it on the Celery serializer configured.
+            return False
+
+    @classmethod
+    def store(cls, dispatcher_id, flow_name, payload):
+        """Store the given payload if it exceeds the configured threshold.
+
+        :param dispatcher_id: id of dispatcher that owns the stored copy
+        :param flow_name: name of flow in which the payload is stored
+        :param payload: payload to store
+        :return: reference to the stored copy, None if the payload should be sent in the message as it is
+        """
+        if payload is None or not cls.is_enabled() or cls.is_reference(payload) \
+                or not cls._exceeds_threshold(payload):
+            return None
+
+        key = '%s-%s' % (dispatcher_id, uuid.uuid4())
+        storage = StoragePool.get_connected_storage(Config.claim_check_storage)
+        storage.store(None, flow_name, cls.TASK_NAME, key, payload)
+        Trace.log(Trace.CLAIM_CHECK_STORE, {
+            'flow_name': flow_name,
+            'dispatcher_id': dispatcher_id,
+            'storage_name': Config.claim_check_storage,
+            'key': key
+        })
+
+        return {cls._REFERENCE_KEY: key, 'flow_name': flow_name, 'owner': dispatcher_id}
+
+    @classmethod
+    def resolve(cls, value):
+        """Retrieve the stored copy if the given value is a reference.
+
+        :param value: value as received in a message
+        :return: payload the value refers to, the value itself if it is not a reference
+        :raises SelinonMissingDataException: if the stored copy was released or it expired
+        """
+        if not cls.is_reference(value):
+            return value
+
+        storage = StoragePool.get_connected_storage(Config.claim_check_storage)
+        key = value[cls._REFERENCE_KEY]
+        try:
+            return storage.retrieve(value['flow_name'], cls.TASK_NAME, key)
+        except (FileNotFoundError, SelinonMissingDataException) as exc:
+            raise SelinonMissingDataException("Stored copy '%s' not found in storage '%s', it was released or it "
+                                              "expired" % (key, Config.claim_check_storage)) from exc
+
+    @classmethod
+    def release(cls, value, owner):
+        """Remove the stored copy the given value refers to, if owned by the given dispatcher.
+
+        :param value: value as sent in a message
+        :param owner: id of dispatcher releasing the stored copy
+        """
+        if not cls.is_reference(value) or value['owner'] != owner:
+            return
+
+        trace_msg = {
+            'flow_name': value['flow_name'],
+            'dispatcher_id': owner,
+            'storage_name': Config.claim_check_storage,
+            'key': value[cls._REFERENCE_KEY]
+        }
+        try:
+            storage = StoragePool.get_connected_storage(Config.claim_check_storage)
+            storage.delete(value['flow_name'], cls.TASK_NAME, value[cls._REFERENCE_KEY])
+        except Exception:  # pylint: disable=broad-except
+            # Failing to remove a stored copy should not affect the flow.
+            Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+        else:
+            Trace.log(Trace.CLAIM_CHECK_RELEASE, trace_msg)
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Compilation of predicates into condition functions placed in the generated Python config."""
+
+import ast
+
+
+class ConditionCompiler:
+    """Compile a predicate into a condition function with common subexpressions eliminated.
+
+    Each result of a parent task (message) is retrieved from the storage pool once and bound to a local variable that
+    is shared by all predicates inspecting the same message. Key path lookups of built-in field predicates are shared
+    as well - a common key path prefix is looked up once and predicates inspect only the rest of their key path.
+
+    Values are bound lazily using assignment expressions where they are first used, so short-circuit evaluation of
+    the condition is preserved - a value is shared only with predicates that are always evaluated after the predicate
+    that binds the value.
+
+    Operands of logical operators are optionally reordered based on their cost so that checks which do not need any
+    task result are evaluated first and can short-circuit the rest of the condition.
+
+    If a task result is inspected only by built-in field predicates, only fields that are inspected are retrieved.
+
+    A built-in field predicate that is the only predicate inspecting a task result is evaluated using the storage
+    pool, so it can be pushed down to the storage if the storage supports it - the task result does not need to be
+    retrieved in such case.
+
+    Built-in predicates are inlined - key paths and arguments are known at compile time, so a specialized check with
+    direct subscripts is generated instead of calling the generic predicate implementation. Checks that can raise an
+    exception are placed into a helper function guarded by try/except as the generic implementation is. Custom
+    predicates are always called.
+    """
+
+    LOOKUP_FIELD_NAME = '_selinon_lookup_field'
+    ENVIRON_NAME = '_selinon_environ'
+    URLPARSE_NAME = '_selinon_urlparse'
+
+    # imports required by compiled conditions in the generated config - (import path, name, alias)
+    IMPORTS = (
+        ('selinon.routines', 'lookup_field', LOOKUP_FIELD_NAME),
+        ('os', 'environ', ENVIRON_NAME),
+        ('urllib.parse', 'urlparse', URLPARSE_NAME)
+    )
+
+    _MESSAGE_VAR = '_message_{}'
+    _FIELD_VAR = '_field_{}'
+
+    _PREDICATE_MODULE_PREFIX = 'selinon.predicates.'
+
+    # checks of whole inputs (messages or node arguments) that never raise, placed directly into the condition
+    _INPUT_CHECKS = {
+        'Bool': lambda value: ConditionCompiler._isinstance(value, 'bool'),
+        'Dict': lambda value: ConditionCompiler._isinstance(value, 'dict'),
+        'Float': lambda value: ConditionCompiler._isinstance(value, 'float'),
+        'Int': lambda value: ConditionCompiler._isinstance(value, 'int'),
+        'List': lambda value: ConditionCompiler._isinstance(value, 'list'),
+        'None': lambda value: ast.Compare(left=value, ops=[ast.Is()], comparators=[ast.Constant(value=None)]),
+        'Str': lambda value: ConditionCompiler._isinstance(value, 'str')
+    }
+
+    # checks of a field in an input, the value is retrieved using a key path
+    _FIELD_CHECKS = {
+        'Bool': lambda value, args: ConditionCompiler._isinstance(value, 'bool'),
+        'Contain': lambda value, args: ast.Compare(left=args['value'], ops=[ast.In()], comparators=[value]),
+        'Dict': lambda value, args: ConditionCompiler._isinstance(value, 'dict'),
+        'Equal': lambda value, args: ast.Compare(left=value, ops=[ast.Eq()], comparators=[args['value']]),
+        'Exist': None,
+        'Float': lambda value, args: ConditionCompiler._isinstance(value, 'float'),
+        'Greater': lambda value, args: ast.Compare(left=value, ops=[ast.Gt()], comparators=[args['value']]),
+        'GreaterEqual': lambda value, args: ast.Compare(left=value, ops=[ast.GtE()], comparators=[args['value']]),
+        'Int': lambda value, args: ConditionCompiler._isinstance(value, 'int'),
+        'LenEqual': lambda value, args: ConditionCompiler._len_compare(value, ast.Eq(), args),
+        'LenGreater': lambda value, args: ConditionCompiler._len_compare(value, ast.Gt(), args),
+        'LenGreaterEqual': lambda value, args: ConditionCompiler._len_compare(value, ast.GtE(), args),
+        'LenLess': lambda value, args: ConditionCompiler._len_compare(value, ast.Lt(), args),
+        'LenLessEqual': lambda value, args: ConditionCompiler._len_compare(value, ast.LtE(), args),
+        'LenNotEqual': lambda value, args: ConditionCompiler._len_compare(value, ast.NotEq(), args),
+        'Less': lambda value, args: ast.Compare(left=value, ops=[ast.Lt()], comparators=[args['value']]),
+        'LessEqual': lambda value, args: ast.Compare(left=value, ops=[ast.LtE()], comparators=[args['value']]),
+        'List': lambda value, args: ConditionCompiler._isinstance(value, 'list'),
+        'None': lambda value, args: ast.Compare(left=value, ops=[ast.Is()], comparators=[ast.Constant(value=None)]),
+        'NotEqual': lambda value, args: ast.Compare(left=value, ops=[ast.NotEq()], comparators=[args['value']]),
+        'Str': lambda value, args: ConditionCompiler._isinstance(value, 'str'),
+        'UrlNetloc': lambda value, args: ConditionCompiler._url_compare(value, 'netloc', args),
+        'UrlPath': lambda value, args: ConditionCompiler._url_compare(value, 'path', args),
+        'UrlScheme': lambda value, args: ConditionCompiler._url_compare(value, 'scheme', args)
+    }
+
+    # arguments of field checks in addition to the key path
+    _FIELD_CHECK_ARGS = {
+        'Contain': ('value',),
+        'Equal': ('value',),
+        'Greater': ('value',),
+        'GreaterEqual': ('value',),
+        'LenEqual': ('length',),
+        'LenGreater': ('length',),
+        'LenGreaterEqual': ('length',),
+        'LenLess': ('length',),
+        'LenLessEqual': ('length',),
+        'LenNotEqual': ('length',),
+        'Less': ('value',),
+        'LessEqual': ('value',),
+        'NotEqual': ('value',),
+        'UrlNetloc': ('netloc',),
+        'UrlPath': ('path',),
+        'UrlScheme': ('scheme',)
+    }
+
+    # families of built-in predicates that can be inlined - prefix of the predicate name and method inlining it
+    _INLINED_FAMILIES = (
+        ('always', '_inline_always'),
+        ('empty', '_inline_empty'),
+        ('env', '_inline_env'),
+        ('is', '_inline_input_check'),
+        ('field', '_inline_field_check')
+    )
+
+    _FIELD_CHECK_TEMPLATE = \
+        "def {}({}):\n" \
+        "    try:\n" \
+        "        return None\n" \
+        "    except Exception:\n" \
+        "        return False\n"
+
+    _STORAGE_POOL_EVALUATE = 'evaluate'
+    _STORAGE_POOL_GET_FIELDS = 'get_fields'
+
+    def __init__(self, predicate, reorder=True, inline=True, pushdown=True, projection=True):
+        """Instantiate the compiler.
+
+        :param predicate: predicate to be compiled
+        :type predicate: Predicate
+        :param reorder: reorder operands of logical operators based on their cost
+        :type reorder: bool
+        :param inline: inline built-in predicates
+        :type inline: bool
+        :param pushdown: let storages evaluate predicates which are the only ones inspecting a task result
+        :type pushdown: bool
+        :param projection: retrieve only fields of a task result if the result is inspected only by field predicates
+        :type projection: bool
+        """
+        self._predicate = predicate.reorder_by_cost() if reorder else predicate
+        self._inline = inline
+        self._pushdown = pushdown
+        self._projection = projection
+        self._name = None
+        self._leaves = []
+        self._helpers = []
+
+    @staticmethod
+    def _is_message_retrieval(node):
+        """Check whether the given AST node is a retrieval of a message - db.get('Task') or db.get_fields('Task', paths).
+
+        :param node: AST node to check
+        :return: True if the node retrieves a message from the storage pool
+        """
+        return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == 'db' \
+            and ((node.func.attr == 'get' and len(node.args) == 1)
+                 or (node.func.attr == ConditionCompiler._STORAGE_POOL_GET_FIELDS and len(node.args) == 2)) \
+            and isinstance(node.args[0], ast.Constant)
+
+    @staticmethod
+    def _dominates(path, other_path):
+        """Check whether a leaf is always evaluated before another leaf.
+
+        :param path: path to the first leaf in the condition
+        :param other_path: path to the other leaf in the condition, placed after the first one
+        :return: True if the first leaf is always evaluated before the other leaf
+        """
+        for idx, (item, other_item) in enumerate(zip(path, other_path)):
+            if item != other_item:
+                # both are operands of the same logical operator, the first leaf has to be the leftmost one
+                return item[0] == other_item[0] and item[1] < other_item[1] \
+                    and all(child_idx == 0 for _, child_idx in path[idx + 1:])
+
+        return False
+
+    def _collect_leaves(self, node, path):
+        """Collect predicate calls inspecting a message in the order in which they are evaluated.
+
+        :param node: AST node to inspect
+        :param path: path to the node - a tuple of logical operators and indexes of their operands
+        """
+        if isinstance(node, ast.BoolOp):
+            for idx, value in enumerate(node.values):
+                self._collect_leaves(value, path + ((id(node), idx),))
+        elif isinstance(node, ast.UnaryOp):
+            self._collect_leaves(node.operand, path + ((id(node), 0),))
+        elif isinstance(node, ast.Call):
+            keywords = {keyword.arg: keyword for keyword in node.keywords}
+            message = keywords.get('message')
+            if message is not None and self._is_message_retrieval(message.value):
+                self._leaves.append((path, node, keywords, message.value.args[0].value))
+
+    @staticmethod
+    def _group_leaves(leaves):
+        """Group predicate calls by tasks which results they inspect.
+
+        :param leaves: predicate calls as collected
+        :return: a list of groups, each group is a list of predicate calls in the order in which they are evaluated
+        """
+        groups = {}
+        for leaf in leaves:
+            groups.setdefault(leaf[3], []).append(leaf)
+
+        return list(groups.values())
+
+    def _message_keyword(self, keywords):
+        """Get keyword argument holding retrieval of a message in a predicate call.
+
+        :param keywords: keyword arguments of the predicate call
+        :return: keyword argument retrieving the message, None if the predicate does not retrieve the message anymore
+        """
+        keyword = keywords['message']
+        if isinstance(keyword.value, ast.NamedExpr):
+            # a field is looked up in the message, see _share_key_paths()
+            keyword = keyword.value.value.keywords[0]
+
+        return keyword if self._is_message_retrieval(keyword.value) else None
+
+    def _share_messages(self):
+        """Retrieve each message once and share it among predicates."""
+        leaves = [leaf for leaf in self._leaves if self._message_keyword(leaf[2]) is not None]
+
+        for idx, group in enumerate(self._group_leaves(leaves)):
+            (path, _, keywords, _), *others = group
+            others = [other for other in others if self._dominates(path, other[0])]
+            if not others:
+                continue
+
+            var_name = self._MESSAGE_VAR.format(idx)
+            message_keyword = self._message_keyword(keywords)
+            message_keyword.value = ast.NamedExpr(target=ast.Name(id=var_name, ctx=ast.Store()),
+                                                  value=message_keyword.value)
+            for _, _, other_keywords, _ in others:
+                self._message_keyword(other_keywords).value = ast.Name(id=var_name, ctx=ast.Load())
+
+    @staticmethod
+    def _get_key_path(keywords):
+        """Get key path inspected by a predicate.
+
+        :param keywords: keyword arguments of the predicate call
+        :return: key path as a list, None if the key path is not known at compile time
+        """
+        key = keywords.get('key')
+        if key is None or not isinstance(key.value, ast.Constant):
+            return None
+
+        return list(key.value.value) if isinstance(key.value.value, list) else [key.value.value]
+
+    @staticmethod
+    def _common_prefix(key_path, other_key_path):
+        """Compute common prefix of two key paths.
+
+        :param key_path: the first key path
+        :param other_key_path: the second key path
+        :return: common prefix of key paths
+        """
+        prefix = []
+        for item, other_item in zip(key_path, other_key_path):
+            if item != other_item:
+                break
+            prefix.append(item)
+
+        return prefix
+
+    def _share_key_paths(self, field_predicates):
+        """Look up common key path prefixes of built-in field predicates once.
+
+        :param field_predicates: names of predicates that look up their key path in the message
+        """
+        leaves = [leaf for leaf in self._leaves
+                  if isinstance(leaf[1].func, ast.Name) and leaf[1].func.id in field_predicates
+                  and self._get_key_path(leaf[2])]
+
+        var_idx = 0
+        for group in self._group_leaves(leaves):
+            while group:
+                (path, _, keywords, _), *group = group
+                key_path = self._get_key_path(keywords)
+                shared = [leaf for leaf in group if self._dominates(path, leaf[0])
+                          and self._common_prefix(key_path, self._get_key_path(leaf[2]))]
+                if not shared:
+                    continue
+
+                prefix = key_path
+                for leaf in shared:
+                    prefix = self._common_prefix(prefix, self._get_key_path(leaf[2]))
+
+                var_name = self._FIELD_VAR.format(var_idx)
+                var_idx += 1
+                lookup = ast.Call(func=ast.Name(id=self.LOOKUP_FIELD_NAME, ctx=ast.Load()), args=[],
+                                  keywords=[ast.keyword(arg='message', value=keywords['message'].value),
+                                            ast.keyword(arg='key', value=ast.Constant(value=prefix))])
+                keywords['message'].value = ast.NamedExpr(target=ast.Name(id=var_name, ctx=ast.Store()),
+                                                          value=lookup)
+
+                # the looked up value is wrapped in a tuple, the tuple is empty if the lookup failed
+                for leaf_keywords in [keywords] + [leaf[2] for leaf in shared]:
+                    rest = self._get_key_path(leaf_keywords)[len(prefix):]
+                    if leaf_keywords is not keywords:
+                        leaf_keywords['message'].value = ast.Name(id=var_name, ctx=ast.Load())
+                    leaf_keywords['key'].value = ast.Constant(value=[0] + rest)
+
+                group = [leaf for leaf in group if leaf not in shared]
+
+    def _field_predicates(self):
+        """Compute names of built-in field predicates used in the predicate.
+
+        :return: names of predicates that look up their key path in the message
+        """
+        return {func.__name__ for func in self._predicate.predicates_used()
+                if func.__module__.startswith(self._PREDICATE_MODULE_PREFIX) and func.__name__.startswith('field')}
+
+    @staticmethod
+    def _isinstance(value, type_name):
+        """Construct isinstance() check.
+
+        :param value: AST of the value to be checked
+        :param type_name: name of the type to check against
+        :return: AST of the check
+        """
+        return ast.Call(func=ast.Name(id='isinstance', ctx=ast.Load()),
+                        args=[value, ast.Name(id=type_name, ctx=ast.Load())], keywords=[])
+
+    @staticmethod
+    def _len_compare(value, operator, args):
+        """Construct comparison of length of a value.
+
+        :param value: AST of the value which length should be compared
+        :param operator: AST of the comparison operator
+        :param args: arguments of the predicate
+        :return: AST of the check
+        """
+        length = ast.Call(func=ast.Name(id='len', ctx=ast.Load()), args=[value], keywords=[])
+        return ast.Compare(left=length, ops=[operator], comparators=[args['length']])
+
+    @classmethod
+    def _url_compare(cls, value, attr, args):
+        """Construct comparison of a part of URL.
+
+        :param value: AST of URL
+        :param attr: part of URL (attribute of parsed URL) to be compared
+        :param args: arguments of the predicate
+        :return: AST of the check
+        """
+        parsed = ast.Call(func=ast.Name(id=cls.URLPARSE_NAME, ctx=ast.Load()), args=[value], keywords=[])
+        return ast.Compare(left=ast.Attribute(value=parsed, attr=attr, ctx=ast.Load()),
+                           ops=[ast.Eq()], comparators=[args[attr]])
+
+    @staticmethod
+    def _get_constant_args(call):
+        """Get arguments of a predicate call if they are known at compile time.
+
+        :param call: AST of the predicate call
+        :return: a dict of keyword arguments, None if any of arguments is not known at compile time
+        """
+        args = {}
+        for keyword in call.keywords:
+            if keyword.arg in ('message', 'node_args'):
+                continue
+            if not isinstance(keyword.value, ast.Constant):
+                return None
+            args[keyword.arg] = keyword.value
+
+        return args
+
+    @staticmethod
+    def _inline_always(check, input_name, input_value, args):
+        # pylint: disable=unused-argument
+        """Inline a predicate with constant result.
+
+        :param check: result of the predicate - True or False
+        :param input_name: name of the input - message or node_args
+        :param input_value: AST of the input passed to the predicate
+        :param args: arguments of the predicate
+        :return: AST of the result, None if the predicate cannot be inlined
+        """
+        if check not in ('True', 'False') or args:
+            return None
+
+        return ast.Constant(value=check == 'True')
+
+    @staticmethod
+    def _inline_empty(check, input_name, input_value, args):
+        # pylint: disable=unused-argument
+        """Inline a check of an input being empty.
+
+        :param check: check to be done, always empty
+        :param input_name: name of the input - message or node_args
+        :param input_value: AST of the input passed to the predicate
+        :param args: arguments of the predicate
+        :return: AST of the check, None if the check cannot be inlined
+        """
+        if check or args or input_value is None:
+            return None
+
+        return ast.Call(func=ast.Name(id='bool', ctx=ast.Load()), args=[input_value], keywords=[])
+
+    def _inline_input_check(self, check, input_name, input_value, args):
+        # pylint: disable=unused-argument
+        """Inline a check of a whole input.
+
+        :param check: check to be done on the input
+        :param input_name: name of the input - message or node_args
+        :param input_value: AST of the input passed to the predicate
+        :param args: arguments of the predicate
+        :return: AST of the check, None if the check cannot be inlined
+        """
+        if check not in self._INPUT_CHECKS or args or input_value is None:
+            return None
+
+        return self._INPUT_CHECKS[check](input_value)
+
+    def _inline_env(self, check, input_name, input_value, args):
+        # pylint: disable=unused-argument
+        """Inline a check of environment variables.
+
+        :param check: check to be done - Exist or Equal
+        :param input_name: name of the input - message or node_args
+        :param input_value: AST of the input passed to the predicate
+        :param args: arguments of the predicate
+        :return: AST of the check, None if the check cannot be inlined
+        """
+        if set(args) != ({'env'} if check == 'Exist' else {'env', 'value'}):
+            return None
+
+        environ = ast.Name(id=self.ENVIRON_NAME, ctx=ast.Load())
+        if check == 'Exist':
+            return ast.Compare(left=args['env'], ops=[ast.In()], comparators=[environ])
+
+        if isinstance(args['env'].value, str) and not isinstance(args['value'].value, str):
+            # values of environment variables are always strings
+            return ast.Constant(value=False)
+
+        lookup = ast.Call(func=ast.Attribute(value=environ, attr='get', ctx=ast.Load()), args=[args['env']],
+                          keywords=[])
+        return ast.Compare(left=lookup, ops=[ast.Eq()], comparators=[args['value']])
+
+    def _inline_field_check(self, check, input_name, input_value, args):
+        """Inline a check of a field in an input - a helper function with the specialized check is created.
+
+        :param check: check to be done on the field
+        :param input_name: name of the input - message or node_args
+        :param input_value: AST of the input passed to the predicate
+        :param args: arguments of the predicate
+        :return: AST of the helper function call, None if the check cannot be inlined
+        """
+        if check not in self._FIELD_CHECKS or input_value is None \
+                or set(args) != {'key'}.union(self._FIELD_CHECK_ARGS.get(check, ())):
+            return None
+
+        key_path = args['key'].value if isinstance(args['key'].value, list) else [args['key'].value]
+
+        value = ast.Name(id=input_name, ctx=ast.Load())
+        for key in key_path:
+            value = ast.Subscript(value=value, slice=ast.Constant(value=key), ctx=ast.Load())
+
+        helper_name = '{}_{}'.format(self._name, len(self._helpers))
+        helper = ast.parse(self._FIELD_CHECK_TEMPLATE.format(helper_name, input_name)).body[0]
+        if self._FIELD_CHECKS[check] is None:
+            # the field just needs to be present
+            helper.body[0].body = [ast.Expr(value=value), ast.Return(value=ast.Constant(value=True))]
+        else:
+            helper.body[0].body[0].value = self._FIELD_CHECKS[check](value, args)
+        self._helpers.append(helper)
+
+        return ast.Call(func=ast.Name(id=helper_name, ctx=ast.Load()), args=[input_value], keywords=[])
+
+    def _inline_call(self, call, module_name):
+        """Inline a call of a built-in predicate.
+
+        :param call: AST of the predicate call
+        :param module_name: name of the module implementing the built-in predicate
+        :return: AST that should be used instead of the call, None if the call cannot be inlined
+        """
+        args = self._get_constant_args(call)
+        if args is None:
+            return None
+
+        input_name = 'message'
+        if module_name.startswith('args'):
+            input_name = 'node_args'
+            module_name = module_name[len('args'):]
+            module_name = module_name[0].lower() + module_name[1:]
+
+        input_value = next((keyword.value for keyword in call.keywords if keyword.arg == input_name), None)
+
+        for prefix, method_name in self._INLINED_FAMILIES:
+            if module_name.startswith(prefix):
+                return getattr(self, method_name)(module_name[len(prefix):], input_name, input_value, args)
+
+        return None
+
+    def _inline_builtins(self, node, builtins):
+        """Inline built-in predicates used in a condition.
+
+        :param node: AST node of the condition
+        :param builtins: a mapping of names of built-in predicates to modules implementing them
+        :return: AST node with built-in predicates inlined
+        """
+        if isinstance(node, ast.BoolOp):
+            node.values = [self._inline_builtins(value, builtins) for value in node.values]
+        elif isinstance(node, ast.UnaryOp):
+            node.operand = self._inline_builtins(node.operand, builtins)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in builtins:
+            return self._inline_call(node, builtins[node.func.id]) or node
+
+        return node
+
+    def _builtin_predicates(self):
+        """Compute names of built-in predicates used in the predicate.
+
+        :return: a mapping of names of built-in predicates to names of modules implementing them
+        """
+        return {func.__name__: func.__module__[len(self._PREDICATE_MODULE_PREFIX):]
+                for func in self._predicate.predicates_used()
+                if func.__module__.startswith(self._PREDICATE_MODULE_PREFIX)}
+
+    def _pushdown_leaves(self, builtins):
+        """Compute predicate calls that can be pushed down to storages.
+
+        :param builtins: a mapping of names of built-in predicates to modules implementing them
+        :return: a list of predicate calls as collected that can be pushed down
+        """
+        if not self._pushdown:
+            return []
+
+        result = []
+        for group in self._group_leaves(self._leaves):
+            if len(group) > 1:
+                # the task result is retrieved anyway
+                continue
+
+            _, call, _, _ = group[0]
+            module_name = builtins.get(call.func.id) if isinstance(call.func, ast.Name) else None
+            if module_name and module_name.startswith('field') and self._get_constant_args(call) is not None:
+                result.append(group[0])
+
+        return result
+
+    def _push_down(self, builtins):
+        """Evaluate predicates that are the only ones inspecting a task result using the storage pool.
+
+        :param builtins: a mapping of names of built-in predicates to modules implementing them
+        """
+        for leaf in self._pushdown_leaves(builtins):
+            _, call, keywords, task_name = leaf
+            self._leaves.remove(leaf)
+            call.args = [ast.Constant(value=task_name), ast.Name(id=call.func.id, ctx=ast.Load())]
+            call.keywords = [keyword for arg, keyword in keywords.items() if arg != 'message']
+            call.func = ast.Attribute(value=ast.Name(id='db', ctx=ast.Load()), attr=self._STORAGE_POOL_EVALUATE,
+                                      ctx=ast.Load())
+
+    def _project_fields(self, builtins):
+        """Retrieve only inspected fields of task results that are inspected only by built-in field predicates.
+
+        :param builtins: a mapping of names of built-in predicates to modules implementing them
+        """
+        if not self._projection:
+            return
+
+        for group in self._group_leaves(self._leaves):
+            paths = []
+            for _, call, keywords, _ in group:
+                module_name = builtins.get(call.func.id) if isinstance(call.func, ast.Name) else None
+                key_path = self._get_key_path(keywords)
+                if not module_name or not module_name.startswith('field') or key_path is None \
+                        or self._get_constant_args(call) is None:
+                    break
+                if key_path not in paths:
+                    paths.append(key_path)
+            else:
+                for _, _, keywords, task_name in group:
+                    keywords['message'].value = ast.Call(
+                        func=ast.Attribute(value=ast.Name(id='db', ctx=ast.Load()),
+                                           attr=self._STORAGE_POOL_GET_FIELDS, ctx=ast.Load()),
+                        args=[ast.Constant(value=task_name), ast.Constant(value=paths)],
+                        keywords=[]
+                    )
+
+    def pushed_down(self):
+        """Compute predicates which are pushed down to storages.
+
+        :return: a mapping of task names to names of built-in predicates inspecting their results in storages
+        """
+        self._leaves = []
+        self._collect_leaves(self._predicate.ast(), ())
+
+        builtins = self._builtin_predicates()
+        return {task_name: [builtins[call.func.id]] for _, call, _, task_name in self._pushdown_leaves(builtins)}
+
+    def _compile(self):
+        """Compile the predicate into an expression.
+
+        :return: AST of the expression evaluating the predicate
+        """
+        tree = self._predicate.ast()
+        builtins = self._builtin_predicates()
+
+        self._leaves = []
+        self._helpers = []
+        self._collect_leaves(tree, ())
+        self._push_down(builtins)
+        self._project_fields(builtins)
+        self._share_key_paths(self._field_predicates())
+        self._share_messages()
+
+        if self._inline:
+            tree = self._inline_builtins(tree, builtins)
+
+        return tree
+
+    def to_source(self, name):
+        """Construct source code of a condition function evaluating the predicate.
+
+        :param name: name of the condition function
+        :return: Python source code of the condition function and helper functions it uses
+        """
+        self._name = name
+        tree = self._compile()
+
+        function = ast.parse("def {}(db, node_args):\n    return None\n".format(name)).body[0]
+        function.body[0].value = tree
+
+        return ast.unparse(ast.fix_missing_locations(ast.Module(body=self._helpers + [function], type_ignores=[])))
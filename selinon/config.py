@@ -44,12 +44,18 @@ class Config:
     flows = {}
     task_classes = {}
     edge_table = {}
+    node_edge_index = {}
+    starting_edge_index = {}
     nowait_nodes = {}
     eager_failures = None
+    eager_wakeup = {}
+    state_encoding = {}
     max_retry = None
     retry_countdown = None
     storage2storage_cache = {}
     storage_readonly = {}
+    batch_size = {}
+    write_behind = {}
     storage_task_name = {}
     propagate_node_args = {}
     propagate_parent = {}
@@ -58,6 +64,11 @@ class Config:
     output_schemas = None
     async_result_cache = {}
     migration_dir = None
+    claim_check_storage = None
+    claim_check_threshold = None
+    write_behind_buffer_size = None
+    write_behind_batch_size = None
+    write_behind_timeout = None
 
     storage_mapping = {}
     task2storage_mapping = {}
@@ -76,9 +87,13 @@ class Config:
         """
         cls.task_classes = config_module['task_classes']
         cls.edge_table = config_module['edge_table']
+        cls.node_edge_index = config_module['node_edge_index']
+        cls.starting_edge_index = config_module['starting_edge_index']
         cls.failures = config_module['failures']
         cls.nowait_nodes = config_module['nowait_nodes']
         cls.eager_failures = config_module['eager_failures']
+        cls.eager_wakeup = config_module['eager_wakeup']
+        cls.state_encoding = config_module['state_encoding']
         cls.flows = list(cls.edge_table.keys())
 
         # misc
@@ -99,6 +114,8 @@ class Config:
         cls.max_retry = config_module['max_retry']
         cls.retry_countdown = config_module['retry_countdown']
         cls.storage_readonly = config_module['storage_readonly']
+        cls.batch_size = config_module['batch_size']
+        cls.write_behind = config_module['write_behind']
         cls.storage2storage_cache = config_module['storage2storage_cache']
 
         # throttle configuration
@@ -118,6 +135,15 @@ class Config:
         # Configuration migrations
         cls.migration_dir = config_module['migration_dir']
 
+        # Claim-check storage of large payloads
+        cls.claim_check_storage = config_module['claim_check_storage']
+        cls.claim_check_threshold = config_module['claim_check_threshold']
+
+        # Write-behind storing of task results
+        cls.write_behind_buffer_size = config_module['write_behind_buffer_size']
+        cls.write_behind_batch_size = config_module['write_behind_batch_size']
+        cls.write_behind_timeout = config_module['write_behind_timeout']
+
         # call config init with Config class to set up other configuration specific values
         config_module['init'](cls)
 
@@ -385,7 +411,7 @@ class Config:
         if flow_name not in Config.edge_table:
             raise UnknownStorageError("No such flow in configuration: %s" % flow_name)
 
-        start_edges = [(i, edge) for i, edge in enumerate(Config.edge_table[flow_name]) if len(edge['from']) == 0]
+        start_edges = [(i, Config.edge_table[flow_name][i]) for i in Config.starting_edge_index.get(flow_name, [])]
         if not start_edges:
             # This should not occur since selinon raises exception if such occurs, but just to be sure...
             raise ConfigurationError("No starting node found for flow '%s'!" % flow_name)
@@ -8,6 +8,8 @@
 
 import abc
 
+from .helpers import project_fields
+
 
 class SelinonMissingDataException(Exception):
     """Selinon exception that ressource was not found by storage"""
@@ -16,6 +18,13 @@ class SelinonMissingDataException(Exception):
 class DataStorage(metaclass=abc.ABCMeta):
     """Abstract Selinon storage adapter that is implemented by a user."""
 
+    # names of built-in predicates that can be evaluated by the storage, see evaluate()
+    PUSHDOWN_PREDICATES = frozenset()
+    # set to True if the storage can be safely called from multiple threads at once - calls are not serialized then
+    THREAD_SAFE = False
+    # set to True if store() and store_many() accept dispatcher_id keyword argument identifying the flow run
+    STORE_DISPATCHER_ID = False
+
     @abc.abstractmethod
     def __init__(self, *args, **kwargs):
         """Initialize storage.
@@ -53,6 +62,27 @@ class DataStorage(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    def retrieve_many(self, flow_name, task_name, task_ids):
+        """Retrieve results of multiple tasks, override to retrieve all results in one storage operation.
+
+        :param flow_name: flow name in which tasks were executed
+        :param task_name: task name that results are going to be retrieved
+        :param task_ids: a list of ids of tasks that results are going to be retrieved
+        :return: a list of task results in the same order as task_ids
+        """
+        return [self.retrieve(flow_name, task_name, task_id) for task_id in task_ids]
+
+    def retrieve_fields(self, flow_name, task_name, task_id, paths):
+        """Retrieve only the given fields of result stored in storage, override to avoid retrieval of the whole result.
+
+        :param flow_name: flow name in which task was executed
+        :param task_name: task name that result is going to be retrieved
+        :param task_id: id of the task that result is going to be retrieved
+        :param paths: a list of key paths to fields, each key path is a list of keys
+        :return: task result with only the requested fields, see selinon.helpers.project_fields()
+        """
+        return project_fields(self.retrieve(flow_name, task_name, task_id), paths)
+
     @abc.abstractmethod
     def store(self, node_args, flow_name, task_name, task_id, result):  # pylint: disable=too-many-arguments
         """Store result stored in storage.
@@ -66,6 +96,33 @@ class DataStorage(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    def store_many(self, flow_name, task_name, records):
+        """Store results of multiple tasks, override to store all results in one storage operation.
+
+        :param flow_name: flow name in which tasks were executed
+        :param task_name: task name that results are going to be stored
+        :param records: a list of tuples - node arguments, task id and result of task
+        :return: a list of unique IDs of stored records
+        """
+        return [self.store(node_args, flow_name, task_name, task_id, result) for node_args, task_id, result in records]
+
+    def evaluate(self, flow_name, task_name, task_id, predicate_name, args):  # pylint: disable=too-many-arguments
+        """Evaluate a built-in predicate on a stored result without retrieving the result.
+
+        Override together with PUSHDOWN_PREDICATES to let the storage evaluate conditions (e.g. in a database query).
+        The evaluation has to follow semantics of the built-in predicate, raise NotImplementedError for arguments
+        that cannot be evaluated by the storage - the result is retrieved and the predicate is evaluated by Selinon
+        in such case.
+
+        :param flow_name: flow name in which task was executed
+        :param task_name: task name which result is inspected
+        :param task_id: id of the task which result is inspected
+        :param predicate_name: name of the built-in predicate listed in PUSHDOWN_PREDICATES
+        :param args: arguments of the predicate, key path is always a list
+        :return: True if the predicate holds
+        """
+        raise NotImplementedError()
+
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # pylint: disable=too-many-arguments
         """Store information about task error.
 
@@ -89,6 +146,15 @@ class DataStorage(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError("delete method is not implemented")
 
+    def to_async(self, lock=None):
+        """Get an asynchronous (asyncio) counterpart of this storage, override if a native implementation exists.
+
+        :param lock: lock serializing calls on this storage if blocking calls are run in an executor
+        :return: AsyncDataStorage instance, blocking calls of this storage are run in an executor by default
+        """
+        from .async_data_storage import ExecutorDataStorage  # pylint: disable=import-outside-toplevel,cyclic-import
+        return ExecutorDataStorage(self, lock=lock)
+
     def __del__(self):
         """Clean up."""
         if self.is_connected():
@@ -8,17 +8,24 @@
 
 import traceback
 
+from .celery import Ignore
+from .celery import Retry
 from .celery import Task
+from .claim_check import ClaimCheck
 from .config import Config
+from .data_storage import SelinonMissingDataException
 from .errors import DispatcherRetry
 from .errors import FlowError
 from .errors import MigrationException
 from .errors import MigrationFlowFail
 from .errors import MigrationFlowRetry
 from .errors import MigrationSkew
+from .foreach_group import ForeachGroup
 from .migrations import Migrator
+from .state_encoding import StateEncoding
 from .system_state import SystemState
 from .trace import Trace
+from .wakeup import Wakeup
 
 
 class Dispatcher(Task):
@@ -31,12 +38,52 @@ class Dispatcher(Task):
     max_retries = None
     name = "selinon.Dispatcher"
 
-    def flow_failure(self, state):
+    def _release_claim_checks(self, flow_info, kwargs=None, keep_node_args=False):
+        """Remove stored copies of dispatcher arguments that are not referenced anymore.
+
+        :param flow_info: a dictionary holding all the information relevant to flow (dispatcher arguments)
+        :param kwargs: arguments of the next dispatcher message, None if the flow ends
+        :param keep_node_args: keep stored copy of node arguments as it can be still referenced by active nodes
+        """
+        for argument in ('state',) if keep_node_args else ('node_args', 'state'):
+            reference = flow_info.get(argument + '_reference')
+            if reference is not None and (kwargs is None or kwargs.get(argument) != reference):
+                ClaimCheck.release(reference, flow_info['dispatcher_id'])
+
+    def _retry(self, flow_info, kwargs, **celery_kwargs):
+        """Schedule the next dispatcher message, stored copies not referenced anymore are released once it was sent.
+
+        :param flow_info: a dictionary holding all the information relevant to flow (dispatcher arguments)
+        :param kwargs: arguments of the next dispatcher message
+        :param celery_kwargs: additional arguments passed to Celery's retry
+        :raises celery.exceptions.Retry: Celery's retry exception, always
+        """
+        try:
+            raise self.retry(kwargs=kwargs, **celery_kwargs)
+        except Retry:
+            # Celery raises Retry only after the message was published, the previous copies are still needed otherwise.
+            self._release_claim_checks(flow_info, kwargs)
+            raise
+
+    def flow_failure(self, state, flow_info=None):
         """Mark the whole flow as failed ignoring retry configuration.
 
         :param state: flow state that should be captured
+        :param flow_info: a dictionary holding all the information relevant to flow, if supplied, stored copies
+                          of dispatcher arguments are released
         :raises celery.exceptions.Retry: Celery's retry exception, always
         """
+        if not isinstance(state, dict) or ClaimCheck.is_reference(state) or StateEncoding.is_encoded(state):
+            # The flow failed before its state was retrieved and decoded.
+            state = None
+
+        if flow_info is not None:
+            # Nodes can be still running when the flow fails (e.g. eager failures) and they could reference stored
+            # node arguments, the stored copy is then left to expire in the storage. The same applies if the flow
+            # state is not known.
+            keep_node_args = state is None or bool(state.get('active_nodes'))
+            self._release_claim_checks(flow_info, keep_node_args=keep_node_args)
+
         reported_state = {
             'finished_nodes': (state or {}).get('finished_nodes', {}),
             'failed_nodes': (state or {}).get('failed_nodes', {}),
@@ -60,33 +107,45 @@ class Dispatcher(Task):
         if adjust_retried_count:
             new_retried_count += 1
 
+        failure_state = flow_info['state']
         if not keep_state:
             flow_info['state'] = None
             flow_info['retried_count'] = None
             flow_info['retry'] = None
 
+        countdown = Config.retry_countdown.get(flow_info['flow_name'], 0)
+        max_retry = Config.max_retry.get(flow_info['flow_name'], 0)
+
+        if new_retried_count > max_retry:
+            # Force max_retries to 0 so we are not scheduled and marked as FAILED
+            raise self.flow_failure(failure_state, flow_info)
+
+        state = flow_info['state']
+        if not ClaimCheck.is_reference(state):
+            state = StateEncoding.encode(state, Config.state_encoding.get(flow_info['flow_name'], StateEncoding.JSON))
+            state = ClaimCheck.store(flow_info['dispatcher_id'], flow_info['flow_name'], state) or state
+
         kwargs = {
             'flow_name': flow_info['flow_name'],
-            'node_args': flow_info['node_args'],
+            'node_args': flow_info.get('node_args_reference') or flow_info['node_args'],
             'parent': flow_info['parent'],
             'retried_count': new_retried_count,
             'selective': flow_info['selective'],
             'retry': flow_info['retry'],
-            'state': flow_info['state']
+            'state': state
         }
-        countdown = Config.retry_countdown.get(flow_info['flow_name'], 0)
-        max_retry = Config.max_retry.get(flow_info['flow_name'], 0)
-
-        if new_retried_count > max_retry:
-            # Force max_retries to 0 so we are not scheduled and marked as FAILED
-            raise self.flow_failure(flow_info['state'])
+        if flow_info['parent_dispatcher_id']:
+            kwargs['parent_dispatcher_id'] = flow_info['parent_dispatcher_id']
+        if flow_info.get('foreach_group'):
+            kwargs['foreach_group'] = flow_info['foreach_group']
 
         # We will force max retries to None so we are always retried by Celery
         queue = Config.dispatcher_queues[flow_info['flow_name']]
         # TODO: add exception here as well
         Trace.log(Trace.FLOW_RETRY, kwargs, countdown=countdown, queue=queue)
-        raise self.retry(
-            kwargs=kwargs,
+        raise self._retry(
+            flow_info,
+            kwargs,
             max_retries=None,
             countdown=countdown,
             queue=queue
@@ -121,9 +180,9 @@ class Dispatcher(Task):
                     raise self.selinon_retry(flow_info, adjust_retried_count=False, keep_state=False)
 
                 if isinstance(exc, MigrationFlowFail):
-                    raise self.flow_failure(flow_info['state'])
+                    raise self.flow_failure(flow_info['state'], flow_info)
 
-                raise self.flow_failure(flow_info['state'])
+                raise self.flow_failure(flow_info['state'], flow_info)
             except MigrationSkew as exc:
                 Trace.log(Trace.MIGRATION_SKEW, flow_info, available_migration_version=exc.available_migration_version)
                 raise self.selinon_retry(flow_info, adjust_retried_count=False)
@@ -150,8 +209,92 @@ class Dispatcher(Task):
             Trace.log(Trace.MIGRATION_SKEW, flow_info, available_migration_version=None)
             raise self.selinon_retry(flow_info, adjust_retried_count=False)
 
+    def _resolve_arguments(self, flow_info):
+        """Retrieve stored copies of dispatcher arguments and decode the flow state.
+
+        :param flow_info: a dictionary holding all the information relevant to flow, updated with resolved arguments
+        """
+        try:
+            node_args = ClaimCheck.resolve(flow_info['node_args'])
+            state = ClaimCheck.resolve(flow_info['state'])
+        except SelinonMissingDataException as exc:
+            # The stored copy was released or it expired, retrying will not bring it back.
+            Trace.log(Trace.DISPATCHER_FAILURE, flow_info, what=traceback.format_exc())
+            raise self.flow_failure(None, flow_info) from exc
+        except Exception as exc:
+            # The claim-check storage is not available, retry as configured for the flow.
+            Trace.log(Trace.DISPATCHER_FAILURE, flow_info, what=traceback.format_exc())
+            raise self.selinon_retry(flow_info) from exc
+
+        try:
+            state = StateEncoding.decode(state)
+        except Exception as exc:
+            # The state was encoded by a newer version of Selinon, give a chance to other nodes in the cluster.
+            Trace.log(Trace.DISPATCHER_FAILURE, flow_info, what=traceback.format_exc())
+            raise self.selinon_retry(flow_info, adjust_retried_count=False) from exc
+
+        flow_info['node_args'] = node_args
+        flow_info['state'] = state
+
+        if flow_info['node_args_reference'] is None:
+            # Store large node arguments once so they are shared by all nodes started and all dispatcher retries.
+            flow_info['node_args_reference'] = ClaimCheck.store(flow_info['dispatcher_id'], flow_info['flow_name'],
+                                                                node_args)
+
+    def _schedule_retry(self, flow_info, system_state, retry, wakeup_sequence):
+        """Schedule the next dispatcher run that will check the flow state.
+
+        :param flow_info: a dictionary holding all the information relevant to flow (dispatcher arguments)
+        :param system_state: system state after the current dispatcher run
+        :param retry: countdown of the next dispatcher run
+        :param wakeup_sequence: sequence number of the current parked dispatcher continuation, if any
+        :raises celery.exceptions.Retry: Celery's retry exception, always
+        """
+        flow_name = flow_info['flow_name']
+        node_args_reference = flow_info['node_args_reference']
+        if system_state.node_args is not flow_info['node_args']:
+            # Node arguments were changed (node_args_from_first), store the new ones.
+            node_args_reference = ClaimCheck.store(self.request.id, flow_name, system_state.node_args)
+
+        state = StateEncoding.encode(system_state.to_dict(), Config.state_encoding.get(flow_name, StateEncoding.JSON))
+        kwargs = {
+            'flow_name': flow_name,
+            'node_args': node_args_reference or system_state.node_args,
+            'parent': flow_info['parent'],
+            'retried_count': flow_info['retried_count'],
+            'retry': retry,
+            'state': ClaimCheck.store(self.request.id, flow_name, state) or state,
+            'selective': system_state.selective,
+            'migration_version': flow_info['migration_version']
+        }
+        if flow_info['parent_dispatcher_id']:
+            kwargs['parent_dispatcher_id'] = flow_info['parent_dispatcher_id']
+        if flow_info['foreach_group']:
+            kwargs['foreach_group'] = flow_info['foreach_group']
+
+        countdown = retry
+        if Wakeup.is_enabled(flow_name):
+            # The countdown retry is kept as a safety net, nodes will wake up dispatcher once they finish.
+            kwargs['wakeup_sequence'] = (wakeup_sequence or 0) + 1
+            if Wakeup.park(self.request.id, kwargs, flow_info['queue']):
+                countdown = 0
+
+        Trace.log(Trace.DISPATCHER_RETRY, flow_info, kwargs)
+        raise self._retry(flow_info, kwargs, args=[], countdown=countdown, queue=flow_info['queue'])
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        # pylint: disable=too-many-arguments,unused-argument
+        """Report completion to the parent flow once this (sub-)flow finishes."""
+        if status in Wakeup.FINISHED_STATES and kwargs.get('foreach_group'):
+            # Reported before wake up so the parent dispatcher sees this flow finished.
+            ForeachGroup.report(kwargs['foreach_group'], task_id)
+
+        if status in Wakeup.FINISHED_STATES and kwargs.get('parent_dispatcher_id'):
+            Wakeup.notify(kwargs['parent_dispatcher_id'])
+
     def run(self, flow_name, node_args=None, parent=None, retried_count=None, retry=None,
-            state=None, selective=False, migration_version=None):
+            state=None, selective=False, migration_version=None, parent_dispatcher_id=None, wakeup_sequence=None,
+            foreach_group=None):
         # pylint: disable=too-many-arguments,arguments-differ,too-many-locals
         """Dispatcher entry-point - run each time a dispatcher is scheduled.
 
@@ -163,6 +306,9 @@ class Dispatcher(Task):
         :param state: the current system state
         :param selective: selective flow information if run in selective flow
         :param migration_version: migration version that was used for the flow
+        :param parent_dispatcher_id: id of parent dispatcher that should be woken up once this flow finishes
+        :param wakeup_sequence: sequence number of parked dispatcher continuation if eager wakeup is used
+        :param foreach_group: id of foreach group in the parent flow this flow belongs to, if any
         :raises: FlowError
         """
         retried_count = retried_count or 0
@@ -176,20 +322,33 @@ class Dispatcher(Task):
             'selective': selective,
             'retried_count': retried_count,
             'parent': parent,
-            'migration_version': migration_version or 0
+            'migration_version': migration_version or 0,
+            'parent_dispatcher_id': parent_dispatcher_id,
+            'foreach_group': foreach_group,
+            'node_args_reference': node_args if ClaimCheck.is_reference(node_args) else None,
+            'state_reference': state if ClaimCheck.is_reference(state) else None
         }
 
+        if wakeup_sequence is not None and not Wakeup.claim(self.request.id, wakeup_sequence):
+            # Flow state was already checked by another dispatcher message (a wakeup or the countdown retry).
+            Trace.log(Trace.DISPATCHER_WAKEUP_MERGED, flow_info, wakeup_sequence=wakeup_sequence)
+            raise Ignore()
+
+        self._resolve_arguments(flow_info)
         Trace.log(Trace.DISPATCHER_WAKEUP, flow_info)
 
         # Perform migrations at first place
         self.migrate_message(flow_info)
 
         try:
-            system_state = SystemState(self.request.id, flow_name, node_args, retry, state, parent, selective)
+            system_state = SystemState(self.request.id, flow_name, flow_info['node_args'], retry, flow_info['state'],
+                                       parent, selective, node_args_reference=flow_info['node_args_reference'])
             retry = system_state.update()
         except FlowError as exc:
             max_retry = Config.max_retry.get(flow_name, 0)
             Trace.log(Trace.FLOW_FAILURE, flow_info, state=exc.state, will_retry=retried_count < max_retry)
+            # The flow fails with its final state if it is not retried.
+            flow_info['state'] = exc.state
             raise self.selinon_retry(
                 flow_info=flow_info,
                 adjust_retried_count=True,
@@ -199,30 +358,33 @@ class Dispatcher(Task):
             raise self.selinon_retry(flow_info, exc.adjust_retry_count, keep_state=exc.keep_state)
         except Exception:
             Trace.log(Trace.DISPATCHER_FAILURE, flow_info, what=traceback.format_exc())
-            raise self.flow_failure(state)
-
-        state_dict = system_state.to_dict()
-        node_args = system_state.node_args
+            raise self.flow_failure(flow_info['state'], flow_info)
 
         if retry is not None and retry >= 0:
-            kwargs = {
-                'flow_name': flow_name,
-                'node_args': node_args,
-                'parent': parent,
-                'retried_count': retried_count,
-                'retry': retry,
-                'state': state_dict,
-                'selective': system_state.selective,
-                'migration_version': flow_info['migration_version']
-            }
-            Trace.log(Trace.DISPATCHER_RETRY, flow_info, kwargs)
-            raise self.retry(args=[], kwargs=kwargs, countdown=retry, queue=Config.dispatcher_queues[flow_name])
+            raise self._schedule_retry(flow_info, system_state, retry, wakeup_sequence)
+
+        if Wakeup.is_enabled(flow_name):
+            Wakeup.discard(self.request.id)
 
+        state_dict = system_state.to_dict()
         Trace.log(Trace.FLOW_END, flow_info, state=state_dict)
-        return {
+        self._release_claim_checks(flow_info)
+        result = {
             'finished_nodes': state_dict['finished_nodes'],
             # This is always {} since we have finished, but leave it here because of failure tracking.
             'failed_nodes': state_dict['failed_nodes'],
             # Always an empty array.
             'active_nodes': state_dict.get('active_nodes', [])
         }
+
+        # Computed once here so parent flows propagating finished nodes do not inspect nested subflows on their own.
+        try:
+            nested_finished_nodes = system_state.nested_finished_nodes()
+        except DispatcherRetry:
+            # Not fatal, parent flows will inspect nested subflows.
+            nested_finished_nodes = None
+
+        if nested_finished_nodes is not None:
+            result['nested_finished_nodes'] = nested_finished_nodes
+
+        return result
@@ -17,7 +17,13 @@ class Edge:
     _DEFAULT_RUN_SUBSEQUENT = False
     _DEFAULT_FOLLOW_SUBFLOWS = False
 
-    def __init__(self, nodes_from, nodes_to, predicate, flow, foreach, selective):
+    # Supported keys for pairing nodes on edges with join.
+    JOIN_FOREACH_INDEX = 'foreach_index'
+    JOIN_NODE_ARGS = 'node_args'
+    JOIN_RESULT = 'result'
+
+    def __init__(self, nodes_from, nodes_to, predicate, flow, foreach, selective, join=None):
+        # pylint: disable=too-many-arguments
         """Initialize edge definition.
 
         :param nodes_from: nodes from where edge starts
@@ -32,6 +38,8 @@ class Edge:
         :type foreach: dict
         :param selective: selective run flow configuration
         :type selective: None|dict
+        :param join: key used to pair source nodes - a tuple of join kind and key path
+        :type join: None|tuple
         """
         self.nodes_from = nodes_from
         self.nodes_to = nodes_to
@@ -39,8 +47,9 @@ class Edge:
         self.flow = flow
         self.foreach = foreach
         self.selective = selective
+        self.join = join
 
-    def check(self):
+    def check(self):  # pylint: disable=too-many-branches
         """Check edge consistency."""
         if self.foreach and self.foreach['propagate_result']:
             # We can propagate result of our foreach function only if:
@@ -68,6 +77,23 @@ class Edge:
                                          "configured with readonly storage, condition: %s"
                                          % (node.name, self.flow.name, str(self.predicate)))
 
+        if self.join:
+            if len(self.nodes_from) < 2:
+                raise ConfigurationError("Option 'join' requires at least two source nodes in edge in flow '%s'"
+                                         % self.flow.name)
+
+            fallback_nodes = self.flow.failures.all_fallback_nodes() if self.flow.failures else []
+            for node in self.nodes_from:
+                if self.join[0] == self.JOIN_RESULT and (not node.is_task() or not node.storage
+                                                         or node.storage_readonly):
+                    raise ConfigurationError("Cannot join on result of node '%s' in flow '%s' as results of this "
+                                             "node are not stored in a storage" % (node.name, self.flow.name))
+
+                if self.join[0] == self.JOIN_FOREACH_INDEX and node in fallback_nodes:
+                    raise ConfigurationError("Cannot join on foreach index of node '%s' in flow '%s' as this node is "
+                                             "started as a fallback without any foreach item"
+                                             % (node.name, self.flow.name))
+
         if self.selective:
             # TODO: there are no checks whether tasks that we want to run are actually run - this will be runtime error
             if len(self.nodes_to) > 1:
@@ -134,6 +160,35 @@ class Edge:
 
         return selective_def
 
+    @classmethod
+    def _parse_join(cls, flow, join_def):
+        """Parse join definition.
+
+        :param flow: flow in which the edge is defined
+        :param join_def: join definition
+        :return: a tuple - join kind and key path (None for foreach_index)
+        """
+        if join_def is None:
+            return None
+
+        if join_def == cls.JOIN_FOREACH_INDEX:
+            return cls.JOIN_FOREACH_INDEX, None
+
+        if not isinstance(join_def, dict) or len(join_def) != 1 \
+                or next(iter(join_def)) not in (cls.JOIN_NODE_ARGS, cls.JOIN_RESULT):
+            raise ConfigurationError("Option 'join' expects '%s' or one of '%s', '%s' with key path in flow '%s', "
+                                     "got '%s' instead"
+                                     % (cls.JOIN_FOREACH_INDEX, cls.JOIN_NODE_ARGS, cls.JOIN_RESULT, flow.name,
+                                        join_def))
+
+        kind, key = next(iter(join_def.items()))
+        key = key if isinstance(key, list) else [key]
+        if not key or not all(isinstance(item, (str, int)) for item in key):
+            raise ConfigurationError("Key path for join should be a key or a list of keys in flow '%s', got '%s' "
+                                     "instead" % (flow.name, join_def[kind]))
+
+        return kind, key
+
     @classmethod
     def from_dict(cls, dict_, system, flow):  # pylint: disable=too-many-branches
         """Construct edge from a dict.
@@ -202,8 +257,10 @@ class Edge:
                                          % (foreach_def['import'], flow.name))
 
         selective = cls._parse_selective(flow, dict_.get('selective'))
+        join = cls._parse_join(flow, dict_.get('join'))
 
-        unknown_conf = check_conf_keys(dict_, known_conf_opts=('from', 'to', 'foreach', 'condition', 'selective'))
+        unknown_conf = check_conf_keys(dict_, known_conf_opts=('from', 'to', 'foreach', 'condition', 'selective',
+                                                               'join'))
         if unknown_conf:
             raise ConfigurationError("Unknown configuration options supplied for edge in flow '%s': %s"
                                      % (flow.name, unknown_conf))
@@ -214,5 +271,6 @@ class Edge:
             predicate=predicate,
             flow=flow,
             foreach=foreach,
-            selective=selective
+            selective=selective,
+            join=join
         )
@@ -9,6 +9,8 @@
 Classes and functions to make Selinon executor work as a standalone CLI.
 """
 
+from selinon.celery import Retry
+
 
 class SimulateRequest:
     """Simulate Celery's Task.request.
@@ -88,7 +90,7 @@ class SimulateAsyncResult:
         return self.task_successes.get(self.task_id, None)
 
 
-class SimulateRetry(Exception):
+class SimulateRetry(Retry):
     """Simulate Celery Retry exception raised by self.retry()."""
 
     def __init__(self, instance, **celery_kwargs):
@@ -97,6 +97,8 @@ class Executor:
         # Overwrite used Celery functions so we do not rely on Celery logic at all
         CeleryTask.apply_async = simulate_apply_async
         CeleryTask.retry = simulate_retry
+        # Nodes run in batches report their states to Celery's result backend, which is not available here.
+        Config.batch_size = {}
 
     def run(self, flow_name, node_args=None):
         """Run executor.
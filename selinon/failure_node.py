@@ -6,8 +6,8 @@
 # ######################################################################
 r"""Failure node handling representation.
 
-A failure is basically a node in graph, that represents all permutations of possible cases of failures. Consider
-having two failure conditions:
+A failure node represents a set of nodes that can fail together and fallbacks that should be run in such case.
+Consider having two failure conditions:
 
 .. code-block:: yaml
 
@@ -24,48 +24,38 @@ having two failure conditions:
       fallback:
           - FallbackTask2
 
-What we do here, we construct a graph of all possible permutations connected using edges that represent a node
-that should be added to create a new permutation:
+Each failure is keyed by a set of its nodes - the order of nodes as listed in the configuration file does not
+matter and failures listing the same set of nodes share one failure node:
 
-.. code-block:: yaml
-
-   |-------------------------------
-   |                              |
-  T1           T2           T3    |
-    \         /  \         / \    |
-     \       /    \       /   \   |
-      \     /      \     /     \  v
-       T1,T2*       T2,T3      T1,T3
-          \         /           /
-           \       /           /
-            T1,T2,T3*  <-------
+.. code-block:: python
 
-For nodes ``T1,T2,T3`` and ``T1,T2`` we assign a fallback as configured. This graph is then serialized into the Python
-configuration code. This way the dispatcher has O(N) time complexity when dealing with failures.
+  {
+      frozenset(('Task1', 'Task2', 'Task3')): {'fallback': [['FallbackTask1']], ...},
+      frozenset(('Task1', 'Task2')): {'fallback': [['FallbackTask2']], ...}
+  }
 
-Note we are creating sparse tree - only for nodes that are listed in failures.
+This mapping is serialized into the Python configuration code. Dispatcher then picks failures that are subsets of
+failed nodes, the largest ones first - time spent on failures is linear to the number of defined failures instead of
+being dependent on all combinations of failed nodes.
 
 Note that we link failure nodes as allocated - we get a one way linked list of all failure nodes that helps us with
 Python code generation.
 """
 
-from functools import reduce
-
 from .errors import ConfigurationError
 from .predicate import Predicate
 
 
 class FailureNode:
-    """A representation of a failure node permutation."""
+    """A representation of a set of nodes that can fail together."""
 
     def __init__(self, flow, traversed, failure_link):
-        """Instantiate a failure node in the graph of all possible failures (permutations).
+        """Instantiate a failure node.
 
         :param flow: flow to which the failure node conforms to
-        :param traversed: traversed nodes - also permutation of nodes
+        :param traversed: names of nodes that are covered by the failure node, sorted
         :param failure_link: link to next failure node in failures
         """
-        self.next = {}
         self.flow = flow
         self.traversed = traversed
         self.failure_link = failure_link
@@ -73,30 +63,15 @@ class FailureNode:
         self.propagate_failures = []
         self.predicates = []
 
-    def to(self, node_name):  # pylint: disable=invalid-name
-        """Retrieve next permutation based on link in failure graph.
-
-        :param node_name: a name of the node for next permutation
-        :rtype: FailureNode
-        """
-        return self.next[node_name]
-
-    def has_to(self, node_name):
-        """Check whether there is a link to next permutation.
-
-        :param node_name: name of the node to be added to create a new permutation
-        :return: True if there is a link to next permutation for node of name node_name
-        """
-        return node_name in self.next
-
-    def add_to(self, node_name, failure):
-        """Add failure for next permutation.
+    @staticmethod
+    def key(node_names):
+        """Compute a canonical key of a failure node.
 
-        :param node_name: a node for next permutation
-        :param failure: FailureNode that should be added
+        :param node_names: names of nodes covered by the failure
+        :return: key under which the failure node is stored
+        :rtype: frozenset
         """
-        assert node_name not in self.next  # nosec
-        self.next[node_name] = failure
+        return frozenset(node_names)
 
     @staticmethod
     def _add_failure_info(failure_node, failure_info, predicate):
@@ -139,66 +114,26 @@ class FailureNode:
                                                      idx=idx)
 
     @classmethod
-    def construct(cls, flow, system, failures):  # pylint: disable=too-many-locals,too-many-branches
+    def construct(cls, flow, system, failures):
         """Construct failures from failures dictionary.
 
         :param flow: flow to which failures conform to
         :param system: system context to be used
         :param failures: failures dictionary
-        :return: a link for linked list of failures and a dict of starting failures
+        :return: a link for linked list of failures, a dict of failure nodes keyed by sets of node names and predicates
         """
         last_allocated = None
-        starting_failures = {}
+        failure_nodes = {}
         predicates = []
 
-        # pylint: disable=too-many-nested-blocks
         for failure in failures:
-            used_starting_failures = {}
-
-            for node in failure['nodes']:
-                if node not in starting_failures:
-                    failure_node = FailureNode(flow, [node], last_allocated)
-                    last_allocated = failure_node
-                    starting_failures[node] = failure_node
-                    used_starting_failures[node] = failure_node
-                else:
-                    used_starting_failures[node] = starting_failures[node]
-
-            current_nodes = list(used_starting_failures.values())
-            next_nodes = []
-
-            for _ in range(1, len(failure['nodes'])):  # for every permutation length
-
-                for edge_node in failure['nodes']:  # edge_node is a node that can create a new permutation from a node
-
-                    for current_node in current_nodes:
-
-                        if edge_node not in current_node.traversed:
-
-                            if not current_node.has_to(edge_node):
-                                next_node = current_node.traversed + [edge_node]
-                                failure_node = FailureNode(flow, next_node, last_allocated)
-                                last_allocated = failure_node
-                                current_node.add_to(edge_node, failure_node)
-
-                                for node in current_nodes:
-                                    diff = set(node.traversed) ^ set(next_node)
-
-                                    if len(diff) == 1:
-                                        if not node.has_to(list(diff)[0]):
-                                            node.add_to(list(diff)[0], failure_node)
-
-                                next_nodes.append(failure_node)
-                            else:
-                                # keep for generating new permutations
-                                next_nodes.append(current_node.to(edge_node))
-
-                current_nodes = next_nodes
-                next_nodes = []
+            key = cls.key(failure['nodes'])
 
-            failure_node = reduce(lambda x, y: x.to(y),
-                                  failure['nodes'][1:],
-                                  used_starting_failures[failure['nodes'][0]])
+            failure_node = failure_nodes.get(key)
+            if failure_node is None:
+                failure_node = FailureNode(flow, sorted(key), last_allocated)
+                last_allocated = failure_node
+                failure_nodes[key] = failure_node
 
             if 'condition' in failure:
                 nodes_from = [system.node_by_name(n) for n in failure['nodes']]
@@ -211,4 +146,4 @@ class FailureNode:
 
         # we could make enumerable and avoid last_allocated (it would be cleaner), but let's stick with
         # this one for now
-        return last_allocated, starting_failures, predicates
+        return last_allocated, failure_nodes, predicates
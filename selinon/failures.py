@@ -16,13 +16,13 @@ from .helpers import check_conf_keys
 class Failures:
     """Node failures and fallback handling."""
 
-    def __init__(self, raw_definition, system, flow, last_allocated=None, starting_nodes=None, predicates=None):
+    def __init__(self, raw_definition, system, flow, last_allocated=None, failure_nodes=None, predicates=None):
         """Construct failures based on definition stated in YAML config files.
 
         :param raw_definition: raw definition of failures
         :param system: system context
         :param last_allocated: last allocated starting node for linked list
-        :param starting_nodes: starting nodes for failures
+        :param failure_nodes: failure nodes keyed by sets of node names
         :param predicates: all predicates that are used
         """
         self.waiting_nodes = []
@@ -56,7 +56,7 @@ class Failures:
 
         self.raw_definition = raw_definition
         self.last_allocated = last_allocated
-        self.starting_nodes = starting_nodes
+        self.failure_nodes = failure_nodes
         self.predicates = predicates
         self.flow = flow
 
@@ -121,25 +121,25 @@ class Failures:
                 raise ConfigurationError("Unknown configuration option supplied in fallback definition: %s"
                                          % unknown_conf)
 
-        last_allocated, starting_nodes, predicates = FailureNode.construct(flow, system, failures_dict)
-        return Failures(failures_dict, system, flow, last_allocated, starting_nodes, predicates)
+        last_allocated, failure_nodes, predicates = FailureNode.construct(flow, system, failures_dict)
+        return Failures(failures_dict, system, flow, last_allocated, failure_nodes, predicates)
 
     @staticmethod
-    def starting_nodes_name(flow_name):
-        """Create a starting node name for graph of all failures nodes for generated Python config.
+    def failure_nodes_name(flow_name):
+        """Create a name for mapping of all failure nodes for generated Python config.
 
-        :param flow_name: flow name for which the starting node should be created
+        :param flow_name: flow name for which the mapping should be created
         :return: variable name
         :rtype: str
         """
-        return "_%s_failure_starting_nodes" % flow_name
+        return "_%s_failure_nodes" % flow_name
 
     @staticmethod
     def failure_node_name(flow_name, failure_node):
         """Create a failure node name representation for generated Python config.
 
         :param flow_name: name of flow for which the representation should be created
-        :param failure_node: a node from graph of all failure permutations
+        :param failure_node: a failure node
         :return: variable name
         :rtype: str
         """
@@ -165,7 +165,7 @@ class Failures:
 
         :return: names of all nodes that we are expecting to fail for fallbacks
         """
-        return list(self.starting_nodes.keys())
+        return sorted(set(chain(*self.failure_nodes.keys())))
 
     def dump_all_conditions2stream(self, stream):
         """Dump all condition sources that are present to a stream.
@@ -192,22 +192,6 @@ class Failures:
         fail_node = self.last_allocated
 
         while fail_node:
-            next_dict = {}
-            for key, value in fail_node.next.items():
-                next_dict[key] = self.failure_node_name(self.flow.name, value)
-
-            stream.write("%s = {'next': " % self.failure_node_name(self.flow.name, fail_node))
-
-            # print "next_dict"
-            stream.write('{')
-            printed = False
-            for key, value in next_dict.items():
-                if printed:
-                    stream.write(", ")
-                stream.write("'%s': %s" % (key, value))
-                printed = True
-            stream.write('}, ')
-
             conditions = []
             condition_strs = []
             for idx, predicate in enumerate(fail_node.predicates):
@@ -215,17 +199,19 @@ class Failures:
                 condition_strs.append(str(predicate).replace('\'', '\\\''))
 
             # now list of nodes that should be started in case of failure (fallback)
-            stream.write("'fallback': %s, 'propagate_failure': %s, 'conditions': %s, 'condition_strs': %s}\n"
-                         % (fail_node.fallbacks, fail_node.propagate_failures,
-                            str(conditions).replace("'", ""), condition_strs))
+            stream.write("%s = {'fallback': %s, 'propagate_failure': %s, 'conditions': %s, 'condition_strs': %s}\n"
+                         % (self.failure_node_name(self.flow.name, fail_node), fail_node.fallbacks,
+                            fail_node.propagate_failures, str(conditions).replace("'", ""), condition_strs))
             fail_node = fail_node.failure_link
 
-        stream.write("\n%s = {" % self.starting_nodes_name(self.flow.name))
+        stream.write("\n%s = {" % self.failure_nodes_name(self.flow.name))
 
         printed = False
-        for key, value in self.starting_nodes.items():
+        # the largest failures first, dispatcher prefers failures that cover more failed nodes
+        for fail_node in sorted(self.failure_nodes.values(), key=lambda n: (-len(n.traversed), n.traversed)):
             if printed:
                 stream.write(",")
-            stream.write("\n    '%s': %s" % (key, self.failure_node_name(self.flow.name, value)))
+            stream.write("\n    frozenset(%s): %s"
+                         % (tuple(fail_node.traversed), self.failure_node_name(self.flow.name, fail_node)))
             printed = True
         stream.write("\n}\n\n")
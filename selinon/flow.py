@@ -14,6 +14,7 @@ from .errors import ConfigurationError
 from .failures import Failures
 from .helpers import check_conf_keys
 from .node import Node
+from .state_encoding import StateEncoding
 from .strategy import Strategy
 
 
@@ -53,6 +54,9 @@ class Flow(Node):  # pylint: disable=too-many-instance-attributes
         self.max_retry = opts.pop('max_retry', self._DEFAULT_MAX_RETRY)
         self.retry_countdown = opts.pop('retry_countdown', self._DEFAULT_RETRY_COUNTDOWN)
         self.eager_failures = opts.pop('eager_failures', [])
+        self.eager_wakeup = opts.pop('eager_wakeup', False)
+        self.state_encoding = opts.pop('state_encoding', StateEncoding.JSON)
+        self.reorder_conditions = opts.pop('reorder_conditions', True)
 
         # disjoint config options
         assert self.propagate_finished is not True and self.propagate_compound_finished is not True  # nosec
@@ -96,13 +100,29 @@ class Flow(Node):  # pylint: disable=too-many-instance-attributes
         known_conf_keys = ('name', 'failures', 'nowait', 'cache', 'sampling', 'throttling', 'node_args_from_first',
                            'propagate_node_args', 'propagate_finished', 'propagate_parent', 'propagate_parent_failures',
                            'edges', 'propagate_compound_finished', 'queue', 'max_retry', 'retry_countdown',
-                           'propagate_failures', 'propagate_compound_failures', 'eager_failures')
+                           'propagate_failures', 'propagate_compound_failures', 'eager_failures', 'eager_wakeup',
+                           'state_encoding', 'reorder_conditions')
 
         unknown_conf = check_conf_keys(flow_def, known_conf_keys)
         if unknown_conf:
             raise ConfigurationError("Unknown configuration option for flow '%s' supplied: %s"
                                      % (self.name, unknown_conf))
 
+    def _parse_flag(self, flow_def, option, default):
+        """Parse a boolean flow option.
+
+        :param flow_def: dictionary containing flow definition
+        :param option: name of the option
+        :param default: value to be used if the option is not stated
+        :return: value of the option
+        """
+        value = flow_def.get(option, default)
+        if not isinstance(value, bool):
+            raise ConfigurationError("Option '%s' in flow '%s' should be a boolean, got '%s' instead"
+                                     % (option, self.name, value))
+
+        return value
+
     def parse_definition(self, flow_def, system):
         """Parse flow definition (fill flow attributes) from a dictionary.
 
@@ -143,6 +163,13 @@ class Flow(Node):  # pylint: disable=too-many-instance-attributes
                 node = system.node_by_name(node_name)
                 self.add_eager_failure(node)
 
+        self.eager_wakeup = self._parse_flag(flow_def, 'eager_wakeup', self.eager_wakeup)
+        self.reorder_conditions = self._parse_flag(flow_def, 'reorder_conditions', self.reorder_conditions)
+
+        if 'state_encoding' in flow_def:
+            StateEncoding.check_encoding(flow_def['state_encoding'])
+            self.state_encoding = flow_def['state_encoding']
+
         if 'cache' in flow_def:
             if not isinstance(flow_def['cache'], dict):
                 raise ConfigurationError("Flow cache for flow '%s' should be a dict with configuration, "
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Tracking of nodes started by one foreach edge fire as a group with completion counters."""
+
+from .config import Config
+from .helpers import implements_operations
+
+
+class ForeachGroup:
+    """Tracking of nodes started by one foreach edge fire as a group with completion counters.
+
+    Each node started in a group reports its completion once it finishes - it increments the group counter in
+    Celery's result backend and stores its id under a slot given by the counter value. Dispatcher reads counters
+    of all groups in one operation and inspects only nodes that reported their completion since the last
+    dispatcher run instead of polling states of all nodes in the group. Only key-value result backends
+    (e.g. Redis) are supported, with any other result backend nodes are polled one by one.
+    """
+
+    # Number of dispatcher runs without any group progress after which all nodes in the group are polled, this
+    # covers nodes that finished but failed to report their completion (e.g. a worker was killed).
+    FULL_POLL_IDLE_RUNS = 10
+
+    _KEY_PREFIX = 'selinon-group-'
+    _DEFAULT_EXPIRES = 86400
+
+    def __init__(self):
+        """Unused."""
+        raise NotImplementedError()
+
+    @staticmethod
+    def _get_backend():
+        """Get result backend that is capable of storing group counters.
+
+        :return: Celery's key-value result backend, None if not available
+        """
+        backend = getattr(Config.celery_app, 'backend', None)
+        if not implements_operations(backend, ('get', 'set', 'mget', 'delete', 'incr')):
+            return None
+
+        return backend
+
+    @classmethod
+    def _key(cls, group_id, *suffix):
+        """Construct a key for a group record.
+
+        :param group_id: id of the group the record belongs to
+        :param suffix: additional key parts
+        :return: key under which the record is stored
+        """
+        return cls._KEY_PREFIX + '-'.join((group_id,) + tuple(str(item) for item in suffix))
+
+    @staticmethod
+    def _mget(backend, keys):
+        """Retrieve multiple values from the result backend in one operation.
+
+        :param backend: result backend to use
+        :param keys: keys to retrieve
+        :return: a list of values, None for keys that were not found
+        """
+        values = backend.mget(keys)
+        if hasattr(values, 'items'):
+            # Some clients (e.g. memcached) return a mapping instead of a list.
+            values = [values.get(key) for key in keys]
+
+        return [value.decode() if isinstance(value, bytes) else value for value in values]
+
+    @classmethod
+    def is_enabled(cls):
+        """Check whether nodes started by foreach edges can be tracked in groups.
+
+        :return: True if the result backend supports group tracking
+        """
+        return cls._get_backend() is not None
+
+    @classmethod
+    def report(cls, group_id, node_id):
+        """Report completion of a node in a group.
+
+        :param group_id: id of the group the node belongs to
+        :param node_id: id of the node that finished
+        """
+        backend = cls._get_backend()
+        if backend is None:
+            return
+
+        key = cls._key(group_id)
+        sequence = backend.incr(key)
+        backend.expire(key, getattr(backend, 'expires', None) or cls._DEFAULT_EXPIRES)
+        backend.set(cls._key(group_id, sequence), str(node_id))
+
+    @classmethod
+    def poll(cls, groups):
+        """Retrieve nodes that reported their completion in the given groups.
+
+        :param groups: a dict mapping group id to number of completions already seen by dispatcher
+        :return: a dict mapping group id to a tuple - number of completions and a list of ids of nodes that reported
+                 their completion since the last poll (None if ids are not available yet and all nodes in the group
+                 should be polled), empty dict if groups are not supported by the result backend
+        """
+        backend = cls._get_backend()
+        if backend is None or not groups:
+            return {}
+
+        group_ids = list(groups)
+        counts = [int(count or 0) for count in cls._mget(backend, [cls._key(group_id) for group_id in group_ids])]
+
+        slot_keys = []
+        for group_id, count in zip(group_ids, counts):
+            slot_keys.extend(cls._key(group_id, sequence) for sequence in range(groups[group_id] + 1, count + 1))
+        slots = dict(zip(slot_keys, cls._mget(backend, slot_keys))) if slot_keys else {}
+
+        result = {}
+        for group_id, count in zip(group_ids, counts):
+            node_ids = [slots[cls._key(group_id, sequence)] for sequence in range(groups[group_id] + 1, count + 1)]
+            # A node incremented the counter but did not store its id yet.
+            result[group_id] = (count, None if None in node_ids else node_ids)
+
+        return result
+
+    @classmethod
+    def discard(cls, group_id):
+        """Discard group counter once all nodes in the group finished, stored node ids expire with results.
+
+        :param group_id: id of the group
+        """
+        backend = cls._get_backend()
+        if backend is None:
+            return
+
+        backend.delete(cls._key(group_id))
@@ -16,11 +16,22 @@ class GlobalConfig:
     """User global configuration stated in YAML file."""
 
     DEFAULT_CELERY_QUEUE = 'celery'
+    DEFAULT_CLAIM_CHECK_THRESHOLD = 65536
+    # Task name used when storing payloads in claim-check storage.
+    CLAIM_CHECK_TASK_NAME = 'selinon.ClaimCheck'
+    DEFAULT_WRITER_BUFFER_SIZE = 1024
+    DEFAULT_WRITER_BATCH_SIZE = 64
+    DEFAULT_WRITER_TIMEOUT = 30
     predicates_module = 'selinon.predicates'
 
     default_task_queue = DEFAULT_CELERY_QUEUE
     default_dispatcher_queue = DEFAULT_CELERY_QUEUE
     migration_dir = None
+    claim_check_storage = None
+    claim_check_threshold = DEFAULT_CLAIM_CHECK_THRESHOLD
+    write_behind_buffer_size = DEFAULT_WRITER_BUFFER_SIZE
+    write_behind_batch_size = DEFAULT_WRITER_BATCH_SIZE
+    write_behind_timeout = DEFAULT_WRITER_TIMEOUT
 
     _trace_logging = []
     _trace_function = []
@@ -149,6 +160,74 @@ class GlobalConfig:
                                      % (trace_def, type(trace_def)))
         cls._trace_json = trace_def
 
+    @classmethod
+    def _parse_claim_check(cls, system, claim_check_def):
+        """Parse claim-check storage configuration.
+
+        :param system: system instance for storage lookup
+        :param claim_check_def: definition of claim-check storage as supplied in the YAML file
+        """
+        if not isinstance(claim_check_def, dict):
+            raise ConfigurationError("Configuration of claim-check storage expects dict, got '%s' instead (type: %s)"
+                                     % (claim_check_def, type(claim_check_def)))
+
+        if 'storage' not in claim_check_def:
+            raise ConfigurationError('Expected storage name in claim-check configuration, got %s instead'
+                                     % claim_check_def)
+
+        unknown_conf = check_conf_keys(claim_check_def, known_conf_opts=('storage', 'threshold'))
+        if unknown_conf:
+            raise ConfigurationError("Unknown configuration for claim-check storage supplied: %s" % unknown_conf)
+
+        threshold = claim_check_def.get('threshold', cls.DEFAULT_CLAIM_CHECK_THRESHOLD)
+        if not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 0:
+            raise ConfigurationError("Claim-check threshold has to be a non-negative integer, got %r (type: %s)"
+                                     % (threshold, type(threshold)))
+
+        # Check the storage exists.
+        storage = system.storage_by_name(claim_check_def['storage'])
+
+        # Stored copies of node arguments are left in the storage if a flow fails while its nodes are still running.
+        configuration = storage.configuration if isinstance(storage.configuration, dict) else {}
+        task_ttl = configuration.get('task_ttl') or {}
+        if configuration.get('ttl') is None and task_ttl.get(cls.CLAIM_CHECK_TASK_NAME) is None:
+            raise ConfigurationError("Claim-check storage '%s' has to expire stored copies, configure 'ttl' or "
+                                     "'task_ttl' for '%s' in its configuration"
+                                     % (storage.name, cls.CLAIM_CHECK_TASK_NAME))
+
+        cls.claim_check_storage = storage.name
+        cls.claim_check_threshold = threshold
+
+    @classmethod
+    def _parse_write_behind(cls, write_behind_def):
+        """Parse configuration of the writer storing results of tasks with write-behind enabled.
+
+        :param write_behind_def: definition of the writer as supplied in the YAML file
+        """
+        if not isinstance(write_behind_def, dict):
+            raise ConfigurationError("Configuration of write-behind expects dict, got '%s' instead (type: %s)"
+                                     % (write_behind_def, type(write_behind_def)))
+
+        unknown_conf = check_conf_keys(write_behind_def, known_conf_opts=('buffer_size', 'batch_size', 'timeout'))
+        if unknown_conf:
+            raise ConfigurationError("Unknown configuration for write-behind supplied: %s" % unknown_conf)
+
+        buffer_size = write_behind_def.get('buffer_size', cls.DEFAULT_WRITER_BUFFER_SIZE)
+        batch_size = write_behind_def.get('batch_size', cls.DEFAULT_WRITER_BATCH_SIZE)
+        for name, value in (('buffer_size', buffer_size), ('batch_size', batch_size)):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise ConfigurationError("Write-behind %s has to be a positive integer, got %r (type: %s)"
+                                         % (name, value, type(value)))
+
+        timeout = write_behind_def.get('timeout', cls.DEFAULT_WRITER_TIMEOUT)
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            raise ConfigurationError("Write-behind timeout has to be a positive number, got %r (type: %s)"
+                                     % (timeout, type(timeout)))
+
+        cls.write_behind_buffer_size = buffer_size
+        cls.write_behind_batch_size = batch_size
+        cls.write_behind_timeout = timeout
+
     @classmethod
     def _parse_trace(cls, system, trace_record):
         """Parse trace configuration entry.
@@ -222,6 +301,12 @@ class GlobalConfig:
                           "proposed migration dir: %r" % cls.migration_dir
                 raise ConfigurationError(err_msg) from exc
 
+        if 'claim_check' in dict_:
+            cls._parse_claim_check(system, dict_.pop('claim_check'))
+
+        if 'write_behind' in dict_:
+            cls._parse_write_behind(dict_.pop('write_behind'))
+
         if dict_:
             raise ConfigurationError("Unknown configuration options supplied in global configuration section: %s"
                                      % dict_)
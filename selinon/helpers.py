@@ -7,12 +7,14 @@
 """Selinon library helpers."""
 
 from contextlib import contextmanager
+from functools import reduce
 import json
 import logging
 import os
 import subprocess
 import tempfile
 
+from .celery import KeyValueStoreBackend
 from .errors import RequestError
 
 _logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -109,6 +111,59 @@ def get_function_arguments(func):
     return list(func.__code__.co_varnames[:func.__code__.co_argcount])
 
 
+def covering_paths(paths):
+    """Compute key paths that cover all the given key paths - key paths nested in another key path are dropped.
+
+    :param paths: a list of key paths, each key path is a list of keys
+    :return: a list of unique key paths (as lists) that are not nested in each other
+    """
+    result = []
+    for path in sorted((list(path) for path in paths), key=len):
+        if not any(path[:len(other)] == other for other in result):
+            result.append(path)
+
+    return result
+
+
+def assemble_fields(fields):
+    """Assemble a document holding the given fields.
+
+    :param fields: a list of tuples - key path (a list of keys) and value, key paths cannot be nested in each other
+    :return: assembled document
+    """
+    document = {}
+    for path, value in fields:
+        if not path:
+            return value
+
+        node = document
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+
+    return document
+
+
+def project_fields(document, paths):
+    """Project fields of a document (task result) - keep only values under the given key paths.
+
+    The projected document keeps structure of the original document so the given key paths can be looked up in the
+    same way, key paths that cannot be looked up in the document are omitted.
+
+    :param document: document to project fields from
+    :param paths: a list of key paths, each key path is a list of keys
+    :return: projected document
+    """
+    fields = []
+    for path in covering_paths(paths):
+        try:
+            fields.append((path, reduce(lambda item, key: item[key], path, document)))
+        except Exception:  # pylint: disable=broad-except
+            continue
+
+    return assemble_fields(fields)
+
+
 def check_conf_keys(dict_, known_conf_opts):
     """Check supplied configuration options against known configuration options.
 
@@ -166,3 +221,24 @@ def git_previous_version_file(git_hash, file_path, tmp_dir=None):
     with tempfile.NamedTemporaryFile(mode="w", dir=tmp_dir, delete=False) as temp_file:
         temp_file.write(file_content)
         return temp_file.name
+
+
+def implements_operations(backend, operations):
+    """Check whether Celery's result backend implements the given key-value store operations.
+
+    Celery's KeyValueStoreBackend defines all the key-value store operations, but some result backends (e.g.
+    filesystem, S3 or Consul) do not implement all of them and raise NotImplementedError once called.
+
+    :param backend: Celery's result backend to check, can be None
+    :param operations: names of operations that are required
+    :return: True if the result backend implements all the operations
+    """
+    if backend is None:
+        return False
+
+    for operation in operations:
+        implementation = getattr(type(backend), operation, None)
+        if implementation is None or implementation is getattr(KeyValueStoreBackend, operation, None):
+            return False
+
+    return True
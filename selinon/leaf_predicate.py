@@ -174,6 +174,47 @@ class LeafPredicate(Predicate):
         """
         return [self.node] if self.node else []
 
+    def nodes_inspected(self):
+        """Return a list of nodes which results are inspected by this predicate.
+
+        :return: list of nodes which results are inspected
+        :rtype: List[Node]
+        """
+        return [self.node] if self.requires_message() else []
+
+    def is_builtin(self):
+        """Check whether this predicate is one of predicates shipped with Selinon.
+
+        :return: True if predicate is a built-in predicate
+        """
+        return self._func.__module__.startswith('selinon.predicates.')
+
+    def cost(self):
+        """Compute cost class of this predicate based on input it needs.
+
+        Custom predicates are considered to be the most expensive ones as we know nothing about them.
+
+        :return: cost class of this predicate
+        :rtype: int
+        """
+        if not self.is_builtin():
+            return self.COST_CUSTOM
+
+        if self.requires_message():
+            return self.COST_MESSAGE
+
+        if self.requires_node_args():
+            return self.COST_NODE_ARGS
+
+        return self.COST_NO_INPUT
+
+    def reorder_by_cost(self):
+        """Leaf predicates have no operands to reorder.
+
+        :return: this predicate
+        """
+        return self
+
     @classmethod
     def create(cls, name, node, flow, args=None):  # pylint: disable=arguments-differ
         """Create predicate.
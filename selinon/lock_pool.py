@@ -6,30 +6,36 @@
 # ######################################################################
 """Global lock pool for shared locks."""
 
-from multiprocessing import Lock
+from threading import RLock
 
 
 class LockPool:  # pylint: disable=too-few-public-methods
-    """Lock pool for shared locks."""
+    """Striped lock pool for shared locks - a fixed number of locks is shared by all lock ids.
 
-    def __init__(self):
-        """Initialize lock-pool."""
-        self._locks = {}
-        # Instance global lock to defend operations on stored locks
-        self._global_lock = Lock()
+    A lock id is mapped to one of the pre-allocated locks (stripes) by its hash, so the pool does not grow with
+    the number of distinct lock ids and no pool-wide lock is taken to look up a lock. Distinct ids can share a
+    stripe, locks are reentrant so that nested acquisition of colliding ids in one thread does not deadlock.
+    """
+
+    DEFAULT_STRIPES = 64
+
+    def __init__(self, stripes=None, lock_factory=RLock):
+        """Initialize lock-pool.
+
+        :param stripes: number of locks in the pool, defaults to DEFAULT_STRIPES
+        :param lock_factory: a callable creating a lock, threading locks are used as locks guard only threads
+                             of one process
+        """
+        stripes = stripes or self.DEFAULT_STRIPES
+        if stripes < 1:
+            raise ValueError("Number of lock pool stripes has to be a positive integer, got %r" % stripes)
+
+        self._locks = tuple(lock_factory() for _ in range(stripes))
 
     def get_lock(self, lock_id):
         """Get lock for resource, exclusively.
 
-        :param lock_id: lock_id for uniquely identify lock
-        :return: lock, can be acquired if already taken, if new, always released
+        :param lock_id: a hashable lock id to uniquely identify lock
+        :return: lock, can be acquired if already taken, the same lock is returned for the same lock id
         """
-        # TODO: we could make it more optimal by storing only locks that are used and release them once unused
-        with self._global_lock:
-            if not self._locks.get(lock_id):
-                ret = Lock()
-                self._locks[lock_id] = ret
-            else:
-                ret = self._locks[lock_id]
-
-        return ret
+        return self._locks[hash(lock_id) % len(self._locks)]
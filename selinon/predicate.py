@@ -16,6 +16,12 @@ from .helpers import check_conf_keys, dict2json
 class Predicate(metaclass=abc.ABCMeta):
     """An abstract predicate representation."""
 
+    # cost classes of predicates based on input they need for evaluation
+    COST_NO_INPUT = 0
+    COST_NODE_ARGS = 1
+    COST_MESSAGE = 2
+    COST_CUSTOM = 3
+
     @abc.abstractmethod
     def __init__(self):
         """Instantiate predicate representation."""
@@ -66,6 +72,30 @@ class Predicate(metaclass=abc.ABCMeta):
         :rtype: List[Node]
         """
 
+    @abc.abstractmethod
+    def nodes_inspected(self):
+        """Compute all nodes which results are inspected (transitively) by child/children.
+
+        :return: list of nodes which results are inspected
+        :rtype: List[Node]
+        """
+
+    @abc.abstractmethod
+    def cost(self):
+        """Compute cost class of evaluating this predicate (transitively for all children).
+
+        :return: cost class, one of COST_* constants
+        :rtype: int
+        """
+
+    @abc.abstractmethod
+    def reorder_by_cost(self):
+        """Create an equivalent predicate with operands of logical operators ordered by their cost.
+
+        :return: predicate with cheap operands evaluated first
+        :rtype: Predicate
+        """
+
     @staticmethod
     def construct_default(flow):
         """Construct default predicate for edge.
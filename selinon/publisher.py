@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Publishing of node messages scheduled in one dispatcher run."""
+
+import traceback
+import uuid
+
+from .config import Config
+from .trace import Trace
+
+
+class Publisher:
+    """Publish messages of nodes scheduled in one dispatcher run over a single producer connection.
+
+    Celery acquires a producer (and a broker connection) from its pool for each message published. When used as
+    a context manager, the publisher acquires one producer for the whole dispatcher run and all messages are
+    published over it - messages are pipelined to the broker without acquiring the connection and channel for
+    each of them. If publishing over the shared producer fails, the rest of messages is published one by one as
+    Celery would do.
+    """
+
+    def __init__(self):
+        """Initialize publisher, no producer is acquired until the publisher is entered."""
+        self._producer_context = None
+        self._producer = None
+
+    def __enter__(self):
+        """Acquire a producer that is shared for all messages published."""
+        acquire = getattr(Config.celery_app, 'producer_or_acquire', None)
+        if acquire is not None:
+            try:
+                self._producer_context = acquire()
+                self._producer = self._producer_context.__enter__()  # pylint: disable=no-member
+            except Exception:  # pylint: disable=broad-except
+                Trace.log(Trace.PRODUCER_ISSUE, {'what': traceback.format_exc()})
+                self._producer_context = None
+                self._producer = None
+
+        return self
+
+    def __exit__(self, *exc_info):
+        """Release the shared producer, if any."""
+        self._release(*exc_info)
+
+    def _release(self, *exc_info):
+        """Release the shared producer back to the pool.
+
+        :param exc_info: exception information if the producer is released due to an error
+        """
+        producer_context = self._producer_context
+        self._producer_context = None
+        self._producer = None
+
+        if producer_context is not None:
+            try:
+                producer_context.__exit__(*(exc_info or (None, None, None)))
+            except Exception:  # pylint: disable=broad-except
+                Trace.log(Trace.PRODUCER_ISSUE, {'what': traceback.format_exc()})
+
+    def apply_async(self, task, kwargs, queue, countdown=None):
+        """Publish a message for the given Celery task.
+
+        :param task: task instance to be scheduled (Dispatcher or SelinonTaskEnvelope)
+        :param kwargs: task keyword arguments
+        :param queue: queue to publish message to
+        :param countdown: countdown for the message
+        :return: Celery's AsyncResult of the scheduled task
+        """
+        if self._producer is None:
+            return task.apply_async(kwargs=kwargs, queue=queue, countdown=countdown)
+
+        # Task id is assigned upfront so the message is not published twice under different ids on fallback.
+        task_id = str(uuid.uuid4())
+        try:
+            return task.apply_async(kwargs=kwargs, queue=queue, countdown=countdown, task_id=task_id,
+                                    producer=self._producer)
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.PRODUCER_ISSUE, {'queue': queue, 'task_id': task_id, 'what': traceback.format_exc()})
+            self._release()
+
+        return task.apply_async(kwargs=kwargs, queue=queue, countdown=countdown, task_id=task_id)
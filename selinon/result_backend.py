@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Bulk access to node states stored in Celery's result backend."""
+
+from .config import Config
+from .helpers import implements_operations
+
+
+class ResultBackend:
+    """Bulk access to node states stored in Celery's result backend.
+
+    States of all requested nodes are retrieved in one backend operation - a single MGET for key-value result
+    backends (e.g. Redis) or a single query with IN clause for the SQLAlchemy (database) result backend. If the
+    result backend does not support bulk operations, None is returned and callers should fall back to querying
+    node states one by one using Celery's AsyncResult.
+    """
+
+    # Celery task states signalizing that the node has not finished yet.
+    UNREADY_STATES = frozenset(('PENDING', 'RECEIVED', 'STARTED', 'REJECTED', 'RETRY'))
+
+    def __init__(self):
+        """Unused."""
+        raise NotImplementedError()
+
+    @staticmethod
+    def _get_backend():
+        """Get Celery's result backend, if any.
+
+        :return: result backend of the Celery application used
+        """
+        return getattr(Config.celery_app, 'backend', None)
+
+    @staticmethod
+    def _get_metas_key_value(backend, task_ids):
+        """Retrieve task meta information from a key-value result backend using one MGET.
+
+        :param backend: key-value result backend
+        :param task_ids: a list of task ids to retrieve states for
+        :return: a dict mapping task id to its meta information
+        """
+        keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+        values = backend.mget(keys)
+        if hasattr(values, 'items'):
+            # Some clients (e.g. memcached) return a mapping instead of a list.
+            values = [values.get(key) for key in keys]
+
+        result = {}
+        for task_id, value in zip(task_ids, values):
+            result[task_id] = backend.decode_result(value) if value else {'status': 'PENDING', 'result': None}
+
+        return result
+
+    @staticmethod
+    def _get_metas_database(backend, task_ids):
+        """Retrieve task meta information from the database result backend using one query.
+
+        :param backend: database (SQLAlchemy) result backend
+        :param task_ids: a list of task ids to retrieve states for
+        :return: a dict mapping task id to its meta information
+        """
+        from celery.backends.database import session_cleanup  # pylint: disable=import-error
+
+        result = dict.fromkeys(task_ids)
+        session = backend.ResultSession()
+        with session_cleanup(session):
+            for task in session.query(backend.task_cls).filter(backend.task_cls.task_id.in_(task_ids)):
+                result[task.task_id] = backend.meta_from_decoded(task.to_dict())
+
+        for task_id, meta in result.items():
+            if meta is None:
+                result[task_id] = {'status': 'PENDING', 'result': None}
+
+        return result
+
+    @classmethod
+    def get_metas(cls, task_ids):
+        """Retrieve meta information (state) of tasks in one result backend operation.
+
+        :param task_ids: a list of task ids to retrieve states for
+        :return: a dict mapping task id to its meta information, None if the result backend does not support bulk
+                 retrieval
+        """
+        backend = cls._get_backend()
+        if backend is None or not task_ids:
+            return None
+
+        # Key-value result backends without mget support (e.g. S3) are not reported as an issue on each run.
+        if implements_operations(backend, ('mget',)) \
+                and all(hasattr(backend, attr) for attr in ('get_key_for_task', 'decode_result')):
+            return cls._get_metas_key_value(backend, task_ids)
+
+        if all(hasattr(backend, attr) for attr in ('ResultSession', 'task_cls', 'meta_from_decoded')):
+            return cls._get_metas_database(backend, task_ids)
+
+        return None
+
+    @classmethod
+    def is_finished(cls, meta):
+        """Check whether the given meta information states that the task has finished.
+
+        :param meta: task meta information as retrieved by get_metas()
+        :return: True if task has finished (successfully or not)
+        """
+        return meta['status'] not in cls.UNREADY_STATES
+
+    @staticmethod
+    def prime(async_result, meta):
+        """Use already retrieved meta information in AsyncResult so it does not query result backend again.
+
+        :param async_result: Celery's AsyncResult to prime
+        :param meta: task meta information as retrieved by get_metas()
+        """
+        async_result._maybe_set_cache(meta)  # pylint: disable=protected-access
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Write-behind storing of task results - results are stored by a background writer in batches."""
+
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import os
+import queue
+import threading
+import time
+
+from .config import Config
+from .storage_pool import StoragePool
+from .trace import Trace
+
+
+class ResultWriter:
+    """A bounded background writer that stores task results of tasks with write-behind enabled.
+
+    Results of tasks computed concurrently in a worker process (threaded or eventlet/gevent pools) are handed
+    to one writer thread that coalesces them into StoragePool.set_many() calls - one storage operation per task
+    name. The submitting task waits until its result is stored so the task is reported as finished only once
+    its result is durable. If the buffer is full, submitting tasks block until the writer catches up. A task
+    that waits for the writer longer than the configured timeout stores its result on its own.
+    """
+
+    DEFAULT_BUFFER_SIZE = 1024
+    DEFAULT_BATCH_SIZE = 64
+
+    _queue = None
+    _pid = None
+    _start_lock = threading.Lock()
+
+    def __init__(self):
+        """Unused."""
+        raise NotImplementedError()
+
+    @classmethod
+    def _get_queue(cls):
+        """Get buffer of results to be stored, the writer thread is started on the first use in a process.
+
+        :return: queue of results waiting to be stored
+        """
+        # The writer thread does not survive fork - a new one is started in each (pre-forked) worker process.
+        if cls._pid != os.getpid():
+            with cls._start_lock:
+                if cls._pid != os.getpid():
+                    cls._queue = queue.Queue(maxsize=Config.write_behind_buffer_size)
+                    writer = threading.Thread(target=cls._run, args=(cls._queue,), name='selinon-result-writer')
+                    writer.daemon = True
+                    writer.start()
+                    cls._pid = os.getpid()
+
+        return cls._queue
+
+    @classmethod
+    def _run(cls, buffer):
+        """Store buffered results, run by the writer thread.
+
+        :param buffer: queue of results to be stored
+        """
+        while True:
+            items = [buffer.get()]
+            while len(items) < Config.write_behind_batch_size:
+                try:
+                    items.append(buffer.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                cls._flush(items)
+            except Exception as exc:  # pylint: disable=broad-except
+                # The writer has to survive any error, otherwise tasks of this worker would wait for it forever.
+                for _, _, _, _, future in items:
+                    cls._resolve(future, exc=exc)
+
+    @staticmethod
+    def _resolve(future, result=None, exc=None):
+        """Resolve future of a submitted result unless it was already resolved.
+
+        :param future: future to be resolved
+        :param result: result ID of the stored result
+        :param exc: exception to be set if the result was not stored
+        """
+        if future.done():
+            return
+
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    @classmethod
+    def _flush(cls, items):
+        """Store results, results of tasks of the same name in the same flow are stored in one storage operation.
+
+        :param items: a list of tuples - flow name, task name, dispatcher id, record (node arguments, task id,
+                      result) and future
+        """
+        by_task = {}
+        for flow_name, task_name, dispatcher_id, record, future in items:
+            # results whose submitter stopped waiting are stored by the submitter
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                # results of different flow runs are stored separately only if the storage distinguishes flow runs
+                if not StoragePool.stores_dispatcher_id(task_name):
+                    dispatcher_id = None
+            except Exception as exc:  # pylint: disable=broad-except
+                cls._resolve(future, exc=exc)
+                continue
+
+            by_task.setdefault((flow_name, task_name, dispatcher_id), []).append((record, future))
+
+        for (flow_name, task_name, dispatcher_id), entries in by_task.items():
+            try:
+                Trace.log(Trace.RESULT_WRITER_FLUSH, {'flow_name': flow_name,
+                                                      'task_name': task_name,
+                                                      'task_ids': [record[1] for record, _ in entries]})
+                record_ids = StoragePool.set_many(flow_name, task_name, [record for record, _ in entries],
+                                                  dispatcher_id=dispatcher_id)
+                if len(record_ids) != len(entries):
+                    raise ValueError("Storage returned %d result ids for %d results of task '%s' in flow '%s'"
+                                     % (len(record_ids), len(entries), task_name, flow_name))
+            except Exception as exc:  # pylint: disable=broad-except
+                for _, future in entries:
+                    cls._resolve(future, exc=exc)
+            else:
+                for (_, future), record_id in zip(entries, record_ids):
+                    cls._resolve(future, result=record_id)
+
+    @classmethod
+    def _submit_until(cls, deadline, flow_name, task_name, record, dispatcher_id):
+        # pylint: disable=too-many-arguments
+        """Hand task result to the writer, block until the deadline if the buffer is full.
+
+        :param deadline: time (as given by time.monotonic()) until which a free slot in the buffer is awaited
+        :param flow_name: flow in which task was run
+        :param task_name: task that computed result
+        :param record: a tuple - node arguments, task id and result of task
+        :param dispatcher_id: id of dispatcher of the flow run in which task was run
+        :return: a future resolved with result ID once the result is stored, None if the result was not submitted
+        """
+        node_args, task_id, result = record
+        try:
+            return cls.submit(node_args, flow_name, task_name, task_id, result,
+                              dispatcher_id=dispatcher_id, timeout=max(deadline - time.monotonic(), 0))
+        except queue.Full:
+            return None
+
+    @staticmethod
+    def _wait(future, deadline):
+        """Wait until the writer stores a submitted result.
+
+        :param future: future of the submitted result, None if the result was not submitted
+        :param deadline: time (as given by time.monotonic()) until which the writer should store the result
+        :return: a tuple - a flag whether the writer stored the result and result ID
+        """
+        if future is None:
+            return False, None
+
+        try:
+            return True, future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            # The writer is already storing the result, wait for it so the result is not stored twice.
+            if not future.cancel():
+                return True, future.result()
+
+        return False, None
+
+    @classmethod
+    def submit(cls, node_args, flow_name, task_name, task_id, result, dispatcher_id=None, timeout=None):
+        # pylint: disable=too-many-arguments
+        """Hand task result to the writer, block if the buffer is full.
+
+        :param node_args: arguments that were passed to the node
+        :param flow_name: flow in which task was run
+        :param task_name: task that computed result
+        :param task_id: task id that computed result
+        :param result: result that should be stored
+        :param dispatcher_id: id of dispatcher of the flow run in which task was run
+        :param timeout: maximum time in seconds to wait for a free slot in the buffer, wait forever if None
+        :return: a future resolved with result ID once the result is stored
+        :raises queue.Full: if there was no free slot in the buffer within timeout
+        """
+        future = Future()
+        item = (flow_name, task_name, dispatcher_id, (node_args, task_id, result), future)
+        buffer = cls._get_queue()
+        try:
+            buffer.put_nowait(item)
+        except queue.Full:
+            Trace.log(Trace.RESULT_WRITER_FULL, {'flow_name': flow_name,
+                                                 'task_name': task_name,
+                                                 'task_id': task_id,
+                                                 'buffer_size': buffer.maxsize})
+            buffer.put(item, timeout=timeout)
+
+        return future
+
+    @classmethod
+    def set(cls, node_args, flow_name, task_name, task_id, result, dispatcher_id=None):
+        # pylint: disable=too-many-arguments
+        """Store result for task using the writer, wait until the result is stored.
+
+        If the writer does not store the result within the configured timeout, the result is stored directly
+        by the calling task.
+
+        :param node_args: arguments that were passed to the node
+        :param flow_name: flow in which task was run
+        :param task_name: task that computed result
+        :param task_id: task id that computed result
+        :param result: result that should be stored
+        :param dispatcher_id: id of dispatcher of the flow run in which task was run
+        :return: result ID - a unique ID which can be used to reference task results
+        """
+        timeout = Config.write_behind_timeout
+        deadline = time.monotonic() + timeout
+        try:
+            future = cls.submit(node_args, flow_name, task_name, task_id, result,
+                                dispatcher_id=dispatcher_id, timeout=timeout)
+        except queue.Full:
+            future = None
+
+        stored, record_id = cls._wait(future, deadline)
+        if stored:
+            return record_id
+
+        Trace.log(Trace.RESULT_WRITER_TIMEOUT, {'flow_name': flow_name,
+                                                'task_name': task_name,
+                                                'task_id': task_id,
+                                                'timeout': timeout})
+        return StoragePool.set(node_args, flow_name, task_name, task_id, result, dispatcher_id=dispatcher_id)
+
+    @classmethod
+    def set_many(cls, flow_name, task_name, records, dispatcher_id=None):
+        """Store results of multiple tasks using the writer, wait until all the results are stored.
+
+        Results the writer does not store within the configured timeout are stored directly by the calling task
+        in one storage operation.
+
+        :param flow_name: flow in which tasks were run
+        :param task_name: task that computed results
+        :param records: a list of tuples - node arguments, task id and result of task
+        :param dispatcher_id: id of dispatcher of the flow run in which tasks were run
+        :return: a list of result IDs
+        """
+        timeout = Config.write_behind_timeout
+        deadline = time.monotonic() + timeout
+        futures = [cls._submit_until(deadline, flow_name, task_name, record, dispatcher_id) for record in records]
+
+        record_ids = []
+        pending = []
+        for idx, future in enumerate(futures):
+            stored, record_id = cls._wait(future, deadline)
+            if not stored:
+                Trace.log(Trace.RESULT_WRITER_TIMEOUT, {'flow_name': flow_name,
+                                                        'task_name': task_name,
+                                                        'task_id': records[idx][1],
+                                                        'timeout': timeout})
+                pending.append(idx)
+            record_ids.append(record_id)
+
+        if pending:
+            stored_ids = StoragePool.set_many(flow_name, task_name, [records[idx] for idx in pending],
+                                              dispatcher_id=dispatcher_id)
+            for idx, record_id in zip(pending, stored_ids):
+                record_ids[idx] = record_id
+
+        return record_ids
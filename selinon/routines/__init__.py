@@ -18,3 +18,19 @@ def always_run(flow_name, node_name, node_args, task_names, storage_pool):  # py
     :return: None if desired node should be run, id of task that results should be reused
     """
     return None
+
+
+def lookup_field(message, key):
+    """Look up a field in a message, used in generated conditions to share key path lookups among predicates.
+
+    :param message: message (task result) to look up the field in
+    :param key: a list of keys (path) to the field
+    :return: a tuple holding the field value, an empty tuple if the field could not be looked up
+    """
+    try:
+        for item in key:
+            message = message[item]
+    except Exception:  # pylint: disable=broad-except
+        return ()
+
+    return (message,)
@@ -34,6 +34,8 @@ class SelinonTask(metaclass=abc.ABCMeta):
         self.parent = parent
         self.task_id = task_id
         self.dispatcher_id = dispatcher_id
+        # task ids of nodes in the batch if the task is run in batches, see run_batch()
+        self.batch_task_ids = None
         self.log = logging.getLogger(__name__)
 
     def _selinon_dereference_task_id(self, flow_names, task_name, index):
@@ -41,7 +43,7 @@ class SelinonTask(metaclass=abc.ABCMeta):
 
         :param flow_names: name of parent flow or list of flow names in case of nested flows
         :param task_name: name of task in parent flow
-        :param index: index of result if more than one subflow was run
+        :param index: index of result if more than one subflow was run, a slice to compute multiple task ids
         :return: task id based from parent subflows
         """
         if not isinstance(flow_names, list):
@@ -75,11 +77,12 @@ class SelinonTask(metaclass=abc.ABCMeta):
         """
         return StoragePool.get_storage_by_task_name(self.task_name)
 
-    def parent_task_result(self, parent_name):
+    def parent_task_result(self, parent_name, paths=None):
         """Retrieve parent task result.
 
         :param parent_name: name of parent task to retrieve result from
-        :return: result of parent task
+        :param paths: a list of key paths to fields (each key path is a list of keys) if only these fields are needed
+        :return: result of parent task, with only the requested fields if paths were provided
         """
         try:
             parent_task_id = self.parent[parent_name]
@@ -87,6 +90,9 @@ class SelinonTask(metaclass=abc.ABCMeta):
             raise NoParentNodeError("No such parent '%s' in task '%s' in flow '%s', check your configuration"
                                     % (parent_name, self.task_name, self.flow_name)) from exc
 
+        if paths is not None:
+            return StoragePool.retrieve_fields(self.flow_name, parent_name, parent_task_id, paths)
+
         return StoragePool.retrieve(self.flow_name, parent_name, parent_task_id)
 
     def parent_flow_result(self, flow_names, task_name, index=None):
@@ -105,6 +111,17 @@ class SelinonTask(metaclass=abc.ABCMeta):
         task_id = self._selinon_dereference_task_id(flow_names, task_name, index)
         return StoragePool.retrieve(parent_flow_name, task_name, task_id)
 
+    def parent_flow_results(self, flow_names, task_name):
+        """Retrieve results of all tasks of the given name run in parent sub-flows, retrieved in one storage operation.
+
+        :param flow_names: name of parent flow or list of flow names in case of nested flows
+        :param task_name: name of task in parent flow
+        :return: a list of results of tasks in parent subflows
+        """
+        parent_flow_name = flow_names if not isinstance(flow_names, list) else flow_names[-1]
+        task_ids = self._selinon_dereference_task_id(flow_names, task_name, slice(None))
+        return StoragePool.retrieve_many(parent_flow_name, task_name, task_ids)
+
     def parent_task_exception(self, parent_name):
         """Retrieve parent task exception. You have to call this from a fallback (direct or transitive).
 
@@ -158,3 +175,27 @@ class SelinonTask(metaclass=abc.ABCMeta):
         :param node_args: arguments passed to flow/node
         :return: tasks's result that will be stored in database as configured
         """
+
+    def run_batch(self, node_args_list):
+        """Entrypoint for tasks run in batches (see batch_size task configuration option).
+
+        Override to compute results of all items at once, the default implementation runs items one by one with
+        task_id set to task id of the item being run. Task ids of all items are available in batch_task_ids, task_id
+        refers to the message carrying the whole batch otherwise.
+
+        :param node_args_list: a list of node arguments, one for each item in the batch
+        :return: a list of results in the same order as node_args_list, an exception instance marks a failed item
+        """
+        batch_id = self.task_id
+        task_ids = self.batch_task_ids or [batch_id] * len(node_args_list)
+
+        results = []
+        for task_id, node_args in zip(task_ids, node_args_list):
+            self.task_id = task_id
+            try:
+                results.append(self.run(node_args))
+            except Exception as exc:  # pylint: disable=broad-except
+                results.append(exc)
+
+        self.task_id = batch_id
+        return results
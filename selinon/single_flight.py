@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Single-flight coordination of concurrent fetches."""
+
+from concurrent.futures import Future
+import threading
+
+
+class SingleFlight:  # pylint: disable=too-few-public-methods
+    """Coordinate concurrent fetches - concurrent requests for the same key share one in-flight fetch.
+
+    Fetches of different keys run in parallel, the internal lock is held only to look up in-flight fetches.
+    """
+
+    def __init__(self):
+        """Initialize single-flight coordinator."""
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(self, key, fetch):  # pylint: disable=invalid-name
+        """Fetch a value for the given key unless the same key is being fetched, wait for the in-flight fetch if so.
+
+        :param key: key identifying the fetched value
+        :param fetch: a callable without arguments fetching the value
+        :return: fetched value, exceptions raised by fetch are raised in all callers waiting for the key
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fetch()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+        return result
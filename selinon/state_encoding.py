@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Encoding of dispatcher state that is sent in dispatcher messages."""
+
+import base64
+import json
+import uuid
+import zlib
+
+from .errors import ConfigurationError
+
+
+class StateEncoding:
+    """Encoding of dispatcher state that is sent in dispatcher messages.
+
+    The compact encoding is a versioned binary layout - node names are interned and referenced by their index,
+    task ids that are UUIDs are stored as 16 bytes, task ids are grouped by node name and edge indexes are sorted
+    and delta encoded, foreach group ids are interned the same way as node names. Any other state entries are
+    stored as JSON. The binary payload can be compressed using zlib and it is base64 encoded so it can be
+    transferred in JSON messages. States that are not encoded (plain dicts as produced by SystemState.to_dict())
+    are left untouched on decoding so messages produced by older versions of Selinon can still be processed.
+    """
+
+    JSON = 'json'
+    COMPACT = 'compact'
+    COMPACT_ZLIB = 'compact_zlib'
+    ENCODINGS = (JSON, COMPACT, COMPACT_ZLIB)
+
+    _VERSION = 1
+
+    # Task id representation tags.
+    _ID_UUID = 0
+    _ID_STR = 1
+    _ID_INT = 2
+
+    # Entries with a dedicated binary representation, anything else is stored as JSON.
+    _ACTIVE_NODE_KEYS = frozenset(('name', 'id', 'group'))
+    _STATE_KEYS = frozenset(('active_nodes', 'finished_nodes', 'failed_nodes', 'waiting_edges', 'triggered_edges',
+                             'foreach_groups'))
+
+    def __init__(self):
+        """Unused."""
+        raise NotImplementedError()
+
+    @classmethod
+    def check_encoding(cls, encoding):
+        """Check that the given encoding is supported.
+
+        :param encoding: encoding name to check
+        :raises ConfigurationError: if encoding is not supported
+        """
+        if encoding not in cls.ENCODINGS:
+            raise ConfigurationError("Unknown dispatcher state encoding '%s', supported encodings are: %s"
+                                     % (encoding, ', '.join(cls.ENCODINGS)))
+
+    @staticmethod
+    def _write_varint(buffer, number):
+        """Write an unsigned integer using variable length encoding.
+
+        :param buffer: bytearray to write to
+        :param number: non-negative integer to write
+        """
+        while True:
+            byte = number & 0x7F
+            number >>= 7
+            if number:
+                buffer.append(byte | 0x80)
+            else:
+                buffer.append(byte)
+                return
+
+    @staticmethod
+    def _read_varint(data, pos):
+        """Read an unsigned integer written using variable length encoding.
+
+        :param data: bytes to read from
+        :param pos: position to start reading at
+        :return: a tuple - integer read and position after the integer
+        """
+        result = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result, pos
+            shift += 7
+
+    @classmethod
+    def _write_str(cls, buffer, string):
+        """Write a length-prefixed UTF-8 string.
+
+        :param buffer: bytearray to write to
+        :param string: string to write
+        """
+        encoded = string.encode('utf-8')
+        cls._write_varint(buffer, len(encoded))
+        buffer.extend(encoded)
+
+    @classmethod
+    def _read_str(cls, data, pos):
+        """Read a length-prefixed UTF-8 string.
+
+        :param data: bytes to read from
+        :param pos: position to start reading at
+        :return: a tuple - string read and position after the string
+        """
+        length, pos = cls._read_varint(data, pos)
+        return data[pos:pos + length].decode('utf-8'), pos + length
+
+    @classmethod
+    def _write_id(cls, buffer, task_id):
+        """Write a task id, UUIDs are stored in their binary form.
+
+        :param buffer: bytearray to write to
+        :param task_id: task id to write
+        """
+        if isinstance(task_id, int):
+            buffer.append(cls._ID_INT)
+            # zigzag encoding so negative numbers are stored as well
+            cls._write_varint(buffer, (task_id << 1) if task_id >= 0 else ((-task_id << 1) - 1))
+            return
+
+        try:
+            task_uuid = uuid.UUID(task_id)
+        except (ValueError, TypeError, AttributeError):
+            task_uuid = None
+
+        if task_uuid is not None and str(task_uuid) == task_id:
+            buffer.append(cls._ID_UUID)
+            buffer.extend(task_uuid.bytes)
+        else:
+            buffer.append(cls._ID_STR)
+            cls._write_str(buffer, task_id)
+
+    @classmethod
+    def _read_id(cls, data, pos):
+        """Read a task id.
+
+        :param data: bytes to read from
+        :param pos: position to start reading at
+        :return: a tuple - task id read and position after the task id
+        """
+        tag = data[pos]
+        pos += 1
+
+        if tag == cls._ID_UUID:
+            return str(uuid.UUID(bytes=bytes(data[pos:pos + 16]))), pos + 16
+
+        if tag == cls._ID_INT:
+            number, pos = cls._read_varint(data, pos)
+            return (number >> 1) if not number & 1 else -((number + 1) >> 1), pos
+
+        return cls._read_str(data, pos)
+
+    @classmethod
+    def _write_edges(cls, buffer, edges):
+        """Write edge indexes, indexes are sorted and delta encoded.
+
+        :param buffer: bytearray to write to
+        :param edges: edge indexes to write
+        """
+        edges = sorted(edges)
+        cls._write_varint(buffer, len(edges))
+        previous = 0
+        for edge in edges:
+            cls._write_varint(buffer, edge - previous)
+            previous = edge
+
+    @classmethod
+    def _read_edges(cls, data, pos):
+        """Read delta encoded edge indexes.
+
+        :param data: bytes to read from
+        :param pos: position to start reading at
+        :return: a tuple - a list of edge indexes and position after edge indexes
+        """
+        count, pos = cls._read_varint(data, pos)
+        edges = []
+        previous = 0
+        for _ in range(count):
+            delta, pos = cls._read_varint(data, pos)
+            previous += delta
+            edges.append(previous)
+
+        return edges, pos
+
+    @classmethod
+    def _write_extra(cls, buffer, entries, known_keys):
+        """Write entries that have no dedicated binary representation as JSON.
+
+        :param buffer: bytearray to write to
+        :param entries: a dict to write entries from
+        :param known_keys: keys that are written in their binary form
+        """
+        extra = {key: value for key, value in entries.items() if key not in known_keys}
+        cls._write_str(buffer, json.dumps(extra, sort_keys=True) if extra else '')
+
+    @classmethod
+    def _read_extra(cls, data, pos):
+        """Read entries stored as JSON.
+
+        :param data: bytes to read from
+        :param pos: position to start reading at
+        :return: a tuple - a dict of entries read and position after entries
+        """
+        extra, pos = cls._read_str(data, pos)
+        return json.loads(extra) if extra else {}, pos
+
+    @classmethod
+    def _write_nodes(cls, buffer, names, nodes):
+        """Write node ids grouped by interned node names.
+
+        :param buffer: bytearray to write to
+        :param names: a dict mapping node names to their interned index
+        :param nodes: a dict mapping node name to a list of node ids
+        """
+        cls._write_varint(buffer, len(nodes))
+        for node_name, node_ids in nodes.items():
+            cls._write_varint(buffer, names[node_name])
+            cls._write_varint(buffer, len(node_ids))
+            for node_id in node_ids:
+                cls._write_id(buffer, node_id)
+
+    @classmethod
+    def _read_nodes(cls, data, pos, names):
+        """Read node ids grouped by interned node names.
+
+        :param data: bytes to read from
+        :param pos: position to start reading at
+        :param names: a list of interned node names
+        :return: a tuple - a dict mapping node name to a list of node ids and position after nodes
+        """
+        nodes = {}
+        count, pos = cls._read_varint(data, pos)
+        for _ in range(count):
+            name_idx, pos = cls._read_varint(data, pos)
+            ids_count, pos = cls._read_varint(data, pos)
+            node_ids = []
+            for _ in range(ids_count):
+                node_id, pos = cls._read_id(data, pos)
+                node_ids.append(node_id)
+            nodes[names[name_idx]] = node_ids
+
+        return nodes, pos
+
+    @classmethod
+    def _to_bytes(cls, state):
+        """Serialize state to its compact binary form.
+
+        :param state: state as produced by SystemState.to_dict()
+        :return: serialized state
+        """
+        names = {}
+        active_nodes = state.get('active_nodes', [])
+        finished_nodes = state.get('finished_nodes', {})
+        failed_nodes = state.get('failed_nodes', {})
+        foreach_groups = state.get('foreach_groups', {})
+        groups = {group_id: idx for idx, group_id in enumerate(foreach_groups)}
+
+        for node_name in [node['name'] for node in active_nodes] + list(finished_nodes) + list(failed_nodes):
+            names.setdefault(node_name, len(names))
+
+        buffer = bytearray()
+        cls._write_varint(buffer, len(names))
+        for node_name in names:
+            cls._write_str(buffer, node_name)
+
+        cls._write_varint(buffer, len(active_nodes))
+        for node in active_nodes:
+            cls._write_varint(buffer, names[node['name']])
+            cls._write_id(buffer, node['id'])
+            # 0 stands for a node that is not part of any foreach group
+            cls._write_varint(buffer, groups[node['group']] + 1 if 'group' in node else 0)
+            cls._write_extra(buffer, node, cls._ACTIVE_NODE_KEYS)
+
+        cls._write_nodes(buffer, names, finished_nodes)
+        cls._write_nodes(buffer, names, failed_nodes)
+        cls._write_edges(buffer, state.get('waiting_edges', []))
+        cls._write_edges(buffer, state.get('triggered_edges', []))
+
+        cls._write_varint(buffer, len(foreach_groups))
+        for group_id, group in foreach_groups.items():
+            cls._write_id(buffer, group_id)
+            cls._write_varint(buffer, group['seen'])
+            cls._write_varint(buffer, group['idle'])
+
+        cls._write_extra(buffer, state, cls._STATE_KEYS)
+
+        return bytes(buffer)
+
+    @classmethod
+    def _from_bytes(cls, data):
+        """Deserialize state from its compact binary form.
+
+        :param data: serialized state
+        :return: state as produced by SystemState.to_dict()
+        """
+        # pylint: disable=too-many-locals
+        names = []
+        count, pos = cls._read_varint(data, 0)
+        for _ in range(count):
+            node_name, pos = cls._read_str(data, pos)
+            names.append(node_name)
+
+        active_nodes = []
+        count, pos = cls._read_varint(data, pos)
+        for _ in range(count):
+            name_idx, pos = cls._read_varint(data, pos)
+            node_id, pos = cls._read_id(data, pos)
+            group_idx, pos = cls._read_varint(data, pos)
+            extra, pos = cls._read_extra(data, pos)
+            active_nodes.append((names[name_idx], node_id, group_idx, extra))
+
+        finished_nodes, pos = cls._read_nodes(data, pos, names)
+        failed_nodes, pos = cls._read_nodes(data, pos, names)
+        waiting_edges, pos = cls._read_edges(data, pos)
+        triggered_edges, pos = cls._read_edges(data, pos)
+
+        foreach_groups = {}
+        count, pos = cls._read_varint(data, pos)
+        for _ in range(count):
+            group_id, pos = cls._read_id(data, pos)
+            seen, pos = cls._read_varint(data, pos)
+            idle, pos = cls._read_varint(data, pos)
+            foreach_groups[group_id] = {'seen': seen, 'idle': idle}
+
+        extra, pos = cls._read_extra(data, pos)
+
+        group_ids = list(foreach_groups)
+        state = {
+            'active_nodes': [],
+            'finished_nodes': finished_nodes,
+            'failed_nodes': failed_nodes,
+            'waiting_edges': waiting_edges,
+            'triggered_edges': triggered_edges
+        }
+
+        for node_name, node_id, group_idx, node_extra in active_nodes:
+            node = {'name': node_name, 'id': node_id}
+            if group_idx:
+                node['group'] = group_ids[group_idx - 1]
+            node.update(node_extra)
+            state['active_nodes'].append(node)
+
+        if foreach_groups:
+            state['foreach_groups'] = foreach_groups
+
+        state.update(extra)
+
+        return state
+
+    @classmethod
+    def is_encoded(cls, state):
+        """Check whether the given state is encoded.
+
+        :param state: state as received in dispatcher message
+        :return: True if state is encoded and needs to be decoded
+        """
+        return isinstance(state, dict) and 'encoding' in state
+
+    @classmethod
+    def encode(cls, state, encoding):
+        """Encode state so it can be sent in dispatcher message.
+
+        :param state: state as produced by SystemState.to_dict()
+        :param encoding: encoding to be used
+        :return: encoded state
+        """
+        if state is None or encoding == cls.JSON or cls.is_encoded(state):
+            return state
+
+        cls.check_encoding(encoding)
+
+        data = cls._to_bytes(state)
+        compressed = encoding == cls.COMPACT_ZLIB
+        if compressed:
+            data = zlib.compress(data)
+
+        return {
+            'encoding': cls.COMPACT,
+            'version': cls._VERSION,
+            'compressed': compressed,
+            'data': base64.b64encode(data).decode('ascii')
+        }
+
+    @classmethod
+    def decode(cls, state):
+        """Decode state received in dispatcher message, states that are not encoded are returned untouched.
+
+        :param state: state as received in dispatcher message
+        :return: state as produced by SystemState.to_dict()
+        """
+        if not cls.is_encoded(state):
+            return state
+
+        if state['encoding'] != cls.COMPACT or state['version'] > cls._VERSION:
+            raise ValueError("Unsupported dispatcher state encoding '%s' in version %s"
+                             % (state['encoding'], state['version']))
+
+        data = base64.b64decode(state['data'])
+        if state['compressed']:
+            data = zlib.decompress(data)
+
+        return cls._from_bytes(data)
@@ -6,29 +6,42 @@
 # ######################################################################
 """A pool that carries all database connections for workers."""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import json
 import traceback
 
 from .config import Config
 from .errors import CacheMissError
 from .errors import StorageError
 from .errors import UnknownStorageError
+from .helpers import covering_paths
+from .helpers import project_fields
 from .lock_pool import LockPool
+from .single_flight import SingleFlight
 from .trace import Trace
 
 
-class StoragePool:
+class StoragePool:  # pylint: disable=too-many-public-methods
     """A pool that carries all database connections for workers."""
 
     _storage_pool_locks = LockPool()
+    # concurrent retrievals of the same result share one storage call
+    _retrievals = SingleFlight()
+    # asynchronous storages are bound to an event loop, a tuple (loop, async storage, connect lock) per storage name
+    _async_storages = {}
 
-    def __init__(self, id_mapping, flow_name):
+    def __init__(self, id_mapping, flow_name, prefetched=None):
         """Initialize storage pool instance based on the current context.
 
         :param id_mapping: mapping tasks and their ids
         :param flow_name: name of flow for which StoragePool context is created
+        :param prefetched: results retrieved upfront, see prefetch()
         """
         self._id_mapping = id_mapping or {}
         self._flow_name = flow_name
+        self._prefetched = prefetched or {}
 
     @classmethod
     def get_storage_name_by_task_name(cls, task_name, graceful=False):
@@ -78,13 +91,221 @@ class StoragePool:
 
         return storage
 
+    @classmethod
+    def _storage_lock(cls, storage):
+        """Get lock serializing calls on the given storage, calls on thread-safe storages are not serialized.
+
+        :param storage: storage instance to be called
+        :return: a context manager holding the lock
+        """
+        if getattr(storage, 'THREAD_SAFE', False):
+            return nullcontext()
+
+        return cls._storage_pool_locks.get_lock(storage)
+
+    @classmethod
+    def _cache_lock(cls, storage_name):
+        """Get lock guarding task result cache of the given storage.
+
+        :param storage_name: name of storage which cache is accessed
+        :return: lock guarding the cache
+        """
+        return cls._storage_pool_locks.get_lock(('cache', storage_name))
+
+    @classmethod
+    async def get_async_storage_by_task_name(cls, task_name):
+        """Get connected asynchronous storage instance that was assigned to the given task.
+
+        :param task_name: task's name for which storage should be get
+        :rtype: AsyncDataStorage
+        """
+        storage_name = cls.get_storage_name_by_task_name(task_name)
+        loop = asyncio.get_running_loop()
+
+        entry = cls._async_storages.get(storage_name)
+        if entry is None or entry[0] is not loop:
+            storage = Config.storage_mapping[storage_name]
+            lock = None if getattr(storage, 'THREAD_SAFE', False) else cls._storage_pool_locks.get_lock(storage)
+            entry = (loop, storage.to_async(lock=lock), asyncio.Lock())
+            cls._async_storages[storage_name] = entry
+
+        _, async_storage, connect_lock = entry
+        if not async_storage.is_connected():
+            async with connect_lock:
+                if not async_storage.is_connected():
+                    Trace.log(Trace.STORAGE_CONNECT, {'storage_name': storage_name})
+                    await async_storage.connect()
+
+        return async_storage
+
     def get(self, task_name):
         """Retrieve data for task based on mapping for the current context.
 
         :param task_name: task's name that we are retrieving data for
         :return: task's result for the current context
         """
-        return self.retrieve(self._flow_name, task_name, self._id_mapping[task_name])
+        task_id = self._id_mapping[task_name]
+
+        try:
+            return self._prefetched[(task_name, task_id)]
+        except KeyError:
+            return self.retrieve(self._flow_name, task_name, task_id)
+
+    def get_fields(self, task_name, paths):
+        """Retrieve only the given fields of result for task based on mapping for the current context.
+
+        :param task_name: task's name that we are retrieving data for
+        :param paths: a list of key paths to fields, each key path is a list of keys
+        :return: task's result with only the requested fields for the current context
+        """
+        task_id = self._id_mapping[task_name]
+
+        if (task_name, task_id) in self._prefetched:
+            return project_fields(self._prefetched[(task_name, task_id)], paths)
+
+        return self.retrieve_fields(self._flow_name, task_name, task_id, paths)
+
+    def evaluate(self, task_name, predicate, **args):
+        """Evaluate a built-in predicate on result of a task, the predicate is evaluated by the storage if supported.
+
+        :param task_name: task's name which result is inspected
+        :param predicate: built-in predicate to be evaluated
+        :param args: arguments of the predicate
+        :return: True if the predicate holds
+        """
+        task_id = self._id_mapping[task_name]
+        predicate_name = predicate.__module__.rsplit('.', 1)[-1]
+
+        if (task_name, task_id) not in self._prefetched and self.supports_pushdown(task_name, [predicate_name]):
+            key = args['key']
+            try:
+                return self.evaluate_in_storage(self._flow_name, task_name, task_id, predicate_name,
+                                                dict(args, key=key if isinstance(key, list) else [key]))
+            except NotImplementedError:
+                # the storage cannot evaluate predicate with the given arguments
+                pass
+
+        return predicate(message=self.get(task_name), **args)
+
+    @classmethod
+    def supports_pushdown(cls, task_name, predicate_names):
+        """Check whether storage assigned to a task can evaluate the given predicates.
+
+        :param task_name: name of a task which result is inspected
+        :param predicate_names: names of built-in predicates inspecting the result
+        :return: True if all predicates can be evaluated by the storage
+        """
+        storage_name = cls.get_storage_name_by_task_name(task_name, graceful=True)
+        if storage_name is None:
+            return False
+
+        return set(predicate_names) <= Config.storage_mapping[storage_name].PUSHDOWN_PREDICATES
+
+    @classmethod
+    def _trace_msg(cls, flow_name, task_name, **details):
+        """Construct a trace message describing a storage operation on task's result.
+
+        :param flow_name: flow in which the operation is taking place
+        :param task_name: name of task which result is subject of the operation
+        :param details: additional details to be traced
+        :return: trace message
+        """
+        trace_msg = {
+            'task_name': task_name,
+            'storage_task_name': Config.storage_task_name[task_name],
+            'storage_name': cls.get_storage_name_by_task_name(task_name),
+            'flow_name': flow_name
+        }
+        trace_msg.update(details)
+        return trace_msg
+
+    @classmethod
+    def evaluate_in_storage(cls, flow_name, task_name, task_id, predicate_name, args):
+        # pylint: disable=too-many-arguments
+        """Evaluate a built-in predicate on task's result in the storage which was configured for the task.
+
+        :param flow_name: flow in which the evaluation is taking place
+        :param task_name: name of task which result is inspected
+        :param task_id: task ID to uniquely identify task results
+        :param predicate_name: name of the built-in predicate
+        :param args: arguments of the predicate, key path is a list
+        :return: True if the predicate holds
+        :raises NotImplementedError: if the storage cannot evaluate the predicate with the given arguments
+        """
+        storage = cls.get_storage_by_task_name(task_name)
+        trace_msg = cls._trace_msg(flow_name, task_name, task_id=task_id, predicate_name=predicate_name)
+
+        with cls._storage_lock(storage):
+            try:
+                result = bool(storage.evaluate(flow_name, task_name, task_id, predicate_name, args))
+            except NotImplementedError:
+                raise
+            except Exception as exc:
+                error_msg = "Failed to evaluate predicate in storage"
+                Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+                raise StorageError(error_msg) from exc
+
+        Trace.log(Trace.STORAGE_EVALUATE, trace_msg, result=result)
+        return result
+
+    @classmethod
+    def _prefetch_from_storage(cls, flow_name, nodes):
+        """Retrieve results of tasks that share one storage, results of tasks of the same name are retrieved at once.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param nodes: a list of tuples - task name and task id
+        :return: a dict mapping tuple (task name, task id) to task result, results that failed to be retrieved
+                 are omitted
+        """
+        by_task_name = {}
+        for task_name, task_id in nodes:
+            by_task_name.setdefault(task_name, []).append(task_id)
+
+        result = {}
+        for task_name, task_ids in by_task_name.items():
+            try:
+                retrieved = cls.retrieve_many(flow_name, task_name, task_ids)
+            except StorageError:
+                # Already traced, retrieve results one by one so available results are still prefetched.
+                pass
+            else:
+                result.update(((task_name, task_id), task_result) for task_id, task_result in zip(task_ids, retrieved))
+                continue
+
+            for task_id in task_ids:
+                try:
+                    result[(task_name, task_id)] = cls.retrieve(flow_name, task_name, task_id)
+                except StorageError:
+                    # Already traced, retrieval will be retried once the result is actually needed.
+                    pass
+
+        return result
+
+    @classmethod
+    def prefetch(cls, flow_name, nodes):
+        """Retrieve results of multiple tasks upfront.
+
+        Results are grouped by storages, results stored in different storages are retrieved concurrently.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param nodes: an iterable of tuples - task name and task id
+        :return: a dict mapping tuple (task name, task id) to task result that can be passed to StoragePool instance
+        """
+        by_storage = {}
+        for node in nodes:
+            by_storage.setdefault(cls.get_storage_name_by_task_name(node[0]), []).append(node)
+
+        if len(by_storage) < 2:
+            return cls._prefetch_from_storage(flow_name, next(iter(by_storage.values()), []))
+
+        result = {}
+        with ThreadPoolExecutor(max_workers=len(by_storage)) as executor:
+            futures = [executor.submit(cls._prefetch_from_storage, flow_name, storage_nodes)
+                       for storage_nodes in by_storage.values()]
+            for future in futures:
+                result.update(future.result())
+
+        return result
 
     @classmethod
     def retrieve(cls, flow_name, task_name, task_id):
@@ -95,53 +316,212 @@ class StoragePool:
         :param task_id: task ID to uniquely identify task results
         :return: task's result
         """
+        return cls._retrieve(flow_name, task_name, task_id, task_id,
+                             lambda storage: storage.retrieve(flow_name, task_name, task_id))
+
+    @classmethod
+    def retrieve_fields(cls, flow_name, task_name, task_id, paths):
+        """Retrieve only the given fields of task's result from database which was configured for desired task.
+
+        Projected results are cached separately from whole results in task result caches.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param task_name: name of task for which result should be retrieved
+        :param task_id: task ID to uniquely identify task results
+        :param paths: a list of key paths to fields, each key path is a list of keys
+        :return: task's result with only the requested fields
+        """
+        paths = covering_paths(paths)
+        cache_id = '{}:{}'.format(task_id, json.dumps(paths))
+        return cls._retrieve(flow_name, task_name, task_id, cache_id,
+                             lambda storage: storage.retrieve_fields(flow_name, task_name, task_id, paths),
+                             paths=paths)
+
+    @classmethod
+    def _retrieve(cls, flow_name, task_name, task_id, cache_id, retrieve_func, **trace_details):
+        # pylint: disable=too-many-arguments
+        """Retrieve task's result using task result cache, the storage is queried on cache miss.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param task_name: name of task for which result should be retrieved
+        :param task_id: task ID to uniquely identify task results
+        :param cache_id: id of the result in task result cache
+        :param retrieve_func: function retrieving the result from the storage passed as an argument
+        :param trace_details: additional details to be traced
+        :return: task's result
+        """
         storage = cls.get_storage_by_task_name(task_name)
-        storage_task_name = Config.storage_task_name[task_name]
-        storage_name = cls.get_storage_name_by_task_name(task_name)
-        trace_msg = {
-            'task_name': task_name,
-            'storage_task_name': storage_task_name,
-            'storage_name': storage_name,
-            'flow_name': flow_name,
-            'task_id': task_id
-        }
+        trace_msg = cls._trace_msg(flow_name, task_name, task_id=task_id, **trace_details)
+        storage_name = trace_msg['storage_name']
 
-        with cls._storage_pool_locks.get_lock(storage):
-            cache = Config.storage2storage_cache[storage_name]
+        cache = Config.storage2storage_cache[storage_name]
+        cache_lock = cls._cache_lock(storage_name)
+        with cache_lock:
+            result, result_retrieved = cls._cache_get(cache, cache_id, flow_name, trace_msg['storage_task_name'],
+                                                      trace_msg)
 
-            result = None
-            result_retrieved = False
+        if result_retrieved:
+            return result
 
-            # Actually it is OK if there are some issues with task result cache - if there is some issue, just
-            # report it in the tracing mechanism so users are aware of it and try to talk directly to storage
-            # instead.
-            Trace.log(Trace.TASK_RESULT_CACHE_GET, trace_msg)
+        def fetch():
+            Trace.log(Trace.STORAGE_RETRIEVE, trace_msg)
             try:
-                result = cache.get(task_id, task_name=storage_task_name, flow_name=flow_name)
-                result_retrieved = True
-            except CacheMissError:
-                Trace.log(Trace.TASK_RESULT_CACHE_MISS, trace_msg, what=traceback.format_exc())
-            except Exception:  # pylint: disable=broad-except
-                Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
-            else:
-                Trace.log(Trace.TASK_RESULT_CACHE_HIT, trace_msg)
+                with cls._storage_lock(storage):
+                    fetched = retrieve_func(storage)
+            except Exception as exc:
+                error_msg = "Failed to retrieve result from storage after the result was not found in cache"
+                Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+                raise StorageError(error_msg) from exc
 
-            if not result_retrieved:
-                Trace.log(Trace.STORAGE_RETRIEVE, trace_msg)
-                try:
-                    result = storage.retrieve(flow_name, task_name, task_id)
-                except Exception as exc:
-                    error_msg = "Failed to retrieve result from storage after the result was not found in cache"
-                    Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
-                    raise StorageError(error_msg) from exc
+            with cache_lock:
+                cls._cache_add(cache, cache_id, fetched, trace_msg)
+
+            return fetched
+
+        return cls._retrievals.do((storage_name, cache_id), fetch)
+
+    @staticmethod
+    def _cache_get(cache, cache_id, flow_name, storage_task_name, trace_msg):
+        """Get task's result from task result cache.
+
+        :param cache: task result cache to be used
+        :param cache_id: id of the result in task result cache
+        :param flow_name: flow in which the retrieval is taking place
+        :param storage_task_name: name of task under which the result is stored
+        :param trace_msg: trace message describing the retrieval
+        :return: a tuple - task's result and a flag whether the result was found in the cache
+        """
+        # Actually it is OK if there are some issues with task result cache - if there is some issue, just
+        # report it in the tracing mechanism so users are aware of it and try to talk directly to storage
+        # instead.
+        Trace.log(Trace.TASK_RESULT_CACHE_GET, trace_msg)
+        try:
+            result = cache.get(cache_id, task_name=storage_task_name, flow_name=flow_name)
+        except CacheMissError:
+            Trace.log(Trace.TASK_RESULT_CACHE_MISS, trace_msg, what=traceback.format_exc())
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+        else:
+            Trace.log(Trace.TASK_RESULT_CACHE_HIT, trace_msg)
+            return result, True
+
+        return None, False
+
+    @staticmethod
+    def _cache_add(cache, cache_id, result, trace_msg):
+        """Add task's result to task result cache, issues with the cache are only traced.
+
+        :param cache: task result cache to be used
+        :param cache_id: id of the result in task result cache
+        :param result: task's result
+        :param trace_msg: trace message describing the retrieval
+        """
+        Trace.log(Trace.TASK_RESULT_CACHE_ADD, trace_msg)
+        try:
+            cache.add(cache_id, result)
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+
+    @classmethod
+    def _retrieve_many_from_storage(cls, flow_name, task_name, task_ids, trace_msg):
+        """Retrieve results of multiple tasks from the storage in one operation, task result cache is not used.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param task_name: name of task for which results should be retrieved
+        :param task_ids: a list of task IDs to uniquely identify task results
+        :param trace_msg: trace message describing the retrieval
+        :return: a list of task's results in the same order as task_ids
+        """
+        storage = cls.get_storage_by_task_name(task_name)
+        for task_id in task_ids:
+            Trace.log(Trace.STORAGE_RETRIEVE, dict(trace_msg, task_id=task_id))
+
+        try:
+            with cls._storage_lock(storage):
+                return storage.retrieve_many(flow_name, task_name, task_ids)
+        except Exception as exc:
+            error_msg = "Failed to retrieve results from storage after the results were not found in cache"
+            Trace.log(Trace.STORAGE_ISSUE, dict(trace_msg, task_ids=task_ids), what=traceback.format_exc())
+            raise StorageError(error_msg) from exc
 
-            Trace.log(Trace.TASK_RESULT_CACHE_ADD, trace_msg)
+    @classmethod
+    def retrieve_many(cls, flow_name, task_name, task_ids):
+        """Retrieve results of multiple tasks, results that are not cached are retrieved in one storage operation.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param task_name: name of task for which results should be retrieved
+        :param task_ids: a list of task IDs to uniquely identify task results
+        :return: a list of task's results in the same order as task_ids
+        """
+        trace_msg = cls._trace_msg(flow_name, task_name)
+        cache = Config.storage2storage_cache[trace_msg['storage_name']]
+        cache_lock = cls._cache_lock(trace_msg['storage_name'])
+
+        results = {}
+        seen = set()
+        missing = []
+        with cache_lock:
+            for task_id in task_ids:
+                if task_id in seen:
+                    continue
+                seen.add(task_id)
+                result, result_retrieved = cls._cache_get(cache, task_id, flow_name, trace_msg['storage_task_name'],
+                                                          dict(trace_msg, task_id=task_id))
+                if result_retrieved:
+                    results[task_id] = result
+                else:
+                    missing.append(task_id)
+
+        if missing:
+            retrieved = cls._retrieve_many_from_storage(flow_name, task_name, missing, trace_msg)
+            with cache_lock:
+                for task_id, result in zip(missing, retrieved):
+                    cls._cache_add(cache, task_id, result, dict(trace_msg, task_id=task_id))
+                    results[task_id] = result
+
+        return [results[task_id] for task_id in task_ids]
+
+    @classmethod
+    async def retrieve_async(cls, flow_name, task_name, task_id):
+        """Retrieve task's result using asynchronous storage, see retrieve().
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param task_name: name of task for which result should be retrieved
+        :param task_id: task ID to uniquely identify task results
+        :return: task's result
+        """
+        storage = await cls.get_async_storage_by_task_name(task_name)
+        trace_msg = cls._trace_msg(flow_name, task_name, task_id=task_id)
+
+        cache = Config.storage2storage_cache[trace_msg['storage_name']]
+        cache_lock = cls._cache_lock(trace_msg['storage_name'])
+        with cache_lock:
+            result, result_retrieved = cls._cache_get(cache, task_id, flow_name, trace_msg['storage_task_name'],
+                                                      trace_msg)
+
+        if not result_retrieved:
+            Trace.log(Trace.STORAGE_RETRIEVE, trace_msg)
             try:
-                cache.add(task_id, result)
-            except Exception:  # pylint: disable=broad-except
-                Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+                result = await storage.retrieve(flow_name, task_name, task_id)
+            except Exception as exc:
+                error_msg = "Failed to retrieve result from storage after the result was not found in cache"
+                Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+                raise StorageError(error_msg) from exc
 
-            return result
+        with cache_lock:
+            cls._cache_add(cache, task_id, result, trace_msg)
+        return result
+
+    @classmethod
+    async def gather(cls, flow_name, nodes):
+        """Retrieve results of multiple tasks concurrently using asynchronous storages.
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param nodes: an iterable of tuples - task name and task id
+        :return: a list of task's results in the same order as nodes
+        """
+        return list(await asyncio.gather(*(cls.retrieve_async(flow_name, task_name, task_id)
+                                           for task_name, task_id in nodes)))
 
     @classmethod
     def delete(cls, flow_name, task_name, task_id):
@@ -152,17 +532,9 @@ class StoragePool:
         :param task_id: task ID to uniquely identify task results
         """
         storage = cls.get_storage_by_task_name(task_name)
-        storage_task_name = Config.storage_task_name[task_name]
-        storage_name = cls.get_storage_name_by_task_name(task_name)
-        trace_msg = {
-            'task_name': task_name,
-            'storage_task_name': storage_task_name,
-            'storage_name': storage_name,
-            'flow_name': flow_name,
-            'task_id': task_id
-        }
+        trace_msg = cls._trace_msg(flow_name, task_name, task_id=task_id)
 
-        with cls._storage_pool_locks.get_lock(storage):
+        with cls._storage_lock(storage):
             Trace.log(Trace.STORAGE_DELETE, trace_msg)
             try:
                 storage.delete(flow_name, task_name, task_id)
@@ -175,7 +547,49 @@ class StoragePool:
         return
 
     @classmethod
-    def set(cls, node_args, flow_name, task_name, task_id, result):
+    async def delete_async(cls, flow_name, task_name, task_id):
+        """Delete task's result using asynchronous storage, see delete().
+
+        :param flow_name: flow in which the retrieval is taking place
+        :param task_name: name of task for which result should be deleted
+        :param task_id: task ID to uniquely identify task results
+        """
+        storage = await cls.get_async_storage_by_task_name(task_name)
+        trace_msg = cls._trace_msg(flow_name, task_name, task_id=task_id)
+
+        Trace.log(Trace.STORAGE_DELETE, trace_msg)
+        try:
+            await storage.delete(flow_name, task_name, task_id)
+        except Exception as exc:
+            error_msg = "Failed to delete result from storage"
+            Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+            raise StorageError(error_msg) from exc
+        Trace.log(Trace.STORAGE_DELETED, trace_msg)
+
+    @staticmethod
+    def _store_kwargs(storage, dispatcher_id):
+        """Construct additional keyword arguments of store() and store_many() supported by the given storage.
+
+        :param storage: storage (blocking) which stores results
+        :param dispatcher_id: id of dispatcher of the flow run in which tasks were run, if known
+        :return: keyword arguments
+        """
+        if dispatcher_id is not None and getattr(storage, 'STORE_DISPATCHER_ID', False):
+            return {'dispatcher_id': dispatcher_id}
+
+        return {}
+
+    @classmethod
+    def stores_dispatcher_id(cls, task_name):
+        """Check whether storage of the given task distinguishes flow runs when storing results.
+
+        :param task_name: name of task which results are stored
+        :return: True if dispatcher id is passed to storage on store
+        """
+        return bool(cls._store_kwargs(cls.get_storage_by_task_name(task_name), dispatcher_id=True))
+
+    @classmethod
+    def set(cls, node_args, flow_name, task_name, task_id, result, dispatcher_id=None):
         # pylint: disable=too-many-arguments
         """Store result for task.
 
@@ -184,12 +598,14 @@ class StoragePool:
         :param task_name: task that computed result
         :param task_id: task id that computed result
         :param result: result that should be stored
+        :param dispatcher_id: id of dispatcher of the flow run in which task was run, passed to storages that accept it
         :return: result ID - a unique ID which can be used to reference task results
         """
         storage = cls.get_storage_by_task_name(task_name)
         storage_task_name = Config.storage_task_name[task_name]
 
-        record_id = storage.store(node_args, flow_name, storage_task_name, task_id, result)
+        record_id = storage.store(node_args, flow_name, storage_task_name, task_id, result,
+                                  **cls._store_kwargs(storage, dispatcher_id))
         Trace.log(Trace.STORAGE_STORE, {
             'flow_name': flow_name,
             'node_args': node_args,
@@ -201,6 +617,62 @@ class StoragePool:
         })
         return record_id
 
+    @classmethod
+    async def set_async(cls, node_args, flow_name, task_name, task_id, result, dispatcher_id=None):
+        # pylint: disable=too-many-arguments
+        """Store result for task using asynchronous storage, see set().
+
+        :param node_args: arguments that were passed to the node
+        :param flow_name: flow in which task was run
+        :param task_name: task that computed result
+        :param task_id: task id that computed result
+        :param result: result that should be stored
+        :param dispatcher_id: id of dispatcher of the flow run in which task was run, passed to storages that accept it
+        :return: result ID - a unique ID which can be used to reference task results
+        """
+        storage = await cls.get_async_storage_by_task_name(task_name)
+        storage_task_name = Config.storage_task_name[task_name]
+        store_kwargs = cls._store_kwargs(cls.get_storage_by_task_name(task_name), dispatcher_id)
+
+        record_id = await storage.store(node_args, flow_name, storage_task_name, task_id, result, **store_kwargs)
+        Trace.log(Trace.STORAGE_STORE, {
+            'flow_name': flow_name,
+            'node_args': node_args,
+            'task_name': task_name,
+            'storage_task_name': storage_task_name,
+            'task_id': task_id,
+            'storage_name': Config.task2storage_mapping[task_name],
+            'record_id': record_id
+        })
+        return record_id
+
+    @classmethod
+    def set_many(cls, flow_name, task_name, records, dispatcher_id=None):
+        """Store results of multiple tasks in one storage operation.
+
+        :param flow_name: flow in which tasks were run
+        :param task_name: task that computed results
+        :param records: a list of tuples - node arguments, task id and result of task
+        :param dispatcher_id: id of dispatcher of the flow run in which tasks were run, passed to storages that accept it
+        :return: a list of result IDs
+        """
+        storage = cls.get_storage_by_task_name(task_name)
+        storage_task_name = Config.storage_task_name[task_name]
+
+        record_ids = storage.store_many(flow_name, storage_task_name, records,
+                                        **cls._store_kwargs(storage, dispatcher_id))
+        for (node_args, task_id, _), record_id in zip(records, record_ids):
+            Trace.log(Trace.STORAGE_STORE, {
+                'flow_name': flow_name,
+                'node_args': node_args,
+                'task_name': task_name,
+                'storage_task_name': storage_task_name,
+                'task_id': task_id,
+                'storage_name': Config.task2storage_mapping[task_name],
+                'record_id': record_id
+            })
+        return record_ids
+
     @classmethod
     def set_error(cls, node_args, flow_name, task_name, task_id, exc_info):
         # pylint: disable=too-many-arguments
@@ -6,6 +6,7 @@
 # ######################################################################
 """A simple filesystem storage implementation."""
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 
@@ -15,14 +16,19 @@ from selinon import DataStorage, SelinonMissingDataException
 class Filesystem(DataStorage):
     """Selinon adapter for storing task results in a directory."""
 
-    def __init__(self, path=None):
+    THREAD_SAFE = True
+
+    def __init__(self, path=None, max_workers=None):
         """Instantiate Filesystem adapter.
 
         :param path: path to directory to be used
         :type path: str
+        :param max_workers: maximum number of threads reading or writing files of multiple results in parallel
+        :type max_workers: int
         """
         super().__init__()
         self.path = (path or '{PWD}').format(**os.environ)
+        self.max_workers = int(max_workers.format(**os.environ)) if isinstance(max_workers, str) else max_workers
         self._connected = False
 
     def _construct_base_path(self, flow_name, task_name):
@@ -47,6 +53,10 @@ class Filesystem(DataStorage):
         with open(path, 'r') as result_file:
             return json.load(result_file)
 
+    def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda task_id: self.retrieve(flow_name, task_name, task_id), task_ids))
+
     def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
         base_path = self._construct_base_path(flow_name, task_name)
         if not os.path.isdir(base_path):
@@ -57,6 +67,11 @@ class Filesystem(DataStorage):
             json.dump(result, result_file)
         return path
 
+    def store_many(self, flow_name, task_name, records):  # noqa
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda record: self.store(record[0], flow_name, task_name, record[1], record[2]),
+                                     records))
+
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # noqa
         # just to make pylint happy
         raise NotImplementedError()
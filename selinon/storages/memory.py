@@ -11,11 +11,14 @@ from selinon.data_storage import SelinonMissingDataException
 import sys
 
 from selinon import DataStorage
+from selinon.helpers import project_fields
 
 
 class InMemoryStorage(DataStorage):
     """Storage that stores results in memory without persistence."""
 
+    THREAD_SAFE = True
+
     def __init__(self, echo=False, json=False):
         """Initialize storage, values passed from YAML cofig file.
 
@@ -45,13 +48,40 @@ class InMemoryStorage(DataStorage):
     def disconnect(self):  # noqa
         pass
 
+    def _echo(self, result):
+        """Echo retrieved result if requested.
+
+        :param result: retrieved result
+        """
+        if self.echo_file and self.echo_json:
+            jsonlib.dump(result, self.echo_file, sort_keys=True, separators=(',', ': '), indent=2)
+        elif self.echo_file:
+            print(result, file=self.echo_file)
+
     def retrieve(self, flow_name, task_name, task_id):  # noqa
         try:
             result = self.database[task_id]['result']
-            if self.echo_file and self.echo_json:
-                jsonlib.dump(result, self.echo_file, sort_keys=True, separators=(',', ': '), indent=2)
-            elif self.echo_file:
-                print(result, file=self.echo_file)
+            self._echo(result)
+        except KeyError:
+            raise FileNotFoundError("Record not found in database")
+
+        return result
+
+    def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        try:
+            results = [self.database[task_id]['result'] for task_id in task_ids]
+        except KeyError:
+            raise FileNotFoundError("Record not found in database")
+
+        for result in results:
+            self._echo(result)
+
+        return results
+
+    def retrieve_fields(self, flow_name, task_name, task_id, paths):  # noqa
+        try:
+            result = project_fields(self.database[task_id]['result'], paths)
+            self._echo(result)
         except KeyError:
             raise FileNotFoundError("Record not found in database")
 
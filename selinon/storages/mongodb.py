@@ -8,26 +8,36 @@
 
 import os
 
-from selinon.data_storage import SelinonMissingDataException
-
 try:
     from pymongo import MongoClient
+    from pymongo.errors import DuplicateKeyError
 except ImportError as exc:
     raise ImportError("Please install dependencies using `pip3 install selinon[mongodb]` "
                       "in order to use MongoStorage") from exc
 from selinon import DataStorage
+from selinon.data_storage import SelinonMissingDataException
+from selinon.helpers import covering_paths
+from selinon.helpers import project_fields
 
 
-class MongoDB(DataStorage):
+class MongoDB(DataStorage):  # pylint: disable=too-many-instance-attributes
     """MongoDB database adapter."""
 
-    def __init__(self, db_name, collection_name, host=None, port=27017):
+    THREAD_SAFE = True
+
+    # fields of stored records that can be additionally indexed
+    INDEXABLE_FIELDS = frozenset(('flow_name', 'task_name'))
+
+    def __init__(self, db_name, collection_name, host=None, port=27017, create_indexes=True, indexes=None):
+        # pylint: disable=too-many-arguments
         """Instantiate MongoDB storage adapter.
 
         :param db_name: MongoDB database name
         :param collection_name: MongoDB collection name
         :param host: MongoDB host
         :param port: MongoDB port
+        :param create_indexes: create a unique index on task_id (and indexes listed in indexes) on connect
+        :param indexes: a list of additional fields to be indexed - flow_name, task_name
         """
         super().__init__()
         self.client = None
@@ -37,6 +47,13 @@ class MongoDB(DataStorage):
         self.port = int(port.format(**os.environ) if isinstance(port, str) else port)
         self.db_name = db_name.format(**os.environ)
         self.collection_name = collection_name.format(**os.environ)
+        self.create_indexes = create_indexes
+        self.indexes = list(indexes or [])
+
+        unknown_fields = set(self.indexes) - self.INDEXABLE_FIELDS
+        if unknown_fields:
+            raise ValueError("Unknown fields to be indexed in MongoDB: %s, possible values are %s"
+                             % (sorted(unknown_fields), sorted(self.INDEXABLE_FIELDS)))
 
     def is_connected(self):  # noqa
         return self.client is not None
@@ -46,6 +63,17 @@ class MongoDB(DataStorage):
         self.db = self.client[self.db_name]
         self.collection = self.db[self.collection_name]
 
+        if self.create_indexes:
+            # Index creation is a no-op if the index already exists.
+            try:
+                self.collection.create_index('task_id', unique=True)
+            except DuplicateKeyError as exc:
+                raise ValueError("Unable to create unique index on task_id in MongoDB collection %r, the collection "
+                                 "holds multiple records with same task_id - remove duplicate records or set "
+                                 "create_indexes to false in storage configuration" % self.collection_name) from exc
+            for field in self.indexes:
+                self.collection.create_index(field)
+
     def disconnect(self):  # noqa
         if self.is_connected():
             self.client.close()
@@ -53,23 +81,67 @@ class MongoDB(DataStorage):
             self.db = None
             self.collection = None
 
+    # fields of a stored record needed to retrieve task result
+    _RETRIEVE_PROJECTION = {'_id': 0, 'task_id': 1, 'task_name': 1, 'result': 1}
+
     def retrieve(self, flow_name, task_name, task_id):  # noqa
         assert self.is_connected()  # nosec
 
-        documents_count = self.collection.count_documents({'task_id': task_id})
+        # Two records are requested so that duplicates are detected in the same round trip.
+        records = list(self.collection.find({'task_id': task_id}, self._RETRIEVE_PROJECTION, limit=2))
 
-        if documents_count > 1:
+        if len(records) > 1:
             raise ValueError("Multiple records with same task_id found")
 
-        if documents_count == 0:
+        if not records:
             raise FileNotFoundError("Record not found in database")
 
-        # We perform a find_one after ensuring that there is only one document matching the task
-        filtering = {'_id': 0}
-        record = self.collection.find_one({'task_id': task_id}, filtering)
+        assert task_name == records[0]['task_name']  # nosec
+        return records[0].get('result')
+
+    def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        assert self.is_connected()  # nosec
+
+        records = {}
+        for record in self.collection.find({'task_id': {'$in': list(task_ids)}}, self._RETRIEVE_PROJECTION):
+            if record['task_id'] in records:
+                raise ValueError("Multiple records with same task_id found")
+            assert task_name == record['task_name']  # nosec
+            records[record['task_id']] = record
+
+        try:
+            return [records[task_id].get('result') for task_id in task_ids]
+        except KeyError as exc:
+            raise FileNotFoundError("Record not found in database") from exc
+
+    @staticmethod
+    def _projection_prefix(path):
+        """Compute the beginning of a key path that can be projected by MongoDB, the rest is projected by Selinon.
+
+        :param path: key path to a field in result
+        :return: key path prefix that can be used in MongoDB projection
+        """
+        prefix = []
+        for key in path:
+            if not isinstance(key, str) or not key or '.' in key or key.startswith('$'):
+                break
+            prefix.append(key)
+
+        return prefix
+
+    def retrieve_fields(self, flow_name, task_name, task_id, paths):  # noqa
+        assert self.is_connected()  # nosec
+
+        projection = {'_id': 0, 'task_name': 1}
+        for prefix in covering_paths(self._projection_prefix(path) for path in paths):
+            projection['.'.join(['result'] + prefix)] = 1
+
+        record = self.collection.find_one({'task_id': task_id}, projection)
+        if record is None:
+            raise FileNotFoundError("Record not found in database")
 
         assert task_name == record['task_name']  # nosec
-        return record.get('result')
+        return project_fields(record.get('result'), paths)
 
     def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
         assert self.is_connected()  # nosec
@@ -88,6 +160,21 @@ class MongoDB(DataStorage):
         # task_id is unique here
         return task_id
 
+    def store_many(self, flow_name, task_name, records):  # noqa
+        assert self.is_connected()  # nosec
+
+        if records:
+            self.collection.insert_many([{
+                'flow_name': flow_name,
+                'node_args': node_args,
+                'task_name': task_name,
+                'task_id': task_id,
+                'result': result
+            } for node_args, task_id, result in records], ordered=False)
+
+        # task_id is unique here
+        return [task_id for _, task_id, _ in records]
+
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # noqa
         # just to make pylint happy
         raise NotImplementedError()
@@ -96,12 +183,12 @@ class MongoDB(DataStorage):
     def delete(self, flow_name, task_name, task_id):  # noqa
         assert self.is_connected()  # nosec
 
-        documents_count = self.collection.count_documents({'task_id': task_id})
+        if not self.create_indexes:
+            # Uniqueness of task_id is not ensured by an index created on connect, check for duplicates.
+            records = list(self.collection.find({'task_id': task_id}, {'_id': 1}, limit=2))
+            if len(records) > 1:
+                raise ValueError("Multiple records with same task_id found")
 
-        if documents_count > 1:
-            raise ValueError("Multiple records with same task_id found")
-
-        if documents_count == 0:
+        # task_id is unique, ensured by index or checked above
+        if self.collection.delete_one({'task_id': task_id}).deleted_count == 0:
             raise SelinonMissingDataException("Record not found in database")
-
-        self.collection.delete_one({'task_id': task_id})
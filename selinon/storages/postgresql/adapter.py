@@ -6,12 +6,20 @@
 # ######################################################################
 """Selinon SQL Database adapter - PostgreSQL."""
 
+from contextlib import contextmanager
+import json
 import os
 from selinon.data_storage import SelinonMissingDataException
 from selinon import DataStorage
+from selinon.helpers import assemble_fields
+from selinon.helpers import covering_paths
+from selinon.helpers import project_fields
 
 try:
     from sqlalchemy import create_engine
+    from sqlalchemy import insert
+    from sqlalchemy import text
+    from sqlalchemy.orm import scoped_session
     from sqlalchemy.orm import sessionmaker
     from sqlalchemy_utils import create_database
     from sqlalchemy_utils import database_exists
@@ -24,53 +32,208 @@ from .models import Result
 class PostgreSQL(DataStorage):
     """Selinon SQL Database adapter - PostgreSQL."""
 
-    def __init__(self, connection_string, encoding='utf-8', echo=False):
+    # checks of a field in JSONB result evaluated by PostgreSQL, see evaluate()
+    _PUSHDOWN_CHECKS = {
+        'fieldExist': "(result #> CAST(:key AS text[])) IS NOT NULL",
+        'fieldEqual': "(result #> CAST(:key AS text[])) = CAST(:value AS jsonb)",
+        'fieldNotEqual': "(result #> CAST(:key AS text[])) <> CAST(:value AS jsonb)",
+        'fieldNone': "(result #> CAST(:key AS text[])) = 'null'::jsonb",
+        'fieldBool': "jsonb_typeof(result #> CAST(:key AS text[])) = 'boolean'",
+        'fieldDict': "jsonb_typeof(result #> CAST(:key AS text[])) = 'object'",
+        'fieldList': "jsonb_typeof(result #> CAST(:key AS text[])) = 'array'",
+        'fieldStr': "jsonb_typeof(result #> CAST(:key AS text[])) = 'string'"
+    }
+
+    PUSHDOWN_PREDICATES = frozenset(_PUSHDOWN_CHECKS)
+    # each thread uses its own session, connections are taken from engine's connection pool
+    THREAD_SAFE = True
+
+    def __init__(self, connection_string, encoding='utf-8', echo=False, pool_size=None, max_overflow=None,
+                 pool_timeout=None, pool_recycle=None, check_schema=True):
+        # pylint: disable=too-many-arguments,unused-argument
         """Initialize PostgreSQL adapter from YAML configuration file.
 
         :param connection_string: connection string to be used to connect to PostgreSQL to
-        :param encoding: encoding to be used
+        :param encoding: unused, kept for compatibility of configuration files - set client encoding in
+                         connection string instead
         :param echo: perform echo on queries
+        :param pool_size: number of connections kept in connection pool, SQLAlchemy's default if None
+        :param max_overflow: number of connections that can be opened above pool_size, SQLAlchemy's default if None
+        :param pool_timeout: seconds to wait for a connection from connection pool, SQLAlchemy's default if None
+        :param pool_recycle: seconds after which connections are re-established, connections are not recycled if None
+        :param check_schema: create database and the result table with its indexes on connect if they do not exist
         """
         super().__init__()
 
-        self.engine = create_engine(connection_string.format(**os.environ), encoding=encoding, echo=echo)
+        engine_kwargs = {'echo': echo}
+        pool_kwargs = {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': pool_timeout,
+            'pool_recycle': pool_recycle
+        }
+        engine_kwargs.update({key: value for key, value in pool_kwargs.items() if value is not None})
+
+        self.engine = create_engine(connection_string.format(**os.environ), **engine_kwargs)
+        self.check_schema = check_schema
         self.session = None
 
     def is_connected(self):  # noqa
         return self.session is not None
 
     def connect(self):  # noqa
-        if not database_exists(self.engine.url):
-            create_database(self.engine.url)
+        if self.check_schema:
+            if not database_exists(self.engine.url):
+                create_database(self.engine.url)
 
-        self.session = sessionmaker(bind=self.engine)()
-        Result.metadata.create_all(self.engine)
+            Result.metadata.create_all(self.engine)
+            # create_all() does not add indexes to an already existing table
+            for index in Result.__table__.indexes:
+                index.create(self.engine, checkfirst=True)
+
+        self.session = scoped_session(sessionmaker(bind=self.engine))
 
     def disconnect(self):  # noqa
         if self.is_connected():
-            self.session.close()
+            self.session.remove()
             self.session = None
+            self.engine.dispose()
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a transaction of session of the current thread, the transaction is committed on success.
+
+        Finishing the transaction returns the connection to connection pool.
+
+        :return: session of the current thread
+        """
+        session = self.session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
 
     def retrieve(self, flow_name, task_name, task_id):  # noqa
         assert self.is_connected()  # nosec
 
-        record = self.session.query(Result).filter_by(task_id=task_id).one()
+        with self._transaction() as session:
+            record = session.query(Result.task_name, Result.result).filter_by(task_id=task_id).one()
 
         assert record.task_name == task_name  # nosec
         return record.result
 
-    def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
+    def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
         assert self.is_connected()  # nosec
 
-        record = Result(node_args, flow_name, task_name, task_id, result)
+        records = {}
+        with self._transaction() as session:
+            query = session.query(Result.task_id, Result.task_name, Result.result)
+            for record in query.filter(Result.task_id.in_(list(task_ids))):
+                if record.task_id in records:
+                    raise ValueError("Multiple records with same task_id found")
+                assert record.task_name == task_name  # nosec
+                records[record.task_id] = record
+
         try:
-            self.session.add(record)
-            self.session.commit()
-        except Exception:
-            self.session.rollback()
-            raise
+            return [records[task_id].result for task_id in task_ids]
+        except KeyError as exc:
+            raise FileNotFoundError("Record not found in database") from exc
+
+    @staticmethod
+    def _check_pushdown_args(args):
+        """Check whether JSONB operators follow semantics of built-in predicates for the given arguments.
+
+        :param args: arguments of the predicate
+        :raises NotImplementedError: if the predicate cannot be evaluated by PostgreSQL
+        """
+        # JSONB path items are used also as array indexes, Python would not index a list using a string
+        if any(not isinstance(item, str) or item.lstrip('-').isdigit() for item in args['key']):
+            raise NotImplementedError()
+
+        # Python considers booleans to be equal to 0 and 1, JSONB does not; containers can carry booleans
+        value = args.get('value')
+        if isinstance(value, (bool, list, dict)) or (isinstance(value, (int, float)) and value in (0, 1)):
+            raise NotImplementedError()
+
+    def evaluate(self, flow_name, task_name, task_id, predicate_name, args):  # noqa
+        assert self.is_connected()  # nosec
+
+        if predicate_name not in self._PUSHDOWN_CHECKS:
+            raise NotImplementedError()
+        self._check_pushdown_args(args)
+
+        query = text("SELECT task_name, COALESCE({}, false) FROM {} WHERE task_id = :task_id".format(
+            self._PUSHDOWN_CHECKS[predicate_name], Result.__tablename__
+        ))
+        with self._transaction() as session:
+            record = session.execute(query, {
+                'task_id': task_id,
+                'key': args['key'],
+                'value': json.dumps(args.get('value'))
+            }).one()
+
+        assert record[0] == task_name  # nosec
+        return record[1]
+
+    @staticmethod
+    def _projection_prefix(path):
+        """Compute the beginning of a key path that can be extracted by PostgreSQL, the rest is projected by Selinon.
+
+        :param path: key path to a field in result
+        :return: key path prefix that can be used in JSONB path extraction
+        """
+        prefix = []
+        for key in path:
+            # JSONB path items are used also as array indexes, Python would not index a list using a string
+            if not isinstance(key, str) or key.lstrip('-').isdigit():
+                break
+            prefix.append(key)
+
+        return prefix
+
+    def retrieve_fields(self, flow_name, task_name, task_id, paths):  # noqa
+        assert self.is_connected()  # nosec
+
+        prefixes = covering_paths(self._projection_prefix(path) for path in paths)
+        columns = ", ".join("result #> CAST(:path_{0} AS text[]), (result #> CAST(:path_{0} AS text[])) IS NOT NULL"
+                            .format(idx) for idx in range(len(prefixes)))
+        query = text("SELECT task_name, {} FROM {} WHERE task_id = :task_id".format(columns, Result.__tablename__))
+        params = {'path_{}'.format(idx): prefix for idx, prefix in enumerate(prefixes)}
+        params['task_id'] = task_id
+        with self._transaction() as session:
+            record = session.execute(query, params).one()
+
+        assert record[0] == task_name  # nosec
+        # JSON null and a missing field are both None, existence is checked explicitly
+        fields = [(prefix, record[1 + 2 * idx]) for idx, prefix in enumerate(prefixes) if record[2 + 2 * idx]]
+        return project_fields(assemble_fields(fields), paths)
+
+    def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
+        assert self.is_connected()  # nosec
+
+        return self.store_many(flow_name, task_name, [(node_args, task_id, result)])[0]
+
+    def store_many(self, flow_name, task_name, records):  # noqa
+        assert self.is_connected()  # nosec
+
+        if not records:
+            return []
+
+        rows = [{
+            'flow_name': flow_name,
+            'task_name': task_name,
+            'task_id': task_id,
+            'result': result,
+            'node_args': node_args
+        } for node_args, task_id, result in records]
 
-        return record.id
+        # Core insert of all rows in one statement execution - SQLAlchemy batches rows into multi-row INSERTs,
+        # ids are returned in the order of rows.
+        statement = insert(Result).returning(Result.id, sort_by_parameter_order=True)
+        with self._transaction() as session:
+            return list(session.scalars(statement, rows))
 
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # noqa
         # just to make pylint happy
@@ -79,7 +242,8 @@ class PostgreSQL(DataStorage):
     def delete(self, flow_name, task_name, task_id):  # noqa
         assert self.is_connected()  # nosec
 
-        response = self.session.query(Result).filter_by(task_id=task_id).delete()
+        with self._transaction() as session:
+            response = session.query(Result).filter_by(task_id=task_id).delete()
 
         if response == 0:
             raise SelinonMissingDataException("Record not found")
@@ -12,7 +12,7 @@ try:
     from sqlalchemy import Sequence
     from sqlalchemy import String
     from sqlalchemy.dialects.postgresql import JSONB
-    from sqlalchemy.ext.declarative import declarative_base
+    from sqlalchemy.orm import declarative_base
 except ImportError as exc:
     raise ImportError("Please install dependencies using `pip3 install selinon[postgresql]`") from exc
 
@@ -25,8 +25,8 @@ class Result(_Base):
     __tablename__ = 'result'
 
     id = Column(Integer, Sequence('result_id'), primary_key=True)  # pylint: disable=invalid-name
-    flow_name = Column(String(128))
-    task_name = Column(String(128))
+    flow_name = Column(String(128), index=True)
+    task_name = Column(String(128), index=True)
     task_id = Column(String(255), unique=True)
     # We are using JSONB for postgres, if you want to use other database, change column type
     result = Column(JSONB)
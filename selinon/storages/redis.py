@@ -8,9 +8,10 @@
 
 import os
 import json
-from selinon.data_storage import SelinonMissingDataException
 
 from selinon import DataStorage
+from selinon.async_data_storage import AsyncDataStorage
+from selinon.data_storage import SelinonMissingDataException
 
 try:
     import redis
@@ -18,12 +19,228 @@ except ImportError as exc:
     raise ImportError("Please install dependencies using `pip3 install selinon[redis]` "
                       "in order to use RedisStorage") from exc
 
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    # redis<4.2, blocking calls are run in an executor
+    redis_asyncio = None
+
+# Hash layout scripts - results of a flow run are stored in one hash, each task id points to the hash of its flow run.
+# Keys of hashes are computed from pointers so the scripts expect a single (non-cluster) Redis instance.
+
+# KEYS: hash of flow run, pointers of tasks; ARGV: expiration (empty for none), task id and record for each task
+_STORE_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local current = redis.call('TTL', KEYS[1])
+for i = 2, #KEYS do
+    redis.call('HSET', KEYS[1], ARGV[2 * i - 2], ARGV[2 * i - 1])
+    if ttl then
+        redis.call('SET', KEYS[i], KEYS[1], 'EX', ttl)
+    else
+        redis.call('SET', KEYS[i], KEYS[1])
+    end
+end
+if not ttl then
+    redis.call('PERSIST', KEYS[1])
+elseif current == -2 or (current >= 0 and current < ttl) then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return #KEYS - 1
+"""
+
+# KEYS: pointers of tasks; ARGV: task ids
+_RETRIEVE_SCRIPT = """
+local records = {}
+for i = 1, #KEYS do
+    local flow_key = redis.call('GET', KEYS[i])
+    records[i] = flow_key and redis.call('HGET', flow_key, ARGV[i])
+end
+return records
+"""
+
+# KEYS: pointer of task; ARGV: task id
+_DELETE_SCRIPT = """
+local flow_key = redis.call('GET', KEYS[1])
+if not flow_key then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+return redis.call('HDEL', flow_key, ARGV[1])
+"""
+
+# KEYS: hash of flow run; ARGV: prefix of pointers, expiration (empty to delete)
+_FLOW_SCRIPT = """
+for _, task_id in ipairs(redis.call('HKEYS', KEYS[1])) do
+    if ARGV[2] == '' then
+        redis.call('DEL', ARGV[1] .. task_id)
+    else
+        redis.call('EXPIRE', ARGV[1] .. task_id, ARGV[2])
+    end
+end
+if ARGV[2] == '' then
+    return redis.call('DEL', KEYS[1])
+end
+return redis.call('EXPIRE', KEYS[1], ARGV[2])
+"""
+
+
+class _RedisAdapter:  # pylint: disable=too-many-instance-attributes
+    """Connection settings and record layout shared by the blocking and the asynchronous Redis adapter."""
+
+    # a key of hash holding results of a flow run if hash layout is used
+    FLOW_KEY_FORMAT = 'selinon:{flow_name}:{dispatcher_id}'
+    # a key pointing from task id to hash of its flow run if hash layout is used
+    TASK_KEY_FORMAT = 'selinon:task:{task_id}'
+
+    LAYOUT_KEY = 'key'
+    LAYOUT_HASH = 'hash'
+
+    def __init__(self, host, port, db, password, socket_timeout, charset, errors, unix_socket_path, ttl, task_ttl,
+                 layout, max_connections, pool_timeout):
+        # pylint: disable=too-many-arguments,too-many-locals,invalid-name
+        """Initialize connection settings and record layout, see Redis adapter for description of arguments."""
+        super().__init__()
+        self.conn = None
+        self.host = host
+        self.port = port
+        self.db = db  # pylint: disable=invalid-name
+        self.password = password
+        self.socket_timeout = socket_timeout
+        self.charset = charset or 'utf-8'
+        self.errors = errors or 'strict'
+        self.unix_socket_path = unix_socket_path
+        self.ttl = int(ttl) if ttl is not None else None
+        self.task_ttl = {task_name: int(value) for task_name, value in (task_ttl or {}).items()}
+        self.layout = layout or self.LAYOUT_KEY
+        if self.layout not in (self.LAYOUT_KEY, self.LAYOUT_HASH):
+            raise ValueError("Unknown Redis storage layout %r, possible values are %r and %r"
+                             % (self.layout, self.LAYOUT_KEY, self.LAYOUT_HASH))
+        self.max_connections = int(max_connections) if max_connections is not None else None
+        self.pool_timeout = pool_timeout
+        self._scripts = {}
+
+    def _pool_kwargs(self, module):
+        """Construct arguments for a blocking connection pool limited to max_connections.
+
+        :param module: redis module providing connection classes - redis or redis.asyncio
+        :return: keyword arguments for BlockingConnectionPool
+        """
+        kwargs = {
+            'max_connections': self.max_connections,
+            'timeout': self.pool_timeout,
+            'db': self.db,
+            'password': self.password,
+            'socket_timeout': self.socket_timeout,
+            'encoding': self.charset,
+            'encoding_errors': self.errors
+        }
+
+        if self.unix_socket_path:
+            kwargs.update(path=self.unix_socket_path, connection_class=module.UnixDomainSocketConnection)
+        else:
+            kwargs.update(host=self.host, port=self.port)
+
+        return kwargs
+
+    def _register_scripts(self):
+        """Register hash layout scripts on connection, scripts are sent to Redis on their first use."""
+        self._scripts = {
+            'store': self.conn.register_script(_STORE_SCRIPT),
+            'retrieve': self.conn.register_script(_RETRIEVE_SCRIPT),
+            'delete': self.conn.register_script(_DELETE_SCRIPT),
+            'flow': self.conn.register_script(_FLOW_SCRIPT)
+        }
+
+    def _expiry(self, task_name):
+        """Get expiration of results of the given task.
+
+        :param task_name: name of task that computed results
+        :return: expiration in seconds, None if results do not expire
+        """
+        return self.task_ttl.get(task_name, self.ttl)
+
+    def _flow_key(self, flow_name, dispatcher_id):
+        """Get key of hash holding results of the given flow run.
+
+        :param flow_name: name of flow
+        :param dispatcher_id: id of dispatcher of the flow run
+        :return: Redis key
+        """
+        return self.FLOW_KEY_FORMAT.format(flow_name=flow_name, dispatcher_id=dispatcher_id)
+
+    def _task_key(self, task_id):
+        """Get key pointing to hash holding result of the given task.
+
+        :param task_id: id of task
+        :return: Redis key
+        """
+        return self.TASK_KEY_FORMAT.format(task_id=task_id)
+
+    def _decode(self, ret, task_name):
+        """Decode a stored record.
+
+        :param ret: record as retrieved from Redis
+        :param task_name: name of task that result is retrieved
+        :return: task result
+        """
+        if ret is None:
+            raise FileNotFoundError("Record not found in database")
+
+        record = json.loads(ret.decode(self.charset))
+        assert record.get('task_name') == task_name  # nosec
+        return record.get('result')
+
+    @staticmethod
+    def _record(node_args, flow_name, task_name, task_id, result):  # pylint: disable=too-many-arguments
+        """Construct a serialized record to be stored.
+
+        :return: record serialized to JSON
+        """
+        return json.dumps({
+            'node_args': node_args,
+            'flow_name': flow_name,
+            'task_name': task_name,
+            'task_id': task_id,
+            'result': result
+        })
 
-class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
+    def _store_args(self, flow_name, task_name, records, dispatcher_id):
+        """Construct keys and arguments of the hash layout store script.
+
+        Results stored without dispatcher id (e.g. by storage users outside of flows) form a flow run on their own.
+
+        :param flow_name: flow name in which tasks were executed
+        :param task_name: task name that results are going to be stored
+        :param records: a list of tuples - node arguments, task id and result
+        :param dispatcher_id: id of dispatcher of the flow run in which tasks were executed
+        :return: keys and arguments of the script
+        """
+        expiry = self._expiry(task_name)
+        keys = [self._flow_key(flow_name, dispatcher_id or records[0][1])]
+        args = ['' if expiry is None else expiry]
+        for node_args, task_id, result in records:
+            keys.append(self._task_key(task_id))
+            args.extend((task_id, self._record(node_args, flow_name, task_name, task_id, result)))
+
+        return keys, args
+
+    def _check_hash_layout(self):
+        """Make sure results of a flow run are stored together in a hash."""
+        if self.layout != self.LAYOUT_HASH:
+            raise ValueError("Operations on results of a whole flow run require 'hash' layout, layout is %r"
+                             % self.layout)
+
+
+class Redis(_RedisAdapter, DataStorage):
     """Selinon adapter for Redis database."""
 
+    THREAD_SAFE = True
+    STORE_DISPATCHER_ID = True
+
     def __init__(self, host=None, port=6379, db=0, password=None, socket_timeout=None, connection_pool=None,
-                 charset=None, errors=None, unix_socket_path=None):
+                 charset=None, errors=None, unix_socket_path=None, ttl=None, task_ttl=None, layout=None,
+                 max_connections=None, pool_timeout=None):
+        # pylint: disable=too-many-arguments
         """Instantiate Redis database adapter.
 
         :param host: Redis host
@@ -35,26 +252,44 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
         :param charset: connection character set
         :param errors: error treating method
         :param unix_socket_path: path to unix socket, if any
+        :param ttl: expiration of stored results in seconds, results do not expire by default
+        :param task_ttl: a dict mapping task name to expiration of its results in seconds, overrides ttl
+        :param layout: 'key' (default) to store each result under its task id, 'hash' to store results of a flow
+                       run in one hash so they can be retrieved or expired together
+        :param max_connections: maximum number of connections in connection pool, unbounded by default
+        :param pool_timeout: seconds to wait for a free connection if max_connections is reached, wait
+                             indefinitely by default
         """
-        super().__init__()
-        self.conn = None
-        self.host = host.format(**os.environ) if host else 'localhost'
-        self.port = int(port.format(**os.environ)) if isinstance(port, str) else port
-        self.db = int(db.format(**os.environ) if isinstance(db, str) else db)  # pylint: disable=invalid-name
-        self.password = password.format(**os.environ) if password else None
-        self.socket_timeout = socket_timeout
+        super().__init__(
+            host=host.format(**os.environ) if host else 'localhost',
+            port=int(port.format(**os.environ)) if isinstance(port, str) else port,
+            db=int(db.format(**os.environ) if isinstance(db, str) else db),
+            password=password.format(**os.environ) if password else None,
+            socket_timeout=socket_timeout,
+            charset=charset,
+            errors=errors,
+            unix_socket_path=unix_socket_path,
+            ttl=ttl,
+            task_ttl=task_ttl,
+            layout=layout,
+            max_connections=max_connections,
+            pool_timeout=pool_timeout
+        )
         self.connection_pool = connection_pool
-        self.charset = charset or 'utf-8'
-        self.errors = errors or 'strict'
-        self.unix_socket_path = unix_socket_path
 
     def is_connected(self):  # noqa
         return self.conn is not None
 
     def connect(self):  # noqa
+        connection_pool = self.connection_pool
+        if connection_pool is None and self.max_connections:
+            connection_pool = redis.BlockingConnectionPool(**self._pool_kwargs(redis))
+
         self.conn = redis.Redis(host=self.host, port=self.port, db=self.db, password=self.password,
-                                socket_timeout=self.socket_timeout, connection_pool=self.connection_pool,
-                                charset=self.charset, errors=self.errors)
+                                socket_timeout=self.socket_timeout, connection_pool=connection_pool,
+                                encoding=self.charset, encoding_errors=self.errors,
+                                unix_socket_path=self.unix_socket_path)
+        self._register_scripts()
 
     def disconnect(self):  # noqa
         if self.is_connected():
@@ -64,30 +299,105 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
     def retrieve(self, flow_name, task_name, task_id):  # noqa
         assert self.is_connected()  # nosec
 
-        ret = self.conn.get(task_id)
+        if self.layout == self.LAYOUT_HASH:
+            ret = self._scripts['retrieve'](keys=[self._task_key(task_id)], args=[task_id])[0]
+        else:
+            ret = self.conn.get(task_id)
 
-        if ret is None:
-            raise FileNotFoundError("Record not found in database")
+        return self._decode(ret, task_name)
 
-        record = json.loads(ret.decode(self.charset))
+    def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        assert self.is_connected()  # nosec
 
-        assert record.get('task_name') == task_name  # nosec
-        return record.get('result')
+        if not task_ids:
+            return []
+
+        if self.layout == self.LAYOUT_HASH:
+            rets = self._scripts['retrieve'](keys=[self._task_key(task_id) for task_id in task_ids], args=task_ids)
+        else:
+            rets = self.conn.mget(task_ids)
 
-    def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
+        return [self._decode(ret, task_name) for ret in rets]
+
+    def retrieve_flow(self, flow_name, dispatcher_id):
+        """Retrieve all results of a flow run in one round trip, available only with hash layout.
+
+        :param flow_name: flow name in which tasks were executed
+        :param dispatcher_id: id of dispatcher of the flow run
+        :return: a dict mapping task id to task result
+        """
         assert self.is_connected()  # nosec
+        self._check_hash_layout()
 
-        record = {
-            'node_args': node_args,
-            'flow_name': flow_name,
-            'task_name': task_name,
-            'task_id': task_id,
-            'result': result
-        }
+        results = {}
+        for task_id, ret in self.conn.hgetall(self._flow_key(flow_name, dispatcher_id)).items():
+            record = json.loads(ret.decode(self.charset))
+            results[task_id.decode(self.charset)] = record.get('result')
+
+        return results
+
+    def expire_flow(self, flow_name, dispatcher_id, ttl):
+        """Set expiration of all results of a flow run, available only with hash layout.
+
+        :param flow_name: flow name in which tasks were executed
+        :param dispatcher_id: id of dispatcher of the flow run
+        :param ttl: expiration in seconds
+        """
+        assert self.is_connected()  # nosec
+        self._check_hash_layout()
+
+        if not self._scripts['flow'](keys=[self._flow_key(flow_name, dispatcher_id)], args=[self._task_key(''), ttl]):
+            raise SelinonMissingDataException("No results of flow %r run %r found in database"
+                                              % (flow_name, dispatcher_id))
+
+    def delete_flow(self, flow_name, dispatcher_id):
+        """Delete all results of a flow run, available only with hash layout.
+
+        :param flow_name: flow name in which tasks were executed
+        :param dispatcher_id: id of dispatcher of the flow run
+        """
+        assert self.is_connected()  # nosec
+        self._check_hash_layout()
+
+        if not self._scripts['flow'](keys=[self._flow_key(flow_name, dispatcher_id)], args=[self._task_key(''), '']):
+            raise SelinonMissingDataException("No results of flow %r run %r found in database"
+                                              % (flow_name, dispatcher_id))
+
+    def store(self, node_args, flow_name, task_name, task_id, result, dispatcher_id=None):
+        # pylint: disable=too-many-arguments,arguments-differ
+        """Store result in Redis, see DataStorage.store().
+
+        :param dispatcher_id: id of dispatcher of the flow run in which task was executed, used with hash layout
+        """
+        assert self.is_connected()  # nosec
+
+        if self.layout == self.LAYOUT_HASH:
+            self.store_many(flow_name, task_name, [(node_args, task_id, result)], dispatcher_id=dispatcher_id)
+        else:
+            record = self._record(node_args, flow_name, task_name, task_id, result)
+            self.conn.set(task_id, record, ex=self._expiry(task_name))
 
-        self.conn.set(task_id, json.dumps(record))
         return task_id
 
+    def store_many(self, flow_name, task_name, records, dispatcher_id=None):  # pylint: disable=arguments-differ
+        """Store results in Redis in one round trip, see DataStorage.store_many().
+
+        :param dispatcher_id: id of dispatcher of the flow run in which tasks were executed, used with hash layout
+        """
+        assert self.is_connected()  # nosec
+
+        if records and self.layout == self.LAYOUT_HASH:
+            keys, args = self._store_args(flow_name, task_name, records, dispatcher_id)
+            self._scripts['store'](keys=keys, args=args)
+        elif records:
+            expiry = self._expiry(task_name)
+            pipeline = self.conn.pipeline(transaction=False)
+            for node_args, task_id, result in records:
+                pipeline.set(task_id, self._record(node_args, flow_name, task_name, task_id, result), ex=expiry)
+            pipeline.execute()
+
+        return [task_id for _, task_id, _ in records]
+
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # noqa
         # just to make pylint happy
         raise NotImplementedError()
@@ -96,7 +406,102 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
     def delete(self, flow_name, task_name, task_id):  # noqa
         assert self.is_connected()  # nosec
 
-        ret = self.conn.delete(task_id)
+        if self.layout == self.LAYOUT_HASH:
+            ret = self._scripts['delete'](keys=[self._task_key(task_id)], args=[task_id])
+        else:
+            ret = self.conn.delete(task_id)
+
+        if ret == 0:
+            raise SelinonMissingDataException("Record not found in database")
+
+    def to_async(self, lock=None):  # noqa
+        if redis_asyncio is None or self.connection_pool is not None:
+            return super().to_async(lock=lock)
+
+        return AsyncRedis(host=self.host, port=self.port, db=self.db, password=self.password,
+                          socket_timeout=self.socket_timeout, charset=self.charset, errors=self.errors,
+                          unix_socket_path=self.unix_socket_path, ttl=self.ttl, task_ttl=self.task_ttl,
+                          layout=self.layout, max_connections=self.max_connections, pool_timeout=self.pool_timeout)
+
+
+class AsyncRedis(_RedisAdapter, AsyncDataStorage):
+    """Asynchronous Selinon adapter for Redis database, records are compatible with Redis adapter."""
+
+    def __init__(self, host=None, port=6379, db=0, password=None, socket_timeout=None, charset=None, errors=None,
+                 unix_socket_path=None, ttl=None, task_ttl=None, layout=None, max_connections=None,
+                 pool_timeout=None):
+        # pylint: disable=too-many-arguments
+        """Instantiate asynchronous Redis database adapter, see Redis adapter for description of arguments."""
+        super().__init__(host=host or 'localhost', port=port, db=db, password=password, socket_timeout=socket_timeout,
+                         charset=charset, errors=errors, unix_socket_path=unix_socket_path, ttl=ttl,
+                         task_ttl=task_ttl, layout=layout, max_connections=max_connections,
+                         pool_timeout=pool_timeout)
+
+    def is_connected(self):  # noqa
+        return self.conn is not None
+
+    async def connect(self):  # noqa
+        connection_pool = None
+        if self.max_connections:
+            connection_pool = redis_asyncio.BlockingConnectionPool(**self._pool_kwargs(redis_asyncio))
+
+        self.conn = redis_asyncio.Redis(host=self.host, port=self.port, db=self.db, password=self.password,
+                                        socket_timeout=self.socket_timeout, connection_pool=connection_pool,
+                                        encoding=self.charset, encoding_errors=self.errors,
+                                        unix_socket_path=self.unix_socket_path)
+        self._register_scripts()
+
+    async def disconnect(self):  # noqa
+        if self.is_connected():
+            # aclose() superseded close() in redis 5.0.1
+            await getattr(self.conn, 'aclose', self.conn.close)()
+            self.conn = None
+
+    async def retrieve(self, flow_name, task_name, task_id):  # noqa
+        assert self.is_connected()  # nosec
+
+        if self.layout == self.LAYOUT_HASH:
+            ret = (await self._scripts['retrieve'](keys=[self._task_key(task_id)], args=[task_id]))[0]
+        else:
+            ret = await self.conn.get(task_id)
+
+        return self._decode(ret, task_name)
+
+    async def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        assert self.is_connected()  # nosec
+
+        if not task_ids:
+            return []
+
+        if self.layout == self.LAYOUT_HASH:
+            rets = await self._scripts['retrieve'](keys=[self._task_key(task_id) for task_id in task_ids],
+                                                   args=task_ids)
+        else:
+            rets = await self.conn.mget(task_ids)
+
+        return [self._decode(ret, task_name) for ret in rets]
+
+    async def store(self, node_args, flow_name, task_name, task_id, result, dispatcher_id=None):
+        # pylint: disable=too-many-arguments,arguments-differ
+        """Store result in Redis, see Redis.store()."""
+        assert self.is_connected()  # nosec
+
+        if self.layout == self.LAYOUT_HASH:
+            keys, args = self._store_args(flow_name, task_name, [(node_args, task_id, result)], dispatcher_id)
+            await self._scripts['store'](keys=keys, args=args)
+        else:
+            record = self._record(node_args, flow_name, task_name, task_id, result)
+            await self.conn.set(task_id, record, ex=self._expiry(task_name))
+
+        return task_id
+
+    async def delete(self, flow_name, task_name, task_id):  # noqa
+        assert self.is_connected()  # nosec
+
+        if self.layout == self.LAYOUT_HASH:
+            ret = await self._scripts['delete'](keys=[self._task_key(task_id)], args=[task_id])
+        else:
+            ret = await self.conn.delete(task_id)
 
         if ret == 0:
             raise SelinonMissingDataException("Record not found in database")
@@ -6,6 +6,7 @@
 # ######################################################################
 """Selinon adapter for Amazon S3 storage."""
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 
@@ -17,7 +18,7 @@ except ImportError as exc:
 from selinon import DataStorage, SelinonMissingDataException
 
 
-class S3(DataStorage):
+class S3(DataStorage):  # pylint: disable=too-many-instance-attributes
     """Amazon S3 storage adapter.
 
     For credentials configuration see boto3 library configuration
@@ -25,7 +26,8 @@ class S3(DataStorage):
     """
 
     def __init__(self, bucket, location=None, endpoint_url=None, use_ssl=None,
-                 aws_access_key_id=None, aws_secret_access_key=None, region_name=None, serialize_json=False):
+                 aws_access_key_id=None, aws_secret_access_key=None, region_name=None, serialize_json=False,
+                 max_workers=None):
         """Initialize S3 storage adapter from YAML configuration file.
 
         :param bucket: bucket name to be used
@@ -36,6 +38,7 @@ class S3(DataStorage):
         :param aws_secret_access_key: AWS secret access key
         :param region_name: region to be used
         :param serialize_json: serialize JSON output (dict or list) to a blob - needed as S3 objects are blobs
+        :param max_workers: maximum number of concurrent requests when retrieving or storing multiple results
         """
         # AWS access key and access id are handled by Boto - place them to config or use env variables
         super().__init__()
@@ -45,6 +48,7 @@ class S3(DataStorage):
         self._use_ssl = bool(use_ssl.format(**os.environ) if isinstance(use_ssl, str) else use_ssl)
         self._endpoint_url = endpoint_url.format(**os.environ) if endpoint_url else None
         self._serialize_json = serialize_json
+        self._max_workers = int(max_workers.format(**os.environ)) if isinstance(max_workers, str) else max_workers
         aws_access_key_id = aws_access_key_id.format(**os.environ) if aws_access_key_id else None
         aws_secret_access_key = aws_secret_access_key.format(**os.environ) if aws_secret_access_key else None
         region_name = region_name.format(**os.environ) if region_name else None
@@ -89,6 +93,21 @@ class S3(DataStorage):
 
         return json.loads(blob.decode())
 
+    def retrieve_many(self, flow_name, task_name, task_ids):  # noqa
+        assert self.is_connected()  # nosec
+
+        def retrieve_blob(task_id):
+            # resources are not thread-safe, the low-level client is
+            return self._s3.meta.client.get_object(Bucket=self._bucket_name, Key=task_id)['Body'].read()
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            blobs = list(executor.map(retrieve_blob, task_ids))
+
+        if not self._serialize_json:
+            return blobs
+
+        return [json.loads(blob.decode()) for blob in blobs]
+
     def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
         assert self.is_connected()  # nosec
 
@@ -97,6 +116,20 @@ class S3(DataStorage):
 
         self._s3.Object(self._bucket_name, task_id).put(Body=result)
 
+    def store_many(self, flow_name, task_name, records):  # noqa
+        assert self.is_connected()  # nosec
+
+        def store_blob(record):
+            _, task_id, result = record
+            if self._serialize_json:
+                result = json.dumps(result).encode()
+            # resources are not thread-safe, the low-level client is
+            self._s3.meta.client.put_object(Bucket=self._bucket_name, Key=task_id, Body=result)
+            return task_id
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            return list(executor.map(store_blob, records))
+
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # noqa
         # just to make pylint happy
         raise NotImplementedError()
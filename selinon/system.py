@@ -15,6 +15,7 @@ import yaml
 
 import graphviz
 
+from .condition_compiler import ConditionCompiler
 from .errors import ConfigurationError
 from .flow import Flow
 from .global_config import GlobalConfig
@@ -200,14 +201,13 @@ class System:
                 return task_class
         return None
 
-    def _dump_imports(self, output):
-        """Dump used imports of tasks to a stream.
+    def _collect_flow_imports(self):
+        """Collect predicates and caches used in flows.
 
-        :param output: a stream to write to
+        :return: a tuple - a set of predicate names and a set of cache imports (import path and cache name)
         """
         predicates = set()
         cache_imports = set()
-        selective_run_function_imports = set()
 
         for flow in self.flows:
             for edge in flow.edges:
@@ -220,6 +220,16 @@ class System:
 
             cache_imports.add((flow.cache_config.import_path, flow.cache_config.name))
 
+        return predicates, cache_imports
+
+    def _dump_imports(self, output):
+        """Dump used imports of tasks to a stream.
+
+        :param output: a stream to write to
+        """
+        predicates, cache_imports = self._collect_flow_imports()
+        selective_run_function_imports = set()
+
         if predicates:
             output.write('from %s import %s\n' % (GlobalConfig.predicates_module, ", ".join(predicates)))
 
@@ -237,7 +247,6 @@ class System:
 
         for storage in self.storages:
             output.write("from {} import {}\n".format(storage.import_path, storage.class_name))
-            cache_imports.add((flow.cache_config.import_path, flow.cache_config.name))
 
         for import_path, cache_name in cache_imports:
             output.write("from {} import {}\n".format(import_path, cache_name))
@@ -249,6 +258,10 @@ class System:
                 SelectiveRunFunction.construct_import_name(function_name, import_path)
             ))
 
+        # helpers used in compiled conditions
+        for import_path, name, alias in ConditionCompiler.IMPORTS:
+            output.write("from {} import {} as {}\n".format(import_path, name, alias))
+
         # we need partial for strategy function and for using storage as trace destination
         output.write("\nimport functools\n")
         # we need datetime for timedelta in throttling
@@ -306,6 +319,14 @@ class System:
                         'propagate_compound_failures',
                         {f.name: f.propagate_compound_failures for f in self.flows})
 
+        self._dump_dict(stream,
+                        'eager_wakeup',
+                        {f.name: f.eager_wakeup for f in self.flows})
+
+        self._dump_dict(stream,
+                        'state_encoding',
+                        {f.name: "'%s'" % f.state_encoding for f in self.flows})
+
     @staticmethod
     def _dump_dict(output, dict_name, dict_items):
         """Dump propagate_finished flag configuration to a stream.
@@ -485,8 +506,9 @@ class System:
         """
         for flow in self.flows:
             for idx, edge in enumerate(flow.edges):
-                output.write('def {}(db, node_args):\n'.format(edge.predicate.construct_condition_name(flow.name, idx)))
-                output.write('    return {}\n\n\n'.format(edge.predicate.to_source()))
+                compiler = ConditionCompiler(edge.predicate, flow.reorder_conditions)
+                output.write(compiler.to_source(edge.predicate.construct_condition_name(flow.name, idx)))
+                output.write('\n\n\n')
 
             if flow.failures:
                 flow.failures.dump_all_conditions2stream(output)
@@ -541,6 +563,20 @@ class System:
             printed = True
         output.write('\n}\n\n')
 
+    def _dump_batch_size(self, output):
+        """Dump batch sizes of tasks that are run in batches to a stream.
+
+        :param output: a stream to write to
+        """
+        self._dump_dict(output, 'batch_size', {t.name: t.batch_size for t in self.tasks if t.batch_size > 1})
+
+    def _dump_write_behind(self, output):
+        """Dump tasks which results are stored by the write-behind writer to a stream.
+
+        :param output: a stream to write to
+        """
+        self._dump_dict(output, 'write_behind', {t.name: True for t in self.tasks if t.write_behind})
+
     def _dump_selective_run_functions(self, output):
         """Dump all selective run functions.
 
@@ -560,9 +596,45 @@ class System:
         for flow in self.flows:
             if printed:
                 output.write(',\n')
-            output.write("    '%s': %s" % (flow.name, [node.name for node in flow.nowait_nodes]))
+            # Use sets so that nowait checks in dispatcher are done in constant time.
+            nowait_node_names = sorted(set(node.name for node in flow.nowait_nodes))
+            if nowait_node_names:
+                output.write("    '%s': {%s}" % (flow.name, ', '.join("'%s'" % name for name in nowait_node_names)))
+            else:
+                output.write("    '%s': set()" % flow.name)
+            printed = True
+
+        output.write('\n}\n\n')
+
+    def _dump_edge_indexes(self, output):
+        """Dump per-flow edge indexes so dispatcher does not need to inspect all edges in the edge table.
+
+        :param output: a stream to write to
+        """
+        output.write('node_edge_index = {')
+        printed = False
+        for flow in self.flows:
+            node_edge_index = {}
+            for idx, edge in enumerate(flow.edges):
+                for node in edge.nodes_from:
+                    node_edge_index.setdefault(node.name, [])
+                    if idx not in node_edge_index[node.name]:
+                        node_edge_index[node.name].append(idx)
+
+            if printed:
+                output.write(',')
+            output.write("\n    '%s': %s" % (flow.name, node_edge_index))
             printed = True
+        output.write('\n}\n\n')
 
+        output.write('starting_edge_index = {')
+        printed = False
+        for flow in self.flows:
+            if printed:
+                output.write(',')
+            starting_edges = [idx for idx, edge in enumerate(flow.edges) if not edge.nodes_from]
+            output.write("\n    '%s': %s" % (flow.name, starting_edges))
+            printed = True
         output.write('\n}\n\n')
 
     def _dump_eager_failures(self, output):
@@ -591,6 +663,12 @@ class System:
         else:
             output.write('migration_dir = None\n')
 
+        output.write('claim_check_storage = %r\n' % GlobalConfig.claim_check_storage)
+        output.write('claim_check_threshold = %d\n' % GlobalConfig.claim_check_threshold)
+        output.write('write_behind_buffer_size = %d\n' % GlobalConfig.write_behind_buffer_size)
+        output.write('write_behind_batch_size = %d\n' % GlobalConfig.write_behind_batch_size)
+        output.write('write_behind_timeout = %r\n' % GlobalConfig.write_behind_timeout)
+
     @staticmethod
     def _dump_init(output):
         """Dump init function to a stream.
@@ -628,6 +706,14 @@ class System:
                     output.write(", 'foreach_propagate_result': %s" % edge.foreach['propagate_result'])
                 if edge.selective:
                     output.write(", 'selective': %s" % edge.selective)
+                if edge.join:
+                    output.write(", 'join': %s" % (edge.join,))
+                inspected = sorted({node.name for node in edge.predicate.nodes_inspected()})
+                if inspected:
+                    output.write(", 'inspects': %s" % inspected)
+                pushed_down = ConditionCompiler(edge.predicate).pushed_down()
+                if pushed_down:
+                    output.write(", 'pushdown': %s" % pushed_down)
                 output.write("}")
             if idx + 1 < len(self.flows):
                 output.write('],\n')
@@ -658,6 +744,8 @@ class System:
         self._dump_max_retry(stream)
         self._dump_retry_countdown(stream)
         self._dump_storage_readonly(stream)
+        self._dump_batch_size(stream)
+        self._dump_write_behind(stream)
         self._dump_selective_run_functions(stream)
         self._dump_nowait_nodes(stream)
         self._dump_eager_failures(stream)
@@ -675,7 +763,7 @@ class System:
                 if printed:
                     stream.write(",")
                 printed = True
-                stream.write("\n    '%s': %s" % (flow.name, flow.failures.starting_nodes_name(flow.name)))
+                stream.write("\n    '%s': %s" % (flow.name, flow.failures.failure_nodes_name(flow.name)))
         stream.write('\n}\n\n')
 
         self._dump_selective_run_functions(stream)
@@ -684,6 +772,7 @@ class System:
         self._dump_init(stream)
         self._dump_condition_functions(stream)
         self._dump_edge_table(stream)
+        self._dump_edge_indexes(stream)
 
     def dump2file(self, output_file):
         """Perform system dump to a Python source code.
@@ -6,12 +6,12 @@
 # ######################################################################
 """Main system actions done by Selinon."""
 
-from collections import deque
-import copy
 import datetime
 from functools import reduce
 import itertools
+import json
 import traceback
+import uuid
 
 from .celery import AsyncResult
 from .config import Config
@@ -19,12 +19,18 @@ from .errors import CacheMissError
 from .errors import DispatcherRetry
 from .errors import FlowError
 from .errors import StorageError
+from .foreach_group import ForeachGroup
 from .lock_pool import LockPool
+from .publisher import Publisher
+from .result_backend import ResultBackend
 from .selective import compute_selective_run
+from .single_flight import SingleFlight
 from .storage_pool import StoragePool
 from .task_envelope import SelinonTaskEnvelope
 from .trace import Trace
 
+# pylint: disable=too-many-lines
+
 
 class SystemState:  # pylint: disable=too-many-instance-attributes
     """Main system actions done by Selinon."""
@@ -35,6 +41,7 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
     _throttled_tasks = {}
     _throttled_flows = {}
     _node_state_cache_lock = LockPool()
+    _node_state_fetches = SingleFlight()
 
     @property
     def node_args(self):
@@ -44,11 +51,12 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
         """
         return self._node_args
 
-    def _get_async_result(self, node_name, node_id):  # pylint: disable=invalid-name,redefined-builtin
+    def _get_async_result(self, node_name, node_id, meta=None):  # pylint: disable=invalid-name,redefined-builtin
         """Retrieve async result, check cache first.
 
         :param node_name: a name of node for which async result should be checked
         :param node_id: id if node for which async result should be checked
+        :param meta: node meta information if already retrieved from result backend in bulk
         :return: Celery AsyncResult
         """
         cache = Config.async_result_cache[self._flow_name]
@@ -63,33 +71,37 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
             'selective': self._selective
         }
 
-        with self._node_state_cache_lock.get_lock(self._flow_name):
-            res = None
-            result_retrieved_from_cache = False
-
+        cache_lock = self._node_state_cache_lock.get_lock(self._flow_name)
+        with cache_lock:
             Trace.log(Trace.NODE_STATE_CACHE_GET, trace_msg)
             try:
                 res = cache.get(node_id)
-                result_retrieved_from_cache = True
             except CacheMissError:
                 Trace.log(Trace.NODE_STATE_CACHE_MISS, trace_msg, what=traceback.format_exc())
             except Exception:  # pylint: disable=broad-except
                 Trace.log(Trace.NODE_STATE_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
             else:
                 Trace.log(Trace.NODE_STATE_CACHE_HIT, trace_msg)
+                return res
 
-            if not result_retrieved_from_cache:
-                try:
-                    res = AsyncResult(id=node_id)
-                    successful = res.successful()
-                    failed = res.failed()
-                except Exception as exc:  # pylint: disable=broad-except
-                    Trace.log(Trace.RESULT_BACKEND_ISSUE, trace_msg, what=traceback.format_exc())
-                    raise DispatcherRetry(keep_state=True, adjust_retry_count=False) from exc
-
-                # We can cache only results of tasks that have finished or failed, not the ones that are
-                # going to be processed (state will change).
-                if successful or failed:
+        def fetch():
+            try:
+                res = AsyncResult(id=node_id)
+                if meta is not None:
+                    if not ResultBackend.is_finished(meta):
+                        # The node is still running, there is nothing to cache.
+                        return res
+                    ResultBackend.prime(res, meta)
+                successful = res.successful()
+                failed = res.failed()
+            except Exception as exc:  # pylint: disable=broad-except
+                Trace.log(Trace.RESULT_BACKEND_ISSUE, trace_msg, what=traceback.format_exc())
+                raise DispatcherRetry(keep_state=True, adjust_retry_count=False) from exc
+
+            # We can cache only results of tasks that have finished or failed, not the ones that are
+            # going to be processed (state will change).
+            if successful or failed:
+                with cache_lock:
                     Trace.log(Trace.NODE_STATE_CACHE_ADD, trace_msg)
                     try:
                         cache.add(node_id, res)
@@ -98,13 +110,107 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
             return res
 
-    def _instantiate_active_nodes(self, arr):
+        # The result backend is queried without holding the cache lock, concurrent queries for the same node share
+        # one backend call.
+        return self._node_state_fetches.do(node_id, fetch)
+
+    def _get_node_metas(self, arr):
+        """Retrieve states of all active nodes in one result backend operation, if supported by result backend.
+
+        :param arr: a list of active nodes
+        :return: a dict mapping node id to its meta information, empty if states should be retrieved one by one
+        """
+        try:
+            return ResultBackend.get_metas([node['id'] for node in arr]) or {}
+        except Exception:  # pylint: disable=broad-except
+            # Not fatal, node states will be retrieved one by one.
+            Trace.log(Trace.RESULT_BACKEND_ISSUE, {
+                'flow_name': self._flow_name,
+                'node_args': self._node_args,
+                'parent': self._parent,
+                'dispatcher_id': self._dispatcher_id,
+                'queue': Config.dispatcher_queues[self._flow_name],
+                'selective': self._selective
+            }, what=traceback.format_exc())
+            return {}
+
+    def _poll_foreach_groups(self, arr):
+        """Check progress of foreach groups, only nodes that reported their completion need to be polled.
+
+        :param arr: a list of active nodes
+        :return: a set of ids of nodes in groups that are known to be still running
+        """
+        if not self._foreach_groups:
+            return set()
+
+        try:
+            progress = ForeachGroup.poll({group_id: group['seen'] for group_id, group in self._foreach_groups.items()})
+        except Exception:  # pylint: disable=broad-except
+            # Not fatal, all nodes in groups will be polled.
+            Trace.log(Trace.RESULT_BACKEND_ISSUE, {
+                'flow_name': self._flow_name,
+                'node_args': self._node_args,
+                'parent': self._parent,
+                'dispatcher_id': self._dispatcher_id,
+                'queue': Config.dispatcher_queues[self._flow_name],
+                'selective': self._selective
+            }, what=traceback.format_exc())
+            progress = {}
+
+        reported = set()
+        polled_groups = set()
+        for group_id, group in self._foreach_groups.items():
+            if group_id not in progress:
+                polled_groups.add(group_id)
+                continue
+
+            count, node_ids = progress[group_id]
+            if count == group['seen']:
+                group['idle'] += 1
+                if group['idle'] < ForeachGroup.FULL_POLL_IDLE_RUNS:
+                    continue
+                node_ids = None
+
+            if node_ids is None:
+                polled_groups.add(group_id)
+            else:
+                reported.update(node_ids)
+            group['seen'] = count
+            group['idle'] = 0
+
+        return {node['id'] for node in arr
+                if node.get('group') in self._foreach_groups
+                and node['group'] not in polled_groups
+                and str(node['id']) not in reported}
+
+    def _discard_foreach_groups(self):
+        """Stop tracking foreach groups where all nodes finished."""
+        active_groups = {node.get('group') for node in self._active_nodes}
+        for group_id in [group_id for group_id in self._foreach_groups if group_id not in active_groups]:
+            del self._foreach_groups[group_id]
+            ForeachGroup.discard(group_id)
+
+    def _instantiate_active_nodes(self, arr, metas=None, running_group_node_ids=None):
         """Retrieve all async results for active nodes.
 
+        :param arr: a list of active nodes
+        :param metas: node meta information retrieved from result backend in bulk
+        :param running_group_node_ids: ids of nodes in foreach groups that are known to be still running
         :return: convert node references from argument to AsyncResult
         """
-        return [{'name': node['name'], 'id': node['id'],
-                 'result': self._get_async_result(node['name'], node['id'])} for node in arr]
+        metas = metas or {}
+        running_group_node_ids = running_group_node_ids or set()
+        result = []
+        for node in arr:
+            record = dict(node)
+            if node['id'] in running_group_node_ids:
+                # No need to check node state as the node has not reported its completion yet.
+                record['result'] = AsyncResult(id=node['id'])
+            else:
+                record['result'] = self._get_async_result(node['name'], node['id'], metas.get(node['id']))
+            result.append(record)
+
+        return result
 
     @staticmethod
     def _deinstantiate_active_nodes(arr):
@@ -115,27 +221,14 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
         :param arr: array of nodes that are active in a flow
         :return: node references for Dispatcher arguments
         """
-        return [{'name': x['name'], 'id': x['id']} for x in arr]
-
-    @staticmethod
-    def _idxs2items(edge_node_table, arr):
-        """For the given array, get all edges based on edge node table.
-
-        :param edge_node_table: edge table to be used
-        :param arr: a list of indexes to edge table
-        :return: edges that correspond to the given index array
-        """
-        # we keep only the index to edges_table in order to avoid serialization and optimize number representation
-        ret = []
-        for i in arr:
-            ret.append(edge_node_table[i])
-        return ret
+        return [{key: value for key, value in node.items() if key != 'result'} for node in arr]
 
     def __repr__(self):  # noqa
         # Make tests more readable
         return str(self.to_dict())
 
-    def __init__(self, dispatcher_id, flow_name, node_args=None, retry=None, state=None, parent=None, selective=None):
+    def __init__(self, dispatcher_id, flow_name, node_args=None, retry=None, state=None, parent=None, selective=None,
+                 node_args_reference=None):
         # pylint: disable=too-many-arguments
         """Instantiate system state computation (called from Dispatcher).
 
@@ -146,22 +239,40 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
         :param state: current state (serialized, if any)
         :param parent: information about parent nodes
         :param selective: precomputed information about selective flow, if any
+        :param node_args_reference: reference to flow arguments stored in claim-check storage, if any
         """
         state_dict = state or {}
 
         self._dispatcher_id = dispatcher_id
         self._flow_name = flow_name
         self._node_args = node_args
+        self._node_args_reference = node_args_reference
         self._parent = parent or {}
         self._selective = selective or False
-        self._active_nodes = self._instantiate_active_nodes(state_dict.get('active_nodes', []))
+        active_nodes = state_dict.get('active_nodes', [])
+        # Nodes started by one foreach edge fire tracked in a group - a group id mapped to completions seen so far.
+        self._foreach_groups = state_dict.get('foreach_groups', {})
+        running_group_node_ids = self._poll_foreach_groups(active_nodes)
+        polled_nodes = active_nodes
+        if running_group_node_ids:
+            polled_nodes = [node for node in active_nodes if node['id'] not in running_group_node_ids]
+        node_metas = self._get_node_metas(polled_nodes)
+        # Nodes that are known to be still running based on bulk state retrieval, no need to query them again.
+        self._running_node_ids = {node_id for node_id, meta in node_metas.items()
+                                  if not ResultBackend.is_finished(meta)}
+        self._running_node_ids.update(running_group_node_ids)
+        self._active_nodes = self._instantiate_active_nodes(active_nodes, node_metas, running_group_node_ids)
         self._finished_nodes = state_dict.get('finished_nodes', {})
         self._failed_nodes = state_dict.get('failed_nodes', {})
-        self._waiting_edges_idx = state_dict.get('waiting_edges', [])
-        self._triggered_edges_idx = set(state_dict.get('triggered_edges', {}))
-        # Instantiate lazily later if we will know that there is something to process
-        self._waiting_edges = []
+        # Finished source nodes of edges with join - edge index mapped to node name, join key and node ids.
+        self._join_index = state_dict.get('join_index', {})
+        # we keep only indexes to the edge table in order to avoid serialization and optimize number representation
+        self._waiting_edges_idx = set(state_dict.get('waiting_edges', []))
+        self._triggered_edges_idx = set(state_dict.get('triggered_edges', []))
         self._retry = retry
+        self._publisher = Publisher()
+        # Nested finished nodes of subflows computed in this dispatcher run: (flow id, key, compound) -> nodes
+        self._nested_nodes_cache = {}
 
         # TODO: fix this - for some reasons serializer uses strings in keys
         if self._selective:
@@ -174,15 +285,23 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
         :return: converted system state to dict
         """
-        return {
+        state_dict = {
             'active_nodes': self._deinstantiate_active_nodes(self._active_nodes),
             'finished_nodes': self._finished_nodes,
             'failed_nodes': self._failed_nodes,
-            'waiting_edges': self._waiting_edges_idx,
-            # Convert to a list due to JSON serialization
+            # Convert to lists due to JSON serialization
+            'waiting_edges': sorted(self._waiting_edges_idx),
             'triggered_edges': list(self._triggered_edges_idx)
         }
 
+        if self._foreach_groups:
+            state_dict['foreach_groups'] = self._foreach_groups
+
+        if self._join_index:
+            state_dict['join_index'] = self._join_index
+
+        return state_dict
+
     @property
     def selective(self):
         """All edges that should be started selectively as computed by compute_selective."""
@@ -202,6 +321,10 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
             throttle_conf = Config.throttle_tasks
             throttled_nodes = self._throttled_tasks
 
+        if not throttle_conf[node_name]:
+            # Throttle configuration is static, do not acquire lock for nodes that are not throttled.
+            return None
+
         with self._throttle_lock_pool.get_lock(node_name):
             if throttle_conf[node_name]:
                 current_datetime = datetime.datetime.now()
@@ -234,7 +357,9 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
         new_active_nodes = []
         for node in self._active_nodes:
-            if node['result'].successful():
+            if node['id'] in self._running_node_ids:
+                new_active_nodes.append(node)
+            elif node['result'].successful():
                 Trace.log(Trace.NODE_SUCCESSFUL, trace_msg, node_name=node['name'], node_id=node['id'])
                 ret_successful.append(node)
             elif node['result'].failed():
@@ -268,6 +393,9 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                 new_active_nodes.append(node)
 
         self._active_nodes = new_active_nodes
+        if self._foreach_groups:
+            self._discard_foreach_groups()
+
         return ret_successful, ret_failed
 
     def _execute_selective_run_func(self, node_name, node_args, parent):
@@ -295,21 +423,34 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
         return result
 
-    def _start_node(self, node_name, parent, node_args, edge=None, force_propagate_node_args=False):
+    def _start_node(self, node_name, parent, node_args, edge=None, force_propagate_node_args=False,
+                    foreach_group=None, foreach_index=None):
         """Start a node in the system.
 
         :param node_name: name of a node to be started
         :param parent: parent nodes of the starting node
         :param node_args: arguments for the starting node
         :param edge: edge that triggered node start, can be None for fallbacks
+        :param foreach_group: id of foreach group the node belongs to, if any
+        :param foreach_index: index of foreach item the node is started for, if any
         """
-        # pylint: disable=too-many-arguments
+        # pylint: disable=too-many-arguments,too-many-locals
         from .dispatcher import Dispatcher
 
+        is_nowait = node_name in Config.nowait_nodes.get(self._flow_name, [])
+        if is_nowait:
+            # Nowait nodes are not tracked.
+            foreach_group = None
+
+        message_node_args = node_args
+        if self._node_args_reference is not None and node_args is self._node_args and not is_nowait:
+            # Share the stored copy of flow arguments, nowait nodes can outlive the stored copy.
+            message_node_args = self._node_args_reference
+
         if Config.is_flow(node_name):
             start_node_args = None
             if force_propagate_node_args or Config.should_propagate_node_args(self._flow_name, node_name):
-                start_node_args = node_args
+                start_node_args = message_node_args
 
             start_parent = None
             if Config.should_propagate_parent(self._flow_name, node_name):
@@ -325,9 +466,14 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                 'parent': start_parent,
                 'selective': selective or self.selective
             }
+            if Config.eager_wakeup.get(self._flow_name, False) and not is_nowait:
+                kwargs['parent_dispatcher_id'] = self._dispatcher_id
+            if foreach_group:
+                kwargs['foreach_group'] = foreach_group
 
             countdown = self._get_countdown(node_name, is_flow=True)
-            async_result = Dispatcher().apply_async(  # pylint: disable=assignment-from-no-return
+            async_result = self._publisher.apply_async(
+                Dispatcher(),
                 kwargs=kwargs,
                 queue=Config.dispatcher_queues[node_name],
                 countdown=countdown
@@ -353,12 +499,15 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                 'task_name': node_name,
                 'flow_name': self._flow_name,
                 'parent': parent,
-                'node_args': node_args,
+                'node_args': message_node_args,
                 'dispatcher_id': self._dispatcher_id
             }
+            if foreach_group:
+                kwargs['foreach_group'] = foreach_group
 
             countdown = self._get_countdown(node_name, is_flow=False)
-            async_result = SelinonTaskEnvelope().apply_async(  # pylint: disable=assignment-from-no-return
+            async_result = self._publisher.apply_async(
+                SelinonTaskEnvelope(),
                 kwargs=kwargs,
                 queue=Config.task_queues[node_name],
                 countdown=countdown
@@ -374,17 +523,196 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                 'selective': self._selective
             })
 
+        return self._register_started_node(node_name, async_result, node_args, foreach_group, foreach_index,
+                                           is_nowait)
+
+    @staticmethod
+    def _extract_join_key(value, key_path):
+        """Extract a key used to pair nodes on edges with join.
+
+        :param value: node arguments or result of node to extract the key from
+        :param key_path: a list of keys to follow
+        :return: serialized key, None if the key is not present
+        """
+        try:
+            return json.dumps(reduce(lambda item, key: item[key], key_path, value), sort_keys=True)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+
+    def _compute_join_keys(self, node_name, node_args, foreach_index):
+        """Compute keys of a started node for edges that pair their source nodes by foreach index or node arguments.
+
+        :param node_name: name of the started node
+        :param node_args: arguments the node was started with
+        :param foreach_index: index of foreach item the node was started for, if any
+        :return: a dict mapping edge index to serialized key
+        """
+        edge_table = Config.edge_table[self._flow_name]
+        join_keys = {}
+        for idx in Config.node_edge_index[self._flow_name].get(node_name, []):
+            join = edge_table[idx].get('join')
+            if not join:
+                continue
+
+            key = None
+            if join[0] == 'foreach_index' and foreach_index is not None:
+                key = json.dumps(foreach_index)
+            elif join[0] == 'node_args':
+                key = self._extract_join_key(node_args, join[1])
+
+            if key is not None:
+                join_keys[str(idx)] = key
+
+        return join_keys
+
+    def _get_join_key(self, edge_idx, join, node):
+        """Get key of a finished node used to pair it with other source nodes of an edge with join.
+
+        :param edge_idx: index of the edge in the edge table
+        :param join: join configuration of the edge
+        :param node: finished node
+        :return: serialized key, None if the node cannot be paired
+        """
+        if join[0] != 'result':
+            return node.get('join', {}).get(str(edge_idx))
+
+        try:
+            result = StoragePool.retrieve(self._flow_name, node['name'], node['id'])
+        except StorageError as exc:
+            Trace.log(Trace.STORAGE_ISSUE, what=traceback.format_exc())
+            raise DispatcherRetry(keep_state=True, adjust_retry_count=False) from exc
+
+        return self._extract_join_key(result, join[1])
+
+    def _register_started_node(self, node_name, async_result, node_args, foreach_group, foreach_index, is_nowait):
+        # pylint: disable=too-many-arguments
+        """Start tracking a node that was scheduled.
+
+        :param node_name: name of the scheduled node
+        :param async_result: Celery's AsyncResult of the scheduled node
+        :param node_args: arguments the node was started with
+        :param foreach_group: id of foreach group the node belongs to, if any
+        :param foreach_index: index of foreach item the node was started for, if any
+        :param is_nowait: True if the node is a nowait node, these are not tracked
+        :return: record about the started node
+        """
         record = {
             'name': node_name,
             'id': async_result.task_id,
             'result': async_result
         }
 
-        if node_name not in Config.nowait_nodes.get(self._flow_name, []):
+        join_keys = self._compute_join_keys(node_name, node_args, foreach_index) if not is_nowait else None
+        if join_keys:
+            record['join'] = join_keys
+
+        if foreach_group:
+            record['group'] = foreach_group
+            self._foreach_groups.setdefault(foreach_group, {'seen': 0, 'idle': 0})
+
+        if not is_nowait:
             self._active_nodes.append(record)
 
         return record
 
+    def _reuse_node(self, node_name, task_id, node_args, foreach_index=None):
+        """Create a record about a node which result is reused in a selective run instead of running the node.
+
+        :param node_name: name of the node
+        :param task_id: id of the task which result is reused
+        :param node_args: arguments the node would be started with
+        :param foreach_index: index of foreach item the node would be started for, if any
+        :return: record about the reused node
+        """
+        record = {
+            'name': node_name,
+            'id': task_id,
+            'result': self._get_async_result(node_name, task_id)
+        }
+
+        # Reused nodes are paired on edges with join the same way as nodes that were run.
+        join_keys = self._compute_join_keys(node_name, node_args, foreach_index)
+        if join_keys:
+            record['join'] = join_keys
+
+        return record
+
+    def _start_batch(self, node_name, parent, node_args_list, edge, foreach_group=None, foreach_indexes=None):
+        """Start nodes of a task that is run in batches, nodes are packed into messages of the configured batch size.
+
+        Each node keeps its own task id (assigned upfront) and its own state in the result backend.
+
+        :param node_name: name of the task to be started
+        :param parent: parent nodes of the starting nodes
+        :param node_args_list: arguments for each of the starting nodes
+        :param edge: edge that triggered nodes start
+        :param foreach_group: id of foreach group the nodes belong to, if any
+        :param foreach_indexes: indexes of foreach items the nodes are started for, if any
+        :return: records about started nodes
+        """
+        # pylint: disable=too-many-arguments,too-many-locals
+        is_nowait = node_name in Config.nowait_nodes.get(self._flow_name, [])
+        if is_nowait:
+            foreach_group = None
+
+        message_node_args = self._node_args
+        if self._node_args_reference is not None and not is_nowait:
+            message_node_args = self._node_args_reference
+
+        records = []
+        foreach_indexes = foreach_indexes or [None] * len(node_args_list)
+        batch_size = Config.batch_size[node_name]
+        for start in range(0, len(node_args_list), batch_size):
+            batch = []
+            for node_args, foreach_index in zip(node_args_list[start:start + batch_size],
+                                                foreach_indexes[start:start + batch_size]):
+                item = {'task_id': str(uuid.uuid4()), 'foreach_index': foreach_index}
+                if node_args is not self._node_args:
+                    # Flow arguments are sent once for the whole batch, only results of foreach function are per item.
+                    item['node_args'] = node_args
+                batch.append(item)
+
+            kwargs = {
+                'task_name': node_name,
+                'flow_name': self._flow_name,
+                'parent': parent,
+                'node_args': message_node_args,
+                'dispatcher_id': self._dispatcher_id,
+                'batch': [{key: value for key, value in item.items() if key != 'foreach_index'} for item in batch]
+            }
+            if foreach_group:
+                kwargs['foreach_group'] = foreach_group
+
+            countdown = self._get_countdown(node_name, is_flow=False)
+            async_result = self._publisher.apply_async(
+                SelinonTaskEnvelope(),
+                kwargs=kwargs,
+                queue=Config.task_queues[node_name],
+                countdown=countdown
+            )
+
+            for item in batch:
+                Trace.log(Trace.TASK_SCHEDULE, {
+                    'task_name': node_name,
+                    'flow_name': self._flow_name,
+                    'parent': parent,
+                    'node_args': item.get('node_args', message_node_args),
+                    'dispatcher_id': self._dispatcher_id,
+                    'task_id': item['task_id'],
+                    'batch_id': async_result.task_id,
+                    'queue': Config.task_queues[node_name],
+                    'condition_str': edge['condition_str'],
+                    'foreach_str': edge.get('foreach_str'),
+                    'selective_edge': False,  # always False as we are starting a task
+                    'countdown': countdown,
+                    'selective': self._selective
+                })
+                records.append(self._register_started_node(node_name, AsyncResult(id=item['task_id']),
+                                                           item.get('node_args', self._node_args), foreach_group,
+                                                           item['foreach_index'], is_nowait))
+
+        return records
+
     def _fire_edge(self, edge_idx, edge, storage_pool, parent, node_args):
         """Fire edge - start new nodes as described in edge table.
 
@@ -423,7 +751,11 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
             # handle None as well
             if not iterable:
                 return started, []
-            for res in iterable:
+            # Nodes started by this edge fire are tracked as one group, see ForeachGroup.
+            foreach_group = str(uuid.uuid4()) if ForeachGroup.is_enabled() else None
+            # Arguments and foreach indexes of nodes of tasks that are run in batches.
+            batches = {}
+            for foreach_index, res in enumerate(iterable):
                 for node_name in edge['to']:
                     if nodes2start and node_name not in nodes2start:
                         Trace.log(Trace.SELECTIVE_OMIT_NODE, trace_msg, {'omitted_node': node_name})
@@ -437,18 +769,29 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                                 'task_name': node_name,
                                 'task_id': selective_run_func_result
                             })
-                            selective_reuse.append({
-                                'name': node_name,
-                                'id': selective_run_func_result,
-                                'result': self._get_async_result(node_name, selective_run_func_result)
-                            })
+                            selective_reuse.append(self._reuse_node(
+                                node_name, selective_run_func_result,
+                                res if edge.get('foreach_propagate_result') else node_args, foreach_index
+                            ))
                             continue
 
+                    if Config.batch_size.get(node_name, 1) > 1:
+                        batches.setdefault(node_name, []).append(
+                            (res if edge.get('foreach_propagate_result') else node_args, foreach_index)
+                        )
+                        continue
+
                     if edge.get('foreach_propagate_result'):
-                        record = self._start_node(node_name, parent, res, edge, force_propagate_node_args=True)
+                        record = self._start_node(node_name, parent, res, edge, force_propagate_node_args=True,
+                                                  foreach_group=foreach_group, foreach_index=foreach_index)
                     else:
-                        record = self._start_node(node_name, parent, node_args, edge)
+                        record = self._start_node(node_name, parent, node_args, edge, foreach_group=foreach_group,
+                                                  foreach_index=foreach_index)
                     started.append(record)
+
+            for node_name, items in batches.items():
+                started.extend(self._start_batch(node_name, parent, [item[0] for item in items], edge, foreach_group,
+                                                 [item[1] for item in items]))
         else:
             for node_name in edge['to']:
                 if nodes2start and node_name not in nodes2start:
@@ -462,11 +805,7 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                             'task_name': node_name,
                             'task_id': selective_run_func_result
                         })
-                        selective_reuse.append({
-                            'name': node_name,
-                            'id': selective_run_func_result,
-                            'result': self._get_async_result(node_name, selective_run_func_result)
-                        })
+                        selective_reuse.append(self._reuse_node(node_name, selective_run_func_result, node_args))
                         continue
 
                 record = self._start_node(node_name, parent, node_args, edge)
@@ -474,22 +813,22 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
         return started, selective_reuse
 
-    def _run_fallback(self, failure_node, combination):
+    def _run_fallback(self, failure_node, node_names):
         """Evaluate fallback condition and run fallback iff condition is true.
 
         :param failure_node: failure node that should be evaluated
-        :param combination: combination of failed nodes
+        :param node_names: names of failed nodes covered by the failure node
         :return: triplet started - records about started nodes, should_continue - True if other fallbacks can be
                  run, skip_failure_node - true if the current failure node should be skipped in this fallback run
                  (preserves infinite deps)
         """
         traced_nodes_arr = []
         # compute affected nodes
-        for node in combination:
-            if node[0] not in self._failed_nodes.keys():
-                # this means that some fallback was previously run and some node in the combination was already handled
+        for node_name in node_names:
+            if node_name not in self._failed_nodes:
+                # this means that some fallback was previously run and some node in the failure was already handled
                 return [], True, True
-            traced_nodes_arr.append({'name': node[0], 'id': self._failed_nodes[node[0]][0]})
+            traced_nodes_arr.append({'name': node_name, 'id': self._failed_nodes[node_name][0]})
 
         trace_dict = {
             'flow_name': self._flow_name,
@@ -516,8 +855,7 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
             Trace.log(Trace.FALLBACK_COND_TRUE, trace_dict)
 
             # we will run some fallback, remove affected failed nodes from failed_nodes
-            for node in combination:
-                affected_nodes.add(node[0])
+            affected_nodes.update(node_names)
 
             Trace.log(Trace.FALLBACK_START, trace_dict)
             if fallback is True:
@@ -544,31 +882,26 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
         :return: fallbacks that were run
         """
-        # we sort it first to make evaluation dependent on alphabetical order
         ret = []
-        failed_nodes = sorted(self._failed_nodes.items())
-
-        # pylint: disable=too-many-nested-blocks
-        for i in range(len(failed_nodes), 0, -1):
-            for combination in itertools.combinations(failed_nodes, i):
-                try:
-                    failure_nodes = Config.failures[self._flow_name]
-                    failure_node = reduce(lambda n, c: n['next'][c[0]], combination[1:],
-                                          failure_nodes[combination[0][0]])
-                except KeyError:
-                    # such failure not found in the tree of permutations - this means that this
-                    # flow will always fail, but run defined fallbacks for defined failures first
-                    continue
+        failed_node_names = frozenset(self._failed_nodes)
+
+        # Pick failures that cover only failed nodes, the largest ones first; we sort by node names to make
+        # evaluation dependent on alphabetical order.
+        candidates = sorted((sorted(key), failure_node)
+                            for key, failure_node in Config.failures.get(self._flow_name, {}).items()
+                            if key <= failed_node_names)
+        candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
 
-                while True:
-                    fallback_run, should_continue, skip_failure_node = self._run_fallback(failure_node, combination)
-                    ret.extend(fallback_run)
+        for node_names, failure_node in candidates:
+            while True:
+                fallback_run, should_continue, skip_failure_node = self._run_fallback(failure_node, node_names)
+                ret.extend(fallback_run)
 
-                    if not should_continue:
-                        return ret
+                if not should_continue:
+                    return ret
 
-                    if skip_failure_node or not all(node[0] in self._failed_nodes.keys() for node in combination):
-                        break
+                if skip_failure_node or not all(node_name in self._failed_nodes for node_name in node_names):
+                    break
 
         return ret
 
@@ -578,89 +911,190 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
         :param nodes: nodes that will trigger edges.
         """
         res = []
+        nowait_nodes = Config.nowait_nodes.get(self._flow_name, [])
+        node_edge_index = Config.node_edge_index[self._flow_name]
 
         for node in nodes:
-            for idx, edge in enumerate(Config.edge_table[self._flow_name]):
-                if node['name'] not in edge['from']:
-                    continue
+            if node['name'] in nowait_nodes:
+                continue
 
+            for idx in node_edge_index.get(node['name'], []):
                 if idx in self._waiting_edges_idx:
                     continue
 
-                if node['name'] in Config.nowait_nodes.get(self._flow_name, []):
-                    continue
-
                 if self._selective and idx not in self._selective['waiting_edges_subset'][self._flow_name]:
                     continue
 
                 res.append(node)
-                self._waiting_edges.append(edge)
-                self._waiting_edges_idx.append(idx)
+                self._waiting_edges_idx.add(idx)
+
+        return res
+
+    @staticmethod
+    def _merge_nested_nodes(dst_dict, src_dict):
+        """Merge nested nodes (a mapping of node names to node ids or nested nodes of subflows).
+
+        :param dst_dict: a dictionary to merge to, it is modified in place
+        :param src_dict: nested nodes to be merged, they are left untouched
+        :return: dst_dict
+        """
+        for node_name, value in src_dict.items():
+            if isinstance(value, dict):
+                SystemState._merge_nested_nodes(dst_dict.setdefault(node_name, {}), value)
+            else:
+                dst_dict.setdefault(node_name, []).extend(value)
+
+        return dst_dict
+
+    @staticmethod
+    def _compound_nested_nodes(nested_nodes):
+        """Compound nested nodes of subflows - ids of all tasks of the same name are listed together.
+
+        :param nested_nodes: nested nodes to compound
+        :return: a dictionary mapping task name to a list of task ids
+        """
+        res = {}
+        stack = [nested_nodes]
+
+        while stack:
+            for node_name, value in stack.pop().items():
+                if isinstance(value, dict):
+                    stack.append(value)
+                else:
+                    res.setdefault(node_name, []).extend(value)
+
+        return res
+
+    def _nest_nodes(self, nodes, key):
+        """Replace ids of subflows with their nested nodes.
+
+        :param nodes: a dictionary mapping node name to a list of node ids (e.g. finished nodes of a flow)
+        :param key: key in subflow results that should be inspected
+        :return: nested nodes
+        """
+        res = {}
+
+        for node_name, node_ids in nodes.items():
+            if not Config.is_flow(node_name):
+                res[node_name] = list(node_ids)
+                continue
+
+            subflow_nodes = {}
+            for node_id in node_ids:
+                self._merge_nested_nodes(subflow_nodes, self._get_nested_nodes(node_name, node_id, key))
+
+            if subflow_nodes:
+                res[node_name] = subflow_nodes
+
+        return res
+
+    def _get_nested_nodes(self, flow_name, flow_id, key, compound=False):
+        """Get nested nodes of a finished subflow, results are cached for the dispatcher run.
+
+        Subflows publish their nested finished nodes in their result once they finish (see nested_finished_nodes),
+        results of nested subflows are inspected only if the subflow did not publish them.
+
+        :param flow_name: name of the subflow
+        :param flow_id: id of the subflow
+        :param key: key in subflow results that should be inspected
+        :param compound: true if nested nodes should be compounded, see propagate_compound_finished
+        :return: nested nodes of the subflow, they should not be modified
+        """
+        cache_key = (flow_id, key, compound)
+        if cache_key in self._nested_nodes_cache:
+            return self._nested_nodes_cache[cache_key]
+
+        if compound:
+            res = self._compound_nested_nodes(self._get_nested_nodes(flow_name, flow_id, key))
+        else:
+            flow_result = self._get_async_result(flow_name, flow_id).result
+            res = flow_result.get('nested_' + key)
+            if res is None:
+                res = self._nest_nodes(flow_result[key], key)
 
+        self._nested_nodes_cache[cache_key] = res
         return res
 
     def _extend_parent_from_flow(self, dst_dict, flow_name, flow_id, key, compound=False):
-        # pylint: disable=too-many-arguments,too-many-locals
+        # pylint: disable=too-many-arguments
         """Compute parent in a flow in case of propagate_parent flag.
 
+        If we have compound, the key to list of task is flow name. This will allow to use conditions as expected, e.g.:
+          {'flow1': {'Task1': ['task1_id1', 'task1_id2'], 'Task2': ['task2_id1', 'task2_id2']}}
+
+        Otherwise a key is always a flow name except the last key, which is a task name with list of task ids.
+
         :param dst_dict: a dictionary that should be extended with calculated parents
         :param flow_name: a flow name for which propagate_parent is calculated
         :param flow_id: flow identifier as identified in Celery
         :param key: key under which should be result stored
         :param compound: true if propagate_compound was used
         """
-        def follow_keys(d, k):
-            # pylint: disable=invalid-name,missing-docstring
-            if not compound:
-                # A key is always a flow name except the last key, which is a task name with list of task ids
-                for m_k in k:
-                    if m_k not in d:
-                        d[m_k] = {}
-                    d = d[m_k]
-                return d
-
-            # If we have compound, the key to list of task is flow name.
-            # This will allow to use conditions as expected.
-            # e.g.:
-            #  {'flow1': {'Task1': ['task1_id1', 'task1_id2'],
-            #            {'Task2': ['task2_id1', 'task2_id2']}
-            if flow_name not in d:
-                d[flow_name] = {}
-            return d[flow_name]
-
-        def push_flow(s, p_n_name, flow_result, k):
-            # pylint: disable=invalid-name,missing-docstring
-            for n_name, n_ids in flow_result[key].items():
-                if not compound:
-                    shallow_k = copy.copy(k)
-                    shallow_k.append(p_n_name)
-                    s.append((n_name, n_ids, shallow_k))
-                else:
-                    s.append((n_name, n_ids, k))
+        nested_nodes = self._get_nested_nodes(flow_name, flow_id, key, compound)
+        if nested_nodes:
+            self._merge_nested_nodes(dst_dict.setdefault(flow_name, {}), nested_nodes)
 
-        res = dst_dict
+        return dst_dict
 
-        async_result = self._get_async_result(flow_name, flow_id)
-        stack = deque()
-        push_flow(stack, flow_name, async_result.result, deque())
+    def nested_finished_nodes(self):
+        """Compute finished nodes with ids of subflows replaced by their nested finished nodes.
 
-        while stack:
-            node_name, node_ids, keys = stack.pop()
-            if Config.is_flow(node_name):
-                for node_id in node_ids:
-                    push_flow(stack, node_name, self._get_async_result(node_name, node_id).result, keys)
-            else:
-                dst = follow_keys(res, keys)
+        The result is published once the flow finishes so parent flows propagating finished nodes do not need to
+        inspect results of all nested subflows.
 
-                if node_name not in dst:
-                    dst[node_name] = []
+        :return: nested finished nodes, None if there are no finished subflows or finished nodes are not propagated
+        """
+        if not any(Config.is_flow(node_name) for node_name in self._finished_nodes):
+            return None
 
-                for node_id in node_ids:
-                    dst[node_name].append(node_id)
+        if not any(Config.propagate_finished.get(flow_name) or Config.propagate_compound_finished.get(flow_name)
+                   for flow_name in Config.flows):
+            return None
 
-        return res
+        return self._nest_nodes(self._finished_nodes, 'finished_nodes')
+
+    def _prefetch_inspected_results(self, new_finished):
+        """Retrieve results of nodes that are going to be inspected in edge conditions all at once.
 
-    def _start_new_from_finished(self, new_finished):  # pylint: disable=too-many-locals
+        :param new_finished: finished nodes based on which edges are going to be evaluated
+        :return: a dict of prefetched results as returned by StoragePool.prefetch()
+        """
+        edge_table = Config.edge_table[self._flow_name]
+        node_edge_index = Config.node_edge_index[self._flow_name]
+
+        available = {node_name: list(node_ids) for node_name, node_ids in self._finished_nodes.items()}
+        for node in new_finished:
+            available.setdefault(node['name'], []).append(node['id'])
+
+        # dict is used as an ordered set
+        to_retrieve = {}
+        for node in new_finished:
+            for idx in node_edge_index.get(node['name'], []):
+                edge = edge_table[idx]
+                # nodes paired by join are known only once the edge is evaluated, results are retrieved lazily
+                if idx not in self._waiting_edges_idx or not edge.get('inspects') or edge.get('join'):
+                    continue
+
+                if not all(available.get(node_name) for node_name in edge['from']):
+                    # the edge cannot be fired yet
+                    continue
+
+                pushdown = edge.get('pushdown', {})
+                for node_name in edge['inspects']:
+                    if node_name in pushdown and StoragePool.supports_pushdown(node_name, pushdown[node_name]):
+                        # the result is inspected only by the storage
+                        continue
+
+                    node_ids = [node['id']] if node_name == node['name'] else available[node_name]
+                    to_retrieve.update(dict.fromkeys((node_name, node_id) for node_id in node_ids))
+
+        if len(to_retrieve) < 2:
+            # nothing to gain, let conditions retrieve the result lazily
+            return {}
+
+        return StoragePool.prefetch(self._flow_name, to_retrieve)
+
+    def _start_new_from_finished(self, new_finished):  # pylint: disable=too-many-locals,too-many-statements
         """Start new based on finished nodes.
 
         :param new_finished: finished nodes based on which we should start new nodes
@@ -675,21 +1109,32 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
             if Config.node_args_from_first.get(self._flow_name, False):
                 self._node_args = StoragePool.retrieve(self._flow_name, new_finished[0]['name'], new_finished[0]['id'])
 
+        edge_table = Config.edge_table[self._flow_name]
+        node_edge_index = Config.node_edge_index[self._flow_name]
+        prefetched = self._prefetch_inspected_results(new_finished)
+
         for node in new_finished:
-            # We could optimize this by pre-computing affected edges in pre-generated config file for each
-            # node and computing intersection with waiting edges, but let's stick with this solution for now
-            edges = []
-            for waiting_edges_idx, edge_table_idx in enumerate(self._waiting_edges_idx):
-                # we have to store index to edge table, but inspect possible edge fires only in waiting edges
-                if node['name'] in self._waiting_edges[waiting_edges_idx]['from']:
-                    edges.append((edge_table_idx, self._waiting_edges[waiting_edges_idx]))
+            # inspect possible edge fires only in waiting edges that are fed by the finished node
+            edges = [(idx, edge_table[idx]) for idx in node_edge_index.get(node['name'], [])
+                     if idx in self._waiting_edges_idx]
 
             for i, edge in edges:
+                join_key = None
+                if edge.get('join'):
+                    join_key = self._get_join_key(i, edge['join'], node)
+                    if join_key is None:
+                        # no key to pair the node with other source nodes
+                        continue
+
                 from_nodes = dict.fromkeys(edge['from'], [])
 
                 for from_name in from_nodes:
                     if from_name == node['name']:
                         from_nodes[from_name] = [{'name': node['name'], 'id': node['id']}]
+                    elif join_key is not None:
+                        # only nodes with the same key are paired, see join edge configuration option
+                        joined_ids = self._join_index.get(str(i), {}).get(from_name, {}).get(join_key, [])
+                        from_nodes[from_name] = [{'name': from_name, 'id': n} for n in joined_ids]
                     else:
                         from_nodes[from_name] = [{'name': from_name, 'id': n}
                                                  for n in self._finished_nodes.get(from_name, [])]
@@ -723,7 +1168,7 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
 
                     # We could also examine results of subflow, there could be passed a list of subflows with
                     # finished_nodes to 'condition' in order to do inspection
-                    storage_pool = StoragePool(storage_id_mapping, self._flow_name)
+                    storage_pool = StoragePool(storage_id_mapping, self._flow_name, prefetched)
 
                     try:
                         condition_result = edge['condition'](storage_pool, self._node_args)
@@ -749,6 +1194,10 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
                             'selective': self._selective
                         })
 
+                if join_key is not None:
+                    node_join_index = self._join_index.setdefault(str(i), {}).setdefault(node['name'], {})
+                    node_join_index.setdefault(join_key, []).append(node['id'])
+
             node_name = node['name']
             if not self._finished_nodes.get(node_name):
                 self._finished_nodes[node_name] = []
@@ -806,8 +1255,6 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
         new_finished, new_failed = self._get_successful_and_failed(previously_reused)
 
         if new_finished or new_failed:
-            # Instantiate results lazily
-            self._waiting_edges = self._idxs2items(Config.edge_table[self._flow_name], self._waiting_edges_idx)
             self._update_waiting_edges(new_finished)
 
             new_started_nodes, selective_reuse = self._start_new_from_finished(new_finished)
@@ -836,15 +1283,17 @@ class SystemState:  # pylint: disable=too-many-instance-attributes
         """
         fallback_started = []
 
-        if not self._active_nodes and not self._finished_nodes and not self._waiting_edges and not self._failed_nodes:
-            # we are starting up
-            started, reused = self._start_and_update_retry()
-        else:
-            started, reused, fallback_started = self._continue_and_update_retry([])
+        # All messages of nodes started in this run are published over one producer connection.
+        with self._publisher:
+            if not self._active_nodes and not self._finished_nodes and not self._failed_nodes:
+                # we are starting up
+                started, reused = self._start_and_update_retry()
+            else:
+                started, reused, fallback_started = self._continue_and_update_retry([])
 
-        while reused:
-            # We do not need to retry if there are some tasks that we can continue with
-            started, reused, fallback_started = self._continue_and_update_retry(reused)
+            while reused:
+                # We do not need to retry if there are some tasks that we can continue with
+                started, reused, fallback_started = self._continue_and_update_retry(reused)
 
         self._retry = Config.strategies[self._flow_name]({
             'previous_retry': self._retry,
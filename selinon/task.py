@@ -19,6 +19,7 @@ class Task(Node):
 
     _DEFAULT_MAX_RETRY = 0
     _DEFAULT_RETRY_COUNTDOWN = 0
+    _DEFAULT_BATCH_SIZE = 1
     _logger = logging.getLogger(__name__)
 
     def __init__(self, name, import_path, storage, **opts):
@@ -57,6 +58,8 @@ class Task(Node):
         self.queue_name = self._expand_queue_name(opts.pop('queue', None))
         self.storage_readonly = opts.pop('storage_readonly', False)
         self.throttling = self.parse_throttling(opts.pop('throttling', {}))
+        self.batch_size = opts.pop('batch_size', self._DEFAULT_BATCH_SIZE)
+        self.write_behind = opts.pop('write_behind', False)
 
         if opts:
             raise ConfigurationError("Unknown task option provided for task '%s' (class '%s' from '%s'): %s"
@@ -100,6 +103,14 @@ class Task(Node):
         if not isinstance(self.storage_readonly, bool):
             raise ConfigurationError("Storage usage flag readonly should be of type bool")
 
+        if not isinstance(self.batch_size, int) or isinstance(self.batch_size, bool) or self.batch_size < 1:
+            raise ConfigurationError("Error in task '%s' definition - batch_size should be positive integer; got '%s'"
+                                     % (self.name, self.batch_size))
+
+        if not isinstance(self.write_behind, bool):
+            raise ConfigurationError("Error in task '%s' definition - write_behind should be bool; got '%s'"
+                                     % (self.name, self.write_behind))
+
     @staticmethod
     def from_dict(dictionary, system):
         """Construct task from a dict and check task's definition correctness.
@@ -13,11 +13,15 @@ import traceback
 import jsonschema
 
 from .celery import Task
+from .claim_check import ClaimCheck
 from .config import Config
 from .errors import FatalTaskError
 from .errors import Retry
+from .foreach_group import ForeachGroup
+from .result_writer import ResultWriter
 from .storage_pool import StoragePool
-from .trace import Trace  # Ignore PyImportSortBear
+from .trace import Trace
+from .wakeup import Wakeup  # Ignore PyImportSortBear
 
 
 class SelinonTaskEnvelope(Task):
@@ -44,8 +48,21 @@ class SelinonTaskEnvelope(Task):
 
             jsonschema.validate(result, schema)
 
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        # pylint: disable=too-many-arguments,unused-argument
+        """Report task completion to dispatcher once the task finishes."""
+        flow_name = kwargs.get('flow_name')
+        if status in Wakeup.FINISHED_STATES and kwargs.get('foreach_group') and not kwargs.get('batch'):
+            # Reported before wake up so the woken dispatcher sees this task finished, batches report on their own.
+            ForeachGroup.report(kwargs['foreach_group'], task_id)
+
+        if status in Wakeup.FINISHED_STATES \
+                and kwargs.get('task_name') not in Config.nowait_nodes.get(flow_name, []) \
+                and Config.eager_wakeup.get(flow_name, False):
+            Wakeup.notify(kwargs['dispatcher_id'])
+
     def selinon_retry(self, task_name, flow_name, parent, node_args, retry_countdown, retried_count,
-                      dispatcher_id, user_retry=False):
+                      dispatcher_id, user_retry=False, foreach_group=None):
         # pylint: disable=too-many-arguments
         """Retry on Celery level.
 
@@ -57,6 +74,7 @@ class SelinonTaskEnvelope(Task):
         :param retried_count: number of retries already done with this task
         :param dispatcher_id: ID id of dispatcher that is handling flow that run this task
         :param user_retry: True if retry was forced from the user
+        :param foreach_group: id of foreach group the task belongs to, if any
         """
         max_retry = Config.max_retry.get(task_name, 0)
         kwargs = {
@@ -67,6 +85,8 @@ class SelinonTaskEnvelope(Task):
             'dispatcher_id': dispatcher_id,
             'retried_count': retried_count
         }
+        if foreach_group:
+            kwargs['foreach_group'] = foreach_group
 
         Trace.log(Trace.TASK_RETRY, {'flow_name': flow_name,
                                      'task_name': task_name,
@@ -82,7 +102,193 @@ class SelinonTaskEnvelope(Task):
                                      'max_retry': max_retry})
         raise self.retry(kwargs=kwargs, countdown=retry_countdown, queue=Config.task_queues[task_name])
 
-    def run(self, task_name, flow_name, parent, node_args, dispatcher_id, retried_count=None):
+    def _fail_batch_item(self, task_name, flow_name, parent, node_args, dispatcher_id, task_id, exc):
+        # pylint: disable=too-many-arguments
+        """Mark a node run in a batch as failed.
+
+        :param task_name: name of the task
+        :param flow_name: flow in which the task run
+        :param parent: dict of parent nodes
+        :param node_args: node arguments of the failed node
+        :param dispatcher_id: dispatcher id that handles flow
+        :param task_id: id of the failed node
+        :param exc: exception raised for the node
+        """
+        exc_info = (type(exc), exc, exc.__traceback__)
+        Trace.log(Trace.TASK_FAILURE, {'flow_name': flow_name,
+                                       'task_name': task_name,
+                                       'task_id': task_id,
+                                       'batch_id': self.request.id,
+                                       'parent': parent,
+                                       'node_args': node_args,
+                                       'what': "".join(traceback.format_exception(*exc_info)),
+                                       'queue': Config.task_queues[task_name],
+                                       'dispatcher_id': dispatcher_id,
+                                       'retried_count': 0})
+
+        storage = StoragePool.get_storage_name_by_task_name(task_name, graceful=True)
+        if storage and not Config.storage_readonly[task_name] \
+                and not StoragePool.set_error(node_args, flow_name, task_name, task_id, exc_info):
+            Trace.log(Trace.STORAGE_OMIT_STORE_ERROR, {
+                'flow_name': flow_name,
+                'node_args': node_args,
+                'task_name': task_name,
+                'task_id': task_id,
+                'error_type': str(exc_info[0]),
+                'error_value': str(exc_info[1]),
+                'error_traceback': "".join(traceback.format_tb(exc_info[2])),
+            })
+
+        self.backend.mark_as_failure(task_id, exc, traceback="".join(traceback.format_exception(*exc_info)))
+
+    def _retry_batch_item(self, task_name, flow_name, parent, node_args, dispatcher_id, task_id, exc, foreach_group):
+        # pylint: disable=too-many-arguments
+        """Retry a node that failed in a batch, the node is rescheduled on its own under its task id.
+
+        :param task_name: name of the task
+        :param flow_name: flow in which the task run
+        :param parent: dict of parent nodes
+        :param node_args: node arguments of the failed node as received in the message
+        :param dispatcher_id: dispatcher id that handles flow
+        :param task_id: id of the failed node
+        :param exc: exception raised for the node
+        :param foreach_group: id of foreach group the node belongs to, if any
+        :return: True if the node was rescheduled
+        """
+        max_retry = Config.max_retry.get(task_name, 0)
+        user_retry = isinstance(exc, Retry)
+        if not user_retry and (max_retry == 0 or isinstance(exc, FatalTaskError)):
+            return False
+
+        retried_count = 0 if user_retry else 1
+        retry_countdown = exc.countdown if user_retry else Config.retry_countdown.get(task_name, 0)
+        kwargs = {
+            'task_name': task_name,
+            'flow_name': flow_name,
+            'parent': parent,
+            'node_args': node_args,
+            'dispatcher_id': dispatcher_id,
+            'retried_count': retried_count
+        }
+        if foreach_group:
+            kwargs['foreach_group'] = foreach_group
+
+        Trace.log(Trace.TASK_RETRY, {'flow_name': flow_name,
+                                     'task_name': task_name,
+                                     'task_id': task_id,
+                                     'batch_id': self.request.id,
+                                     'parent': parent,
+                                     'node_args': node_args,
+                                     'what': "".join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+                                     'retry_countdown': retry_countdown,
+                                     'retried_count': retried_count,
+                                     'user_retry': user_retry,
+                                     'queue': Config.task_queues[task_name],
+                                     'dispatcher_id': dispatcher_id,
+                                     'max_retry': max_retry})
+        self.apply_async(kwargs=kwargs, queue=Config.task_queues[task_name], countdown=retry_countdown,
+                         task_id=task_id)
+        return True
+
+    def _run_batch(self, task_name, flow_name, parent, node_args, dispatcher_id, batch, foreach_group=None):
+        # pylint: disable=too-many-arguments,too-many-locals,too-many-branches
+        """Run nodes of a task packed into one message, see batch_size task configuration option.
+
+        Each node keeps its own task id - states of nodes are stored in the result backend once the batch is
+        computed, results are stored in one storage operation. Failed nodes are retried one by one.
+
+        :param task_name: task to be run
+        :param flow_name: flow in which this task run
+        :param parent: dict of parent nodes
+        :param node_args: flow arguments shared by nodes that do not carry their own node arguments
+        :param dispatcher_id: dispatcher id that handles flow
+        :param batch: a list of nodes to run - task id and optionally node arguments of each node
+        :param foreach_group: id of foreach group the nodes belong to, if any
+        """
+        trace_msg = {
+            'flow_name': flow_name,
+            'task_name': task_name,
+            'batch_id': self.request.id,
+            'parent': parent,
+            'queue': Config.task_queues[task_name],
+            'dispatcher_id': dispatcher_id
+        }
+        # Node arguments as received are used on retries so a copy in claim-check storage is not stored again.
+        received_node_args = [item.get('node_args', node_args) for item in batch]
+        for item, item_node_args in zip(batch, received_node_args):
+            Trace.log(Trace.TASK_START, trace_msg, {'task_id': item['task_id'], 'node_args': item_node_args})
+
+        resolved_node_args = received_node_args
+        try:
+            shared_node_args = ClaimCheck.resolve(node_args)
+            resolved_node_args = [ClaimCheck.resolve(item['node_args']) if 'node_args' in item else shared_node_args
+                                  for item in batch]
+            task = Config.get_task_instance(
+                task_name=task_name,
+                flow_name=flow_name,
+                parent=parent,
+                task_id=self.request.id,
+                dispatcher_id=dispatcher_id
+            )
+            task.batch_task_ids = [item['task_id'] for item in batch]
+            results = task.run_batch(resolved_node_args)
+            if len(results) != len(batch):
+                raise ValueError("Task '%s' returned %d results for a batch of %d nodes"
+                                 % (task_name, len(results), len(batch)))
+        except Exception as exc:  # pylint: disable=broad-except
+            # The whole batch failed.
+            results = [exc] * len(batch)
+
+        succeeded = []
+        failed = []
+        for item, item_node_args, result in zip(batch, resolved_node_args, results):
+            if not isinstance(result, Exception):
+                try:
+                    self.validate_result(task_name, result)
+                except Exception as exc:  # pylint: disable=broad-except
+                    result = exc
+
+            if isinstance(result, Exception):
+                failed.append((item['task_id'], result))
+            else:
+                succeeded.append((item_node_args, item['task_id'], result))
+
+        storage = StoragePool.get_storage_name_by_task_name(task_name, graceful=True)
+        if succeeded and storage and not Config.storage_readonly[task_name]:
+            set_many = ResultWriter.set_many if Config.write_behind.get(task_name, False) else StoragePool.set_many
+            try:
+                set_many(flow_name, task_name, succeeded, dispatcher_id=dispatcher_id)
+            except Exception as exc:  # pylint: disable=broad-except
+                failed.extend((task_id, exc) for _, task_id, _ in succeeded)
+                succeeded = []
+        else:
+            for item_node_args, task_id, result in succeeded:
+                if result is not None:
+                    Trace.log(Trace.TASK_DISCARD_RESULT, trace_msg, {'task_id': task_id,
+                                                                     'node_args': item_node_args,
+                                                                     'result': result})
+
+        finished = []
+        for item_node_args, task_id, _ in succeeded:
+            self.backend.mark_as_done(task_id, None)
+            finished.append(task_id)
+            Trace.log(Trace.TASK_END, trace_msg, {'task_id': task_id, 'node_args': item_node_args, 'storage': storage})
+
+        node_args_by_id = {item['task_id']: item_node_args
+                           for item, item_node_args in zip(batch, zip(received_node_args, resolved_node_args))}
+        for task_id, exc in failed:
+            received, resolved = node_args_by_id[task_id]
+            if not self._retry_batch_item(task_name, flow_name, parent, received, dispatcher_id, task_id, exc,
+                                          foreach_group):
+                self._fail_batch_item(task_name, flow_name, parent, resolved, dispatcher_id, task_id, exc)
+                finished.append(task_id)
+
+        if foreach_group:
+            for task_id in finished:
+                ForeachGroup.report(foreach_group, task_id)
+
+    def run(self, task_name, flow_name, parent, node_args, dispatcher_id, retried_count=None, foreach_group=None,
+            batch=None):
         # pylint: disable=arguments-differ,too-many-arguments,too-many-locals
         """Task entry-point called by Celery.
 
@@ -92,8 +298,14 @@ class SelinonTaskEnvelope(Task):
         :param node_args: node arguments within the flow
         :param dispatcher_id: dispatcher id that handles flow
         :param retried_count: number of already attempts that failed so task was retried
+        :param foreach_group: id of foreach group the task belongs to, if any
+        :param batch: nodes to be run in one batch if the task is run in batches
         :rtype: None
         """
+        if batch is not None:
+            self._run_batch(task_name, flow_name, parent, node_args, dispatcher_id, batch, foreach_group)
+            return
+
         # we are passing args as one argument explicitly for now not to have troubles with *args and **kwargs mapping
         # since we depend on previous task and the result can be anything
         Trace.log(Trace.TASK_START, {'flow_name': flow_name,
@@ -103,7 +315,10 @@ class SelinonTaskEnvelope(Task):
                                      'queue': Config.task_queues[task_name],
                                      'dispatcher_id': dispatcher_id,
                                      'node_args': node_args})
+        # Node arguments as received are used on retries so a copy in claim-check storage is not stored again.
+        received_node_args = node_args
         try:
+            node_args = ClaimCheck.resolve(node_args)
             task = Config.get_task_instance(
                 task_name=task_name,
                 flow_name=flow_name,
@@ -115,8 +330,11 @@ class SelinonTaskEnvelope(Task):
             self.validate_result(task_name, result)
 
             storage = StoragePool.get_storage_name_by_task_name(task_name, graceful=True)
-            if storage and not Config.storage_readonly[task_name]:
-                StoragePool.set(node_args, flow_name, task_name, self.request.id, result)
+            if storage and not Config.storage_readonly[task_name] and Config.write_behind.get(task_name, False):
+                # Wait until the result is stored so the task is not reported as finished without a stored result.
+                ResultWriter.set(node_args, flow_name, task_name, self.request.id, result, dispatcher_id=dispatcher_id)
+            elif storage and not Config.storage_readonly[task_name]:
+                StoragePool.set(node_args, flow_name, task_name, self.request.id, result, dispatcher_id=dispatcher_id)
             elif result is not None:
                 Trace.log(Trace.TASK_DISCARD_RESULT, {'flow_name': flow_name,
                                                       'task_name': task_name,
@@ -128,8 +346,8 @@ class SelinonTaskEnvelope(Task):
                                                       'result': result})
         except Retry as retry:
             # we do not touch retried_count
-            self.selinon_retry(task_name, flow_name, parent, node_args, retry.countdown, retried_count,
-                               dispatcher_id, user_retry=True)
+            self.selinon_retry(task_name, flow_name, parent, received_node_args, retry.countdown, retried_count,
+                               dispatcher_id, user_retry=True, foreach_group=foreach_group)
         except Exception as exc:  # pylint: disable=broad-except
             exc_info = sys.exc_info()
             max_retry = Config.max_retry.get(task_name, 0)
@@ -138,8 +356,8 @@ class SelinonTaskEnvelope(Task):
             if max_retry > retried_count and not isinstance(exc, FatalTaskError):
                 retried_count += 1
                 retry_countdown = Config.retry_countdown.get(task_name, 0)
-                self.selinon_retry(task_name, flow_name, parent, node_args, retry_countdown, retried_count,
-                                   dispatcher_id)
+                self.selinon_retry(task_name, flow_name, parent, received_node_args, retry_countdown, retried_count,
+                                   dispatcher_id, foreach_group=foreach_group)
             else:
                 Trace.log(Trace.TASK_FAILURE, {'flow_name': flow_name,
                                                'task_name': task_name,
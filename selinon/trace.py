@@ -188,6 +188,42 @@ A list of events that can be traced:
 |                            | adapter or `store_error()` is not   |                 |                                    |
 |                            | implemented.                        |                 |                                    |
 +----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `DISPATCHER_WAKEUP_NOTIFY` | A finished node scheduled parent    |                 | dispatcher_id, queue, flow_name,   |
+|                            | dispatcher immediately as eager     | Task/Dispatcher | wakeup_sequence                    |
+|                            | wakeup is enabled for the flow.     |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `DISPATCHER_WAKEUP_MERGED` | Dispatcher message was dropped as   |                 | dispatcher_id, flow_name,          |
+|                            | the flow state was already checked  | Dispatcher      | wakeup_sequence                    |
+|                            | by another (wakeup) message.        |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `CLAIM_CHECK_STORE`        | A large payload (dispatcher state   |                 | dispatcher_id, flow_name,          |
+|                            | or node arguments) was stored in    | Dispatcher      | storage_name, key                  |
+|                            | the claim-check storage.            |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `CLAIM_CHECK_RELEASE`      | A payload stored in the claim-check |                 | dispatcher_id, flow_name,          |
+|                            | storage was removed as it is not    | Dispatcher      | storage_name, key                  |
+|                            | needed anymore.                     |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `PRODUCER_ISSUE`           | Publishing over a shared producer   |                 | what, queue, task_id               |
+|                            | connection failed, messages are     | Dispatcher      |                                    |
+|                            | published one by one.               |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `STORAGE_EVALUATE`         | A predicate in a condition was      |                 | flow_name, task_name, task_id,     |
+|                            | evaluated by the storage without    | Dispatcher      | storage_name, predicate_name,      |
+|                            | retrieving the task result.         |                 | result                             |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `RESULT_WRITER_FLUSH`      | Results of tasks buffered by the    |                 | flow_name, task_name, task_ids     |
+|                            | write-behind writer are stored in   | Task            |                                    |
+|                            | one storage operation.              |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `RESULT_WRITER_FULL`       | Buffer of the write-behind writer   |                 | flow_name, task_name, task_id,     |
+|                            | is full, the task waits until the   | Task            | buffer_size                        |
+|                            | writer catches up.                  |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+| `RESULT_WRITER_TIMEOUT`    | The write-behind writer did not     |                 | flow_name, task_name, task_id,     |
+|                            | store task result in time, the task | Task            | timeout                            |
+|                            | stores its result on its own.       |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
 
 """
 
@@ -260,7 +296,16 @@ class Trace:
         EAGER_FAILURE,\
         STORAGE_DELETE, \
         STORAGE_DELETED, \
-        = range(53)
+        DISPATCHER_WAKEUP_NOTIFY, \
+        DISPATCHER_WAKEUP_MERGED, \
+        CLAIM_CHECK_STORE, \
+        CLAIM_CHECK_RELEASE, \
+        PRODUCER_ISSUE, \
+        STORAGE_EVALUATE, \
+        RESULT_WRITER_FLUSH, \
+        RESULT_WRITER_FULL, \
+        RESULT_WRITER_TIMEOUT, \
+        = range(62)
 
     WARN_EVENTS = (
         NODE_FAILURE,
@@ -277,6 +322,9 @@ class Trace:
         MIGRATION_SKEW,
         MIGRATION_ERROR,
         EAGER_FAILURE,
+        PRODUCER_ISSUE,
+        RESULT_WRITER_FULL,
+        RESULT_WRITER_TIMEOUT,
     )
 
     _event_strings = (
@@ -332,7 +380,16 @@ class Trace:
         'MIGRATION_ERROR',
         'EAGER_FAILURE',
         'STORAGE_DELETE',
-        'STORAGE_DELETED'
+        'STORAGE_DELETED',
+        'DISPATCHER_WAKEUP_NOTIFY',
+        'DISPATCHER_WAKEUP_MERGED',
+        'CLAIM_CHECK_STORE',
+        'CLAIM_CHECK_RELEASE',
+        'PRODUCER_ISSUE',
+        'STORAGE_EVALUATE',
+        'RESULT_WRITER_FLUSH',
+        'RESULT_WRITER_FULL',
+        'RESULT_WRITER_TIMEOUT'
     )
 
     def __init__(self):
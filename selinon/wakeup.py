@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Event driven dispatcher wakeups - a dispatcher is scheduled once a node it waits for finishes."""
+
+import json
+
+from .config import Config
+from .helpers import implements_operations
+from .trace import Trace
+
+
+class Wakeup:
+    """Wake up a parent dispatcher when one of its nodes finishes instead of waiting for the retry countdown.
+
+    A dispatcher of a flow with eager wakeup enabled parks its continuation (dispatcher arguments) in Celery's
+    result backend before it is retried. Once a node finishes, the parked continuation is used to schedule the
+    dispatcher immediately. Each continuation carries a sequence number and only the first dispatcher message
+    for the given sequence proceeds - duplicate wakeups and the countdown retry (which is kept as a safety net)
+    are dropped. Only key-value result backends (e.g. Redis) are supported, with any other result backend
+    dispatcher falls back to the countdown based sampling.
+    """
+
+    # Task states (as reported by Celery) that mark a node as finished.
+    FINISHED_STATES = ('SUCCESS', 'FAILURE')
+
+    _KEY_PREFIX = 'selinon-wakeup-'
+    _DEFAULT_EXPIRES = 86400
+
+    def __init__(self):
+        """Unused."""
+        raise NotImplementedError()
+
+    @staticmethod
+    def _get_backend():
+        """Get result backend that is capable of storing wakeup records.
+
+        :return: Celery's key-value result backend, None if not available
+        """
+        backend = getattr(Config.celery_app, 'backend', None)
+        if not implements_operations(backend, ('get', 'set', 'delete', 'incr')):
+            return None
+
+        return backend
+
+    @classmethod
+    def _key(cls, dispatcher_id, *suffix):
+        """Construct a key for a wakeup record.
+
+        :param dispatcher_id: id of dispatcher the record belongs to
+        :param suffix: additional key parts
+        :return: key under which the record is stored
+        """
+        return cls._KEY_PREFIX + '-'.join((str(dispatcher_id),) + tuple(str(item) for item in suffix))
+
+    @classmethod
+    def _incr(cls, backend, key):
+        """Atomically increment a counter stored in the result backend, the counter expires with results.
+
+        :param backend: result backend to use
+        :param key: key of the counter
+        :return: counter value after incrementation
+        """
+        value = backend.incr(key)
+        backend.expire(key, getattr(backend, 'expires', None) or cls._DEFAULT_EXPIRES)
+        return value
+
+    @classmethod
+    def is_enabled(cls, flow_name):
+        """Check whether eager wakeup can be used for the given flow.
+
+        :param flow_name: name of the flow to check
+        :return: True if nodes of the flow should wake up the flow dispatcher
+        """
+        return bool(Config.eager_wakeup.get(flow_name, False)) and cls._get_backend() is not None
+
+    @classmethod
+    def claim(cls, dispatcher_id, sequence):
+        """Claim a dispatcher continuation, only the first claim for the given sequence succeeds.
+
+        :param dispatcher_id: id of the dispatcher
+        :param sequence: sequence number of the continuation that should be run
+        :return: True if the continuation should proceed, False if it was already run by another message
+        """
+        backend = cls._get_backend()
+        if backend is None:
+            return True
+
+        if cls._incr(backend, cls._key(dispatcher_id, sequence)) > 1:
+            return False
+
+        # Nodes that finished so far will be inspected by the claiming dispatcher.
+        backend.delete(cls._key(dispatcher_id))
+        backend.delete(cls._key(dispatcher_id, 'pending'))
+        return True
+
+    @classmethod
+    def park(cls, dispatcher_id, kwargs, queue):
+        """Park dispatcher continuation so finished nodes can schedule dispatcher.
+
+        :param dispatcher_id: id of the dispatcher
+        :param kwargs: dispatcher arguments carrying wakeup sequence
+        :param queue: dispatcher queue
+        :return: True if any node finished while dispatcher was running and dispatcher should be rescheduled now
+        """
+        backend = cls._get_backend()
+        if backend is None:
+            return False
+
+        backend.set(cls._key(dispatcher_id), json.dumps({'kwargs': kwargs, 'queue': queue}))
+        return bool(backend.get(cls._key(dispatcher_id, 'pending')))
+
+    @classmethod
+    def notify(cls, dispatcher_id):
+        """Notify dispatcher about a finished node, duplicate notifications for one continuation are merged.
+
+        :param dispatcher_id: id of the dispatcher that should be woken up
+        """
+        from .dispatcher import Dispatcher
+
+        backend = cls._get_backend()
+        if backend is None:
+            return
+
+        # Mark the finished node first so a dispatcher that is currently running does not miss it.
+        cls._incr(backend, cls._key(dispatcher_id, 'pending'))
+
+        continuation = backend.get(cls._key(dispatcher_id))
+        if not continuation:
+            return
+
+        if isinstance(continuation, bytes):
+            continuation = continuation.decode()
+        continuation = json.loads(continuation)
+
+        kwargs = continuation['kwargs']
+        if cls._incr(backend, cls._key(dispatcher_id, kwargs['wakeup_sequence'], 'notify')) > 1:
+            return
+
+        Trace.log(Trace.DISPATCHER_WAKEUP_NOTIFY, kwargs, dispatcher_id=dispatcher_id, queue=continuation['queue'])
+        Dispatcher().apply_async(kwargs=kwargs, queue=continuation['queue'], task_id=dispatcher_id)
+
+    @classmethod
+    def discard(cls, dispatcher_id):
+        """Discard any wakeup records of a dispatcher once the flow ends.
+
+        :param dispatcher_id: id of the dispatcher
+        """
+        backend = cls._get_backend()
+        if backend is None:
+            return
+
+        backend.delete(cls._key(dispatcher_id))
+        backend.delete(cls._key(dispatcher_id, 'pending'))
@@ -47,7 +47,7 @@ setup(
     extras_require={
         'celery': ['celery>=4,<6'],
         'mongodb': ['pymongo>=3.7'],
-        'postgresql': ['SQLAlchemy', 'SQLAlchemy-Utils'],
+        'postgresql': ['SQLAlchemy>=2.0.10', 'SQLAlchemy-Utils'],
         'redis': ['redis'],
         's3': ['boto3'],
         'sentry': ['sentry-sdk']
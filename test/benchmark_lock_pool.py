@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark of LockPool against the previous lock pool keeping a multiprocessing lock per lock id.
+
+Run with: PYTHONPATH=. python3 test/benchmark_lock_pool.py
+"""
+
+from multiprocessing import Lock
+import threading
+import timeit
+
+from selinon.lock_pool import LockPool
+
+
+class DictLockPool:  # pylint: disable=too-few-public-methods
+    """Lock pool as implemented before striping - one multiprocessing lock per lock id, global lock on lookup."""
+
+    def __init__(self):
+        self._locks = {}
+        self._global_lock = Lock()
+
+    def get_lock(self, lock_id):
+        with self._global_lock:
+            if not self._locks.get(lock_id):
+                ret = Lock()
+                self._locks[lock_id] = ret
+            else:
+                ret = self._locks[lock_id]
+
+        return ret
+
+
+def _acquire(lock_pool, lock_ids, repeat):
+    for _ in range(repeat):
+        for lock_id in lock_ids:
+            with lock_pool.get_lock(lock_id):
+                pass
+
+
+def _threaded(lock_pool, lock_ids, repeat, threads):
+    workers = [threading.Thread(target=_acquire, args=(lock_pool, lock_ids, repeat)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def main():
+    """Run benchmark and print results."""
+    scenarios = (
+        ('hot ids', ['flow1', 'flow2', 'Storage1'], 20000),
+        ('distinct ids', ['flow{}'.format(idx) for idx in range(10000)], 3),
+    )
+
+    for name, lock_ids, repeat in scenarios:
+        for threads in (1, 8):
+            for lock_pool_class in (DictLockPool, LockPool):
+                lock_pool = lock_pool_class()
+                elapsed = timeit.timeit(lambda: _threaded(lock_pool, lock_ids, repeat, threads), number=1)
+                print("{:<14} threads={:<3} {:<14} {:.3f}s".format(name, threads, lock_pool_class.__name__, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,10 @@ class AsyncResult:
     def __repr__(self):
         return "<%s>" % self._id
 
+    @property
+    def task_id(self):
+        return self._id
+
     @classmethod
     def clear(cls):
         cls._finished_mapping = {}
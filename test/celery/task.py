@@ -18,12 +18,14 @@ class Task:
         self.countdown = None
         self.dispatcher_id = None
         self.selective = None
+        self.kwargs = None
+        self.producer = None
 
     @property
     def task_id(self):
         return id(self)
 
-    def apply_async(self, kwargs, queue, countdown=None):
+    def apply_async(self, kwargs, queue, countdown=None, task_id=None, producer=None):
         from selinon.config import Config
 
         # Ensure that SelinonTaskEnvelope kept parameters consistent
@@ -37,6 +39,8 @@ class Task:
         self.retried_count = kwargs.get('retried_count')
         self.countdown = countdown
         self.selective = kwargs.get('selective')
+        self.kwargs = kwargs
+        self.producer = producer
 
         self.queue = queue
         Config.get_task_instance.register_node(self)
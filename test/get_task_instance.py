@@ -63,6 +63,9 @@ class GetTaskInstance:
         else:
             cls._task_instances.append(node)
         AsyncResult.set_unfinished(node.task_id)
+        # nodes run in a batch have their task ids assigned upfront
+        for item in (node.kwargs or {}).get('batch') or []:
+            AsyncResult.set_unfinished(item['task_id'])
 
     @classmethod
     def remove_all_flows_by_name(cls, flow_name):
@@ -88,6 +88,8 @@ class SelinonTestCase:
         Config.flows = kwargs.pop('flows', flows)
         Config.nowait_nodes = kwargs.pop('nowait_nodes', dict.fromkeys(flows, []))
         Config.eager_failures = kwargs.pop('eager_failures', dict.fromkeys(flows, []))
+        Config.eager_wakeup = kwargs.pop('eager_wakeup', dict.fromkeys(flows, False))
+        Config.state_encoding = kwargs.pop('state_encoding', dict.fromkeys(flows, 'json'))
         Config.get_task_instance = kwargs.pop('get_task_instance', GetTaskInstance())
         Config.failures = kwargs.pop('failures', {})
         Config.propagate_node_args = kwargs.pop('propagate_node_args', dict.fromkeys(flows, False))
@@ -101,6 +103,8 @@ class SelinonTestCase:
         Config.strategies = kwargs.pop('strategies', dict.fromkeys(flows, strategy_function))
         # TODO: this is currently unused as we do not have tests for store()
         Config.storage_readonly = kwargs.pop('storage_readonly', {})
+        Config.batch_size = kwargs.pop('batch_size', {})
+        Config.write_behind = kwargs.pop('write_behind', {})
         Config.storage_task_name = kwargs.pop('storage_task_name', StorageTaskNameMock())
         Config.task2storage_mapping = kwargs.pop('task2storage_mapping', {})
         Config.storage2storage_cache = kwargs.pop('storage2storage_cache', _TaskResultCacheMock())
@@ -112,6 +116,11 @@ class SelinonTestCase:
         Config.output_schemas = kwargs.pop('output_schemas', {})
         Config.async_result_cache = kwargs.pop('async_result_cache', _AsyncResultCacheMock(Config.is_flow))
         Config.selective_run_task = kwargs.pop('selective_run_task', _SelectiveRunFunctionMock())
+        Config.claim_check_storage = kwargs.pop('claim_check_storage', None)
+        Config.claim_check_threshold = kwargs.pop('claim_check_threshold', 0)
+        Config.write_behind_buffer_size = kwargs.pop('write_behind_buffer_size', 1024)
+        Config.write_behind_batch_size = kwargs.pop('write_behind_batch_size', 64)
+        Config.write_behind_timeout = kwargs.pop('write_behind_timeout', 30)
         Config.initialized = True
 
         if kwargs:
@@ -129,6 +138,18 @@ class SelinonTestCase:
                 entry['foreach_str'] = 'foreach_str'
                 entry['condition_str'] = 'condition_str'
 
+        # Compute edge indexes as they would be generated in config.py
+        Config.node_edge_index = {}
+        Config.starting_edge_index = {}
+        for flow_name, edges in Config.edge_table.items():
+            Config.node_edge_index[flow_name] = {}
+            Config.starting_edge_index[flow_name] = []
+            for idx, edge in enumerate(edges):
+                if not edge['from']:
+                    Config.starting_edge_index[flow_name].append(idx)
+                for node_name in edge['from']:
+                    Config.node_edge_index[flow_name].setdefault(node_name, []).append(idx)
+
     @staticmethod
     def cond_true(db, node_args):
         """
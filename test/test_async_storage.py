@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import asyncio
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon.async_data_storage import ExecutorDataStorage
+from selinon.caches import LRU
+from selinon.errors import StorageError
+from selinon.storages.memory import InMemoryStorage
+from selinon.storages.redis import AsyncRedis
+from selinon.storages.redis import Redis
+
+
+class TestAsyncStorage(SelinonTestCase):
+    def _init_storages(self, cache=None):
+        self.storage1 = InMemoryStorage()
+        self.storage2 = InMemoryStorage()
+        self.init({'flow1': []},
+                  storage_mapping={'Storage1': self.storage1, 'Storage2': self.storage2},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage2'},
+                  storage2storage_cache={'Storage1': cache or LRU(max_cache_size=0),
+                                         'Storage2': LRU(max_cache_size=0)})
+        self.storage1.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        self.storage2.store(None, 'flow1', 'Task2', '<id2>', {'foo': 2})
+
+    def test_to_async(self):
+        storage = InMemoryStorage()
+
+        assert isinstance(storage.to_async(), ExecutorDataStorage)
+        assert isinstance(Redis().to_async(), AsyncRedis)
+        # a custom connection pool cannot be shared with asyncio client
+        assert isinstance(Redis(connection_pool=flexmock()).to_async(), ExecutorDataStorage)
+
+    def test_executor_storage(self):
+        storage = InMemoryStorage().to_async()
+
+        async def run():
+            await storage.connect()
+            record_id = await storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+            results = await storage.retrieve_many('flow1', 'Task1', [record_id])
+            await storage.delete('flow1', 'Task1', record_id)
+            return results
+
+        assert asyncio.run(run()) == [{'foo': 1}]
+        assert storage.storage.database == {}
+
+    def test_gather(self):
+        self._init_storages()
+
+        assert asyncio.run(StoragePool.gather('flow1', [('Task2', '<id2>'), ('Task1', '<id1>')])) == \
+            [{'foo': 2}, {'foo': 1}]
+
+    def test_retrieve_async_cached(self):
+        cache = LRU(max_cache_size=1)
+        self._init_storages(cache)
+        StoragePool.retrieve('flow1', 'Task1', '<id1>')
+        flexmock(self.storage1).should_receive('retrieve').never()
+
+        assert asyncio.run(StoragePool.retrieve_async('flow1', 'Task1', '<id1>')) == {'foo': 1}
+
+    def test_retrieve_async_error(self):
+        self._init_storages()
+
+        with pytest.raises(StorageError):
+            asyncio.run(StoragePool.retrieve_async('flow1', 'Task1', '<id3>'))
+
+    def test_set_delete_async(self):
+        self._init_storages()
+
+        async def run():
+            await StoragePool.set_async(None, 'flow1', 'Task1', '<id3>', {'foo': 3})
+            result = await StoragePool.retrieve_async('flow1', 'Task1', '<id3>')
+            await StoragePool.delete_async('flow1', 'Task1', '<id3>')
+            return result
+
+        assert asyncio.run(run()) == {'foo': 3}
+        assert '<id3>' not in self.storage1.database
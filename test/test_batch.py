@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+from request_mock import RequestMock
+from celery.result import AsyncResult
+
+from selinon import SelinonTask
+from selinon import StoragePool
+from selinon import SystemState
+from selinon.errors import ConfigurationError
+from selinon.errors import FatalTaskError
+from selinon.result_writer import ResultWriter
+from selinon.storages.memory import InMemoryStorage
+from selinon.task import Task
+from selinon.task_envelope import SelinonTaskEnvelope
+
+_FOREACH_COUNT = 10
+_BATCH_SIZE = 4
+
+
+class _ResultBackendMock:
+    """Mock of Celery's result backend used to mark states of nodes run in a batch."""
+
+    @staticmethod
+    def mark_as_done(task_id, result):
+        AsyncResult.set_finished(task_id)
+        AsyncResult.set_result(task_id, result)
+
+    @staticmethod
+    def mark_as_failure(task_id, exc, traceback=None):
+        AsyncResult.set_failed(task_id)
+        AsyncResult.set_result(task_id, exc)
+
+
+class _BatchTask(SelinonTask):
+    run_task_ids = []
+
+    def run(self, node_args):
+        self.run_task_ids.append(self.task_id)
+        if node_args == 'fail':
+            raise FatalTaskError("Failed item")
+        return {'item': node_args}
+
+
+class TestBatch(SelinonTestCase):
+    def _init_foreach(self, propagate_result=True, **kwargs):
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true,
+                       'foreach': lambda x, y: range(_FOREACH_COUNT), 'foreach_propagate_result': propagate_result},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, batch_size={'Task2': _BATCH_SIZE}, **kwargs)
+
+        system_state = SystemState(id(self), 'flow1', node_args={'foo': 'bar'})
+        system_state.update()
+        self.set_finished(self.get_task('Task1'))
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict(), node_args={'foo': 'bar'})
+        system_state.update()
+
+        return system_state.to_dict()
+
+    def _get_envelope(self, **kwargs):
+        self.storage = InMemoryStorage()
+        self.init({'flow1': []},
+                  get_task_instance=lambda **task_kwargs: _BatchTask(**task_kwargs),
+                  storage_mapping={'Storage': self.storage},
+                  task2storage_mapping={'Task2': 'Storage'},
+                  storage_readonly={'Task2': False},
+                  **kwargs)
+
+        task = SelinonTaskEnvelope()
+        task.request = RequestMock()
+        task.backend = _ResultBackendMock()
+        return task
+
+    def test_schedule(self):
+        state_dict = self._init_foreach()
+
+        envelopes = self.get_all_tasks('Task2')
+        assert [len(envelope.kwargs['batch']) for envelope in envelopes] == [4, 4, 2]
+        items = [item for envelope in envelopes for item in envelope.kwargs['batch']]
+        assert [item['node_args'] for item in items] == list(range(_FOREACH_COUNT))
+
+        # each node in a batch is tracked on its own
+        task2_ids = [node['id'] for node in state_dict['active_nodes'] if node['name'] == 'Task2']
+        assert task2_ids == [item['task_id'] for item in items]
+
+    def test_schedule_shared_node_args(self):
+        self._init_foreach(propagate_result=False)
+
+        for envelope in self.get_all_tasks('Task2'):
+            assert envelope.node_args == {'foo': 'bar'}
+            assert all('node_args' not in item for item in envelope.kwargs['batch'])
+
+    def test_batch_finished(self):
+        state_dict = self._init_foreach()
+        task2_ids = [node['id'] for node in state_dict['active_nodes'] if node['name'] == 'Task2']
+        AsyncResult.set_finished(task2_ids[0])
+        AsyncResult.set_failed(task2_ids[1])
+        AsyncResult.set_result(task2_ids[1], ValueError())
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict, node_args={'foo': 'bar'})
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert state_dict['finished_nodes']['Task2'] == [task2_ids[0]]
+        assert state_dict['failed_nodes']['Task2'] == [task2_ids[1]]
+
+    def test_run_batch(self):
+        task = self._get_envelope()
+        batch = [{'task_id': '<id1>', 'node_args': 1}, {'task_id': '<id2>'}]
+
+        task.run('Task2', 'flow1', parent={}, node_args='shared', dispatcher_id='<dispatcher-id>', batch=batch)
+
+        assert self.storage.retrieve('flow1', 'Task2', '<id1>') == {'item': 1}
+        assert self.storage.retrieve('flow1', 'Task2', '<id2>') == {'item': 'shared'}
+        assert AsyncResult('<id1>').successful()
+        assert AsyncResult('<id2>').successful()
+
+    def test_run_batch_task_ids(self):
+        task = self._get_envelope()
+        batch = [{'task_id': '<id1>', 'node_args': 1}, {'task_id': '<id2>', 'node_args': 2}]
+        _BatchTask.run_task_ids = []
+
+        task.run('Task2', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>', batch=batch)
+
+        # each item is run with its own task id
+        assert _BatchTask.run_task_ids == ['<id1>', '<id2>']
+
+    def test_run_batch_write_behind(self):
+        task = self._get_envelope(write_behind={'Task2': True})
+        batch = [{'task_id': '<id1>', 'node_args': 1}, {'task_id': '<id2>', 'node_args': 2}]
+        flexmock(StoragePool).should_call('set_many').once()
+        flexmock(ResultWriter).should_call('set_many').once()
+
+        try:
+            task.run('Task2', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>', batch=batch)
+        finally:
+            # start a new writer for the next test
+            ResultWriter._pid = None
+
+        assert self.storage.retrieve('flow1', 'Task2', '<id1>') == {'item': 1}
+        assert self.storage.retrieve('flow1', 'Task2', '<id2>') == {'item': 2}
+        assert AsyncResult('<id1>').successful()
+
+    def test_run_batch_store_many(self):
+        task = self._get_envelope()
+        batch = [{'task_id': '<id%d>' % idx, 'node_args': idx} for idx in range(3)]
+        flexmock(self.storage).should_receive('store').never()
+        flexmock(self.storage).should_receive('store_many').\
+            with_args('flow1', 'Task2', [(idx, '<id%d>' % idx, {'item': idx}) for idx in range(3)]).\
+            and_return([None, None, None]).\
+            once()
+
+        task.run('Task2', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>', batch=batch)
+
+    def test_run_batch_failure(self):
+        task = self._get_envelope()
+        batch = [{'task_id': '<id1>', 'node_args': 'fail'}, {'task_id': '<id2>', 'node_args': 2}]
+
+        task.run('Task2', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>', batch=batch)
+
+        # failure of one node does not affect other nodes in the batch
+        assert AsyncResult('<id1>').failed()
+        assert isinstance(AsyncResult('<id1>').result, FatalTaskError)
+        assert AsyncResult('<id2>').successful()
+        assert self.storage.retrieve('flow1', 'Task2', '<id2>') == {'item': 2}
+
+    def test_run_batch_retry(self):
+        task = self._get_envelope(max_retry={'Task2': 1})
+        batch = [{'task_id': '<id1>', 'node_args': 1}, {'task_id': '<id2>', 'node_args': 2}]
+        flexmock(_BatchTask).should_receive('run_batch').and_raise(ValueError)
+        flexmock(task).should_receive('apply_async').\
+            with_args(kwargs={'task_name': 'Task2', 'flow_name': 'flow1', 'parent': {}, 'node_args': 1,
+                              'dispatcher_id': '<dispatcher-id>', 'retried_count': 1},
+                      queue=str, countdown=0, task_id='<id1>').\
+            once()
+        flexmock(task).should_receive('apply_async').\
+            with_args(kwargs={'task_name': 'Task2', 'flow_name': 'flow1', 'parent': {}, 'node_args': 2,
+                              'dispatcher_id': '<dispatcher-id>', 'retried_count': 1},
+                      queue=str, countdown=0, task_id='<id2>').\
+            once()
+
+        task.run('Task2', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>', batch=batch)
+
+    def test_run_batch_results_mismatch(self):
+        task = self._get_envelope()
+        batch = [{'task_id': '<id1>', 'node_args': 1}, {'task_id': '<id2>', 'node_args': 2}]
+        flexmock(_BatchTask).should_receive('run_batch').and_return([{}])
+
+        task.run('Task2', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>', batch=batch)
+
+        assert AsyncResult('<id1>').failed()
+        assert AsyncResult('<id2>').failed()
+
+    @pytest.mark.parametrize('batch_size', (0, -1, '2', True))
+    def test_batch_size_config(self, batch_size):
+        with pytest.raises(ConfigurationError):
+            Task('Task1', 'foo.bar', None, batch_size=batch_size).check()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+from request_mock import RequestMock
+
+from selinon import Dispatcher
+from selinon import FlowError
+from selinon.celery import Retry
+from selinon.claim_check import ClaimCheck
+from selinon.storages.memory import InMemoryStorage
+from selinon.task_envelope import SelinonTaskEnvelope
+
+
+class TestClaimCheck(SelinonTestCase):
+    _NODE_ARGS = {'foo': 'bar' * 100}
+
+    def init(self, edge_table, **kwargs):
+        self.storage = InMemoryStorage()
+        super().init(edge_table,
+                     storage_mapping={'ClaimCheckStorage': self.storage},
+                     claim_check_storage='ClaimCheckStorage',
+                     claim_check_threshold=100,
+                     **kwargs)
+
+    def test_store_threshold(self):
+        self.init({'flow1': []})
+
+        assert ClaimCheck.store('<id>', 'flow1', {'foo': 'bar'}) is None
+        assert ClaimCheck.store('<id>', 'flow1', None) is None
+
+        reference = ClaimCheck.store('<id>', 'flow1', self._NODE_ARGS)
+        assert ClaimCheck.is_reference(reference)
+        assert ClaimCheck.resolve(reference) == self._NODE_ARGS
+        assert ClaimCheck.resolve(self._NODE_ARGS) is self._NODE_ARGS
+
+    def test_disabled(self):
+        super().init({'flow1': []})
+
+        assert ClaimCheck.store('<id>', 'flow1', self._NODE_ARGS) is None
+
+    def test_release_owner(self):
+        self.init({'flow1': []})
+        reference = ClaimCheck.store('<id>', 'flow1', self._NODE_ARGS)
+
+        # only the dispatcher that stored the copy can release it
+        ClaimCheck.release(reference, '<another-id>')
+        assert len(self.storage.database) == 1
+
+        ClaimCheck.release(reference, '<id>')
+        assert self.storage.database == {}
+
+    def test_dispatcher(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #       |
+        #       |
+        #     Task2
+        #
+        def my_retry(args, kwargs, countdown, queue):
+            retried_kwargs.clear()
+            retried_kwargs.update(kwargs)
+            raise Retry()
+
+        retried_kwargs = {}
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(Retry):
+            dispatcher.run('flow1', node_args=self._NODE_ARGS)
+
+        node_args_reference = retried_kwargs['node_args']
+        state_reference = retried_kwargs['state']
+        assert ClaimCheck.is_reference(node_args_reference)
+        assert ClaimCheck.is_reference(state_reference)
+        # node arguments are stored once and shared
+        task1 = self.get_task('Task1')
+        assert task1.node_args == node_args_reference
+        assert len(self.storage.database) == 2
+
+        self.set_finished(task1)
+        with pytest.raises(Retry):
+            dispatcher.run(**retried_kwargs)
+
+        task2 = self.get_task('Task2')
+        assert task2.node_args == node_args_reference
+        assert retried_kwargs['node_args'] == node_args_reference
+        # the previous state copy was released, the new one is stored
+        assert ClaimCheck.is_reference(retried_kwargs['state'])
+        assert retried_kwargs['state'] != state_reference
+        assert len(self.storage.database) == 2
+
+        self.set_finished(task2)
+        dispatcher.run(**retried_kwargs)
+
+        # all stored copies are removed once the flow ends
+        assert self.storage.database == {}
+
+    def test_dispatcher_retry_not_sent(self):
+        def my_retry(args, kwargs, countdown, queue):
+            retried_kwargs.update(kwargs)
+            raise Retry()
+
+        retried_kwargs = {}
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(Retry):
+            dispatcher.run('flow1', node_args=self._NODE_ARGS)
+
+        state_reference = retried_kwargs['state']
+        assert ClaimCheck.is_reference(state_reference)
+        flexmock(dispatcher).should_receive('retry').and_raise(RuntimeError)
+        with pytest.raises(RuntimeError):
+            dispatcher.run(**retried_kwargs)
+
+        # the retry message was not sent, the current state copy can be still consumed
+        assert ClaimCheck.resolve(state_reference)['active_nodes']
+
+    def test_dispatcher_missing_copy(self):
+        def my_retry(*args, **kwargs):
+            retried.append(kwargs)
+            raise kwargs['exc']
+
+        retried = []
+        self.init({'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]})
+        reference = ClaimCheck.store('<id>', 'flow1', self._NODE_ARGS)
+        ClaimCheck.release(reference, '<id>')
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        # the stored copy will not come back, the flow fails instead of retrying
+        with pytest.raises(FlowError):
+            dispatcher.run('flow1', node_args=reference)
+
+        assert len(retried) == 1
+        assert retried[0]['max_retries'] == 0
+
+    def test_dispatcher_storage_outage(self):
+        def my_retry(*args, **kwargs):
+            retried.append(kwargs)
+            raise Retry()
+
+        retried = []
+        self.init({'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]},
+                  max_retry={'flow1': 1})
+        reference = ClaimCheck.store('<id>', 'flow1', self._NODE_ARGS)
+        flexmock(self.storage).should_receive('retrieve').and_raise(ConnectionError)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        # the storage is not available, retry as configured for the flow
+        with pytest.raises(Retry):
+            dispatcher.run('flow1', node_args=reference)
+
+        assert retried[0]['kwargs']['retried_count'] == 1
+        assert retried[0]['kwargs']['node_args'] == reference
+        assert len(self.storage.database) == 1
+
+    def _run_failed_flow(self, eager_failures):
+        #
+        # flow1:
+        #
+        #     Task1 x    Task2
+        #
+        def my_retry(*args, **kwargs):
+            retried.append(kwargs)
+            raise Retry()
+
+        retried = []
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, eager_failures=eager_failures)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(Retry):
+            dispatcher.run('flow1', node_args=self._NODE_ARGS)
+
+        self.set_failed(self.get_task('Task1'), ValueError())
+        return dispatcher, retried
+
+    def test_flow_failure(self):
+        dispatcher, retried = self._run_failed_flow(eager_failures={})
+        self.set_finished(self.get_task('Task2'))
+
+        with pytest.raises(Retry):
+            dispatcher.run(**retried[0]['kwargs'])
+
+        # the flow failed, nothing references stored copies
+        assert retried[1]['max_retries'] == 0
+        assert self.storage.database == {}
+
+    def test_flow_eager_failure(self):
+        dispatcher, retried = self._run_failed_flow(eager_failures={'flow1': ['Task1']})
+
+        with pytest.raises(Retry):
+            dispatcher.run(**retried[0]['kwargs'])
+
+        # Task2 is still active, node arguments are left to expire in the storage
+        assert retried[1]['max_retries'] == 0
+        assert retried[1]['exc'].state['active_nodes']
+        assert list(self.storage.database.values())[0]['result'] == self._NODE_ARGS
+        assert len(self.storage.database) == 1
+
+    def test_subflow_shares_node_args(self):
+        #
+        # flow1:
+        #
+        #     flow2
+        #
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['flow2'], 'condition': self.cond_true}],
+            'flow2': []
+        }
+        self.init(edge_table, propagate_node_args={'flow1': True})
+        reference = ClaimCheck.store('<parent-id>', 'flow1', self._NODE_ARGS)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').and_raise(RuntimeError)
+
+        with pytest.raises(RuntimeError):
+            dispatcher.run('flow1', node_args=reference)
+
+        assert self.get_flow('flow2').node_args == reference
+
+        # the stored copy is owned by the parent dispatcher
+        ClaimCheck.release(reference, '<id>')
+        assert len(self.storage.database) == 2
+
+    def test_nowait_node_args(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, nowait_nodes={'flow1': ['Task1']})
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        dispatcher.run('flow1', node_args=self._NODE_ARGS)
+
+        # nowait nodes can outlive the flow, they cannot use stored copy
+        assert self.get_task('Task1').node_args == self._NODE_ARGS
+        assert self.storage.database == {}
+
+    def test_task_envelope(self):
+        def get_task_instance(**kwargs):
+            return flexmock(run=lambda node_args: run_node_args.append(node_args))
+
+        run_node_args = []
+        self.init({'flow1': []}, get_task_instance=get_task_instance)
+        reference = ClaimCheck.store('<dispatcher-id>', 'flow1', self._NODE_ARGS)
+
+        task = SelinonTaskEnvelope()
+        task.request = RequestMock()
+        task.run('Task1', 'flow1', parent={}, node_args=reference, dispatcher_id='<dispatcher-id>')
+
+        assert run_node_args == [self._NODE_ARGS]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import importlib
+import inspect
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+import selinon.predicates
+from selinon.builtin_predicate import AndPredicate
+from selinon.builtin_predicate import NotPredicate
+from selinon.builtin_predicate import OrPredicate
+from selinon.condition_compiler import ConditionCompiler
+from selinon.helpers import get_function_arguments
+from selinon.helpers import project_fields
+from selinon.leaf_predicate import LeafPredicate
+from selinon.predicate import Predicate
+from selinon.predicates import argsFieldEqual
+from selinon.predicates import argsFieldExist
+from selinon.predicates import envExist
+from selinon.predicates import fieldEqual
+from selinon.predicates import fieldExist
+from selinon.predicates import fieldGreater
+
+
+def _builtin_predicates():
+    return [func for name, func in sorted(vars(selinon.predicates).items())
+            if inspect.isfunction(func) and name != 'httpStatus']
+
+
+_PREDICATE_ARGS = {'key': ['foo', 'bar'], 'value': 3, 'length': 2, 'netloc': 'example.com', 'path': '/x',
+                   'scheme': 'https', 'env': 'SELINON_TEST_ENV'}
+
+_INPUTS = (None, {}, 'foo', 3, [1], True, 1.5, {'foo': 1}, {'foo': {'bar': 3}}, {'foo': {'bar': None}},
+           {'foo': {'bar': [1, 3]}}, {'foo': {'bar': 'https://example.com/x'}}, {'foo': {'bar': {'baz': 1}}},
+           {'foo': {'bar': 2.5}}, {'foo': {'bar': False}}, {'foo': {'bar': '3'}})
+
+
+def _customPredicate(message, key):
+    return key in message
+
+
+class _StoragePoolMock:
+    def __init__(self, results):
+        self.results = results
+        self.retrieved = []
+
+    def get(self, task_name):
+        self.retrieved.append(task_name)
+        return self.results[task_name]
+
+    def get_fields(self, task_name, paths):
+        self.retrieved.append(task_name)
+        return project_fields(self.results[task_name], paths)
+
+    def evaluate(self, task_name, predicate, **args):
+        return predicate(message=self.get(task_name), **args)
+
+
+class TestConditionCompiler(SelinonTestCase):
+    _TASK1 = flexmock(name='Task1', storage='Storage1')
+    _TASK2 = flexmock(name='Task2', storage='Storage1')
+    _TASK3 = flexmock(name='Task3', storage='Storage1')
+    _FLOW = flexmock(name='flow1')
+
+    def _leaf(self, func, task=None, **args):
+        return LeafPredicate(func, task or self._TASK1, self._FLOW, args)
+
+    @staticmethod
+    def _expression(predicate, **kwargs):
+        source = ConditionCompiler(predicate, **kwargs).to_source('_cond')
+        prefix = 'def _cond(db, node_args):\n    return '
+        assert source.startswith(prefix)
+        return source[len(prefix):]
+
+    @staticmethod
+    def _evaluate(predicate, results, node_args=None, **kwargs):
+        source = ConditionCompiler(predicate, **kwargs).to_source('_cond')
+        db = _StoragePoolMock(results)
+        namespace = {
+            'fieldEqual': fieldEqual,
+            'fieldExist': fieldExist,
+            'argsFieldExist': argsFieldExist,
+            '_customPredicate': _customPredicate
+        }
+        for import_path, name, alias in ConditionCompiler.IMPORTS:
+            namespace[alias] = getattr(importlib.import_module(import_path), name)
+
+        exec(source, namespace)
+        return namespace['_cond'](db, node_args), db.retrieved
+
+    def test_cost(self):
+        assert self._leaf(envExist, env='FOO').cost() == Predicate.COST_NO_INPUT
+        assert self._leaf(argsFieldExist, key='foo').cost() == Predicate.COST_NODE_ARGS
+        assert self._leaf(fieldExist, key='foo').cost() == Predicate.COST_MESSAGE
+        assert self._leaf(_customPredicate, key='foo').cost() == Predicate.COST_CUSTOM
+        assert NotPredicate(OrPredicate([self._leaf(envExist, env='FOO'),
+                                         self._leaf(fieldExist, key='foo')])).cost() == Predicate.COST_MESSAGE
+
+    def test_reorder(self):
+        predicate = AndPredicate([self._leaf(_customPredicate, key='foo'),
+                                  self._leaf(fieldExist, key='foo'),
+                                  NotPredicate(OrPredicate([self._leaf(fieldExist, key='bar'),
+                                                            self._leaf(argsFieldEqual, key='foo', value=1)])),
+                                  self._leaf(argsFieldExist, key='foo'),
+                                  self._leaf(envExist, env='FOO')])
+
+        assert self._expression(predicate, inline=False) == \
+            "envExist(env='FOO') and argsFieldExist(node_args=node_args, key='foo') and " \
+            "fieldExist(message=(_message_0 := db.get('Task1')), key='foo') and " \
+            "(not (argsFieldEqual(node_args=node_args, key='foo', value=1) or " \
+            "fieldExist(message=_message_0, key='bar'))) and _customPredicate(message=_message_0, key='foo')"
+
+    def test_reorder_disabled(self):
+        predicate = AndPredicate([self._leaf(fieldExist, key='foo'), self._leaf(argsFieldExist, key='foo')])
+
+        assert self._expression(predicate, inline=False, pushdown=False).startswith('argsFieldExist(')
+        # the original predicate is kept untouched when reordered
+        assert self._expression(predicate, reorder=False, inline=False, pushdown=False).startswith('fieldExist(')
+
+    @pytest.mark.parametrize('func', _builtin_predicates())
+    @pytest.mark.parametrize('env', (None, 'yes', '3'))
+    def test_inline(self, func, env, monkeypatch):
+        if env is None:
+            monkeypatch.delenv(_PREDICATE_ARGS['env'], raising=False)
+        else:
+            monkeypatch.setenv(_PREDICATE_ARGS['env'], env)
+
+        args = {arg: _PREDICATE_ARGS[arg] for arg in get_function_arguments(func) if arg in _PREDICATE_ARGS}
+        predicate = self._leaf(func, **args)
+
+        # built-in predicates are not called at all
+        assert func.__name__ + '(' not in ConditionCompiler(predicate, pushdown=False).to_source('_cond')
+        for value in _INPUTS:
+            kwargs = dict(args)
+            if predicate.requires_message():
+                kwargs['message'] = value
+            if predicate.requires_node_args():
+                kwargs['node_args'] = value
+
+            assert self._evaluate(predicate, {'Task1': value}, node_args=value, pushdown=False)[0] == func(**kwargs), \
+                value
+
+    def test_inline_key(self):
+        predicate = self._leaf(fieldGreater, key='foo', value=1)
+
+        assert ConditionCompiler(predicate, pushdown=False, projection=False).to_source('_cond') == \
+            "def _cond_0(message):\n" \
+            "    try:\n" \
+            "        return message['foo'] > 1\n" \
+            "    except Exception:\n" \
+            "        return False\n\n" \
+            "def _cond(db, node_args):\n" \
+            "    return _cond_0(db.get('Task1'))"
+
+    def test_pushdown(self):
+        predicate = AndPredicate([self._leaf(fieldEqual, key=['foo', 'bar'], value=1),
+                                  self._leaf(fieldExist, key='foo'),
+                                  self._leaf(fieldExist, task=self._TASK2, key='foo'),
+                                  self._leaf(_customPredicate, task=self._TASK2, key='foo'),
+                                  self._leaf(fieldEqual, task=self._TASK3, key='foo', value=2)])
+
+        # only a result inspected by a single built-in predicate is inspected by the storage
+        assert self._expression(predicate, reorder=False, inline=False).endswith(
+            " and db.evaluate('Task3', fieldEqual, key='foo', value=2)")
+        assert ConditionCompiler(predicate).pushed_down() == {'Task3': ['fieldEqual']}
+        assert ConditionCompiler(predicate, pushdown=False).pushed_down() == {}
+
+    def test_projection(self):
+        predicate = AndPredicate([self._leaf(fieldEqual, key=['foo', 'bar'], value=1),
+                                  self._leaf(fieldExist, key='baz'),
+                                  self._leaf(fieldExist, task=self._TASK2, key='foo'),
+                                  self._leaf(_customPredicate, task=self._TASK2, key='foo')])
+
+        source = self._expression(predicate, reorder=False, inline=False, pushdown=False)
+
+        # only the result of Task1 is inspected solely by built-in field predicates
+        assert "db.get_fields('Task1', [['foo', 'bar'], ['baz']])" in source
+        assert "db.get('Task2')" in source
+        assert self._evaluate(predicate, {'Task1': {'foo': {'bar': 1}, 'baz': None, 'qux': 2},
+                                          'Task2': {'foo': 3}}) == (True, ['Task1', 'Task2'])
+        assert 'get_fields' not in ConditionCompiler(predicate, projection=False).to_source('_cond')
+
+    def test_share_message(self):
+        predicate = AndPredicate([self._leaf(fieldExist, key='foo'), self._leaf(fieldExist, key='bar'),
+                                  self._leaf(fieldExist, task=self._TASK2, key='foo')])
+
+        result, retrieved = self._evaluate(predicate, {'Task1': {'foo': 1, 'bar': 2}, 'Task2': {'foo': 3}})
+
+        assert result is True
+        assert retrieved == ['Task1', 'Task2']
+
+    def test_not_dominated(self):
+        # the second predicate is evaluated even if the first one is not
+        predicate = OrPredicate([AndPredicate([self._leaf(argsFieldExist, key='foo'),
+                                               self._leaf(fieldExist, key='foo')]),
+                                 self._leaf(fieldExist, key='bar')])
+
+        source = self._expression(predicate, inline=False)
+        result, retrieved = self._evaluate(predicate, {'Task1': {'bar': 1}}, node_args={})
+
+        assert ':=' not in source
+        assert result is True
+        assert retrieved == ['Task1']
+
+    def test_share_key_path(self):
+        predicate = AndPredicate([self._leaf(fieldEqual, key=['foo', 'bar'], value=1),
+                                  NotPredicate(self._leaf(fieldExist, key=['foo', 'baz']))])
+
+        source = self._expression(predicate, inline=False, projection=False)
+
+        assert source.count(ConditionCompiler.LOOKUP_FIELD_NAME) == 1
+        assert source.count("db.get('Task1')") == 1
+        assert self._evaluate(predicate, {'Task1': {'foo': {'bar': 1}}})[0] is True
+        assert self._evaluate(predicate, {'Task1': {'foo': {'bar': 1, 'baz': 2}}})[0] is False
+
+    @pytest.mark.parametrize('message', ({}, {'foo': None}, {'foo': {'baz': 1}}, None))
+    def test_share_key_path_missing(self, message):
+        predicate = AndPredicate([self._leaf(fieldExist, key=['foo', 'bar']),
+                                  self._leaf(fieldExist, key=['foo', 'baz'])])
+
+        assert self._evaluate(predicate, {'Task1': message})[0] is False
+
+    def test_custom_predicate(self):
+        predicate = AndPredicate([self._leaf(_customPredicate, key='foo'), self._leaf(_customPredicate, key='bar')])
+
+        source = self._expression(predicate, inline=False)
+
+        # custom predicates are free to interpret their arguments, only the message is shared
+        assert ConditionCompiler.LOOKUP_FIELD_NAME not in source
+        assert source.count("db.get('Task1')") == 1
+        assert self._evaluate(predicate, {'Task1': {'foo': 1, 'bar': 2}}) == (True, ['Task1'])
@@ -6,8 +6,11 @@
 # ######################################################################
 
 import os
+
+import pytest
 from selinon import Config
 from selinon_test_case import SelinonTestCase
+from selinon.errors import ConfigurationError
 from selinon.global_config import GlobalConfig
 
 
@@ -59,6 +62,7 @@ class TestConfig(SelinonTestCase):
         assert flows_available == set(Config.strategies.keys())
 
         assert 'flow1' in Config.failures
+        assert set(Config.failures['flow1']) == {frozenset(('task2',))}
         assert {'task1'} == set(Config.nowait_nodes.get('flow1'))
         assert 'schema.json' == Config.output_schemas.get('task1')
 
@@ -100,3 +104,159 @@ class TestConfig(SelinonTestCase):
         ]
 
         Config.set_config_dict(nodes, [flows])
+
+    def test_set_config_edge_indexes(self):
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks'},
+                {'name': 'task2', 'import': 'testapp.tasks'},
+                {'name': 'task3', 'import': 'testapp.tasks'}
+            ],
+            'flows': [
+                'flow1'
+            ]
+        }
+
+        flows = [
+            {
+                'flow-definitions': [
+                    {
+                        'name': 'flow1',
+                        'nowait': 'task3',
+                        'edges': [
+                            {'from': None, 'to': 'Task1'},
+                            {'from': 'Task1', 'to': 'task2'},
+                            {'from': ['Task1', 'task2'], 'to': 'task3'}
+                        ]
+                    }
+                ]
+            }
+        ]
+
+        Config.set_config_dict(nodes, [flows])
+
+        assert Config.node_edge_index == {'flow1': {'Task1': [1, 2], 'task2': [2]}}
+        assert Config.starting_edge_index == {'flow1': [0]}
+        assert Config.nowait_nodes == {'flow1': {'task3'}}
+        assert [idx for idx, _ in Config.get_starting_edges('flow1')] == [0]
+
+    def test_set_config_claim_check(self):
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks', 'storage': 'MyStorage'}
+            ],
+            'flows': [
+                'flow1'
+            ],
+            'storages': [
+                {'name': 'MyStorage', 'classname': 'MySimpleStorage', 'import': 'testapp.storages',
+                 'configuration': {'connection_string': 'foo', 'ttl': 3600}}
+            ],
+            'global': {
+                'claim_check': {'storage': 'MyStorage', 'threshold': 1024}
+            }
+        }
+
+        flows = [
+            {
+                'flow-definitions': [
+                    {
+                        'name': 'flow1',
+                        'edges': [
+                            {'from': None, 'to': 'Task1'}
+                        ]
+                    }
+                ]
+            }
+        ]
+
+        try:
+            Config.set_config_dict(nodes, [flows])
+        finally:
+            GlobalConfig.claim_check_storage = None
+            GlobalConfig.claim_check_threshold = GlobalConfig.DEFAULT_CLAIM_CHECK_THRESHOLD
+
+        assert Config.claim_check_storage == 'MyStorage'
+        assert Config.claim_check_threshold == 1024
+        Config.claim_check_storage = None
+
+    def test_set_config_claim_check_no_ttl(self):
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks', 'storage': 'MyStorage'}
+            ],
+            'flows': [
+                'flow1'
+            ],
+            'storages': [
+                {'name': 'MyStorage', 'classname': 'MySimpleStorage', 'import': 'testapp.storages',
+                 'configuration': {'connection_string': 'foo'}}
+            ],
+            'global': {
+                'claim_check': {'storage': 'MyStorage'}
+            }
+        }
+
+        flows = [
+            {
+                'flow-definitions': [
+                    {
+                        'name': 'flow1',
+                        'edges': [
+                            {'from': None, 'to': 'Task1'}
+                        ]
+                    }
+                ]
+            }
+        ]
+
+        try:
+            # stored copies are not removed if a flow fails with active nodes, they have to expire
+            with pytest.raises(ConfigurationError):
+                Config.set_config_dict(nodes, [flows])
+        finally:
+            GlobalConfig.claim_check_storage = None
+
+    def test_set_config_write_behind(self):
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks', 'storage': 'MyStorage', 'write_behind': True},
+                {'name': 'task2', 'import': 'testapp.tasks', 'storage': 'MyStorage'}
+            ],
+            'flows': [
+                'flow1'
+            ],
+            'storages': [
+                {'name': 'MyStorage', 'classname': 'MySimpleStorage', 'import': 'testapp.storages',
+                 'configuration': {'connection_string': 'foo'}}
+            ],
+            'global': {
+                'write_behind': {'buffer_size': 16, 'timeout': 2.5}
+            }
+        }
+
+        flows = [
+            {
+                'flow-definitions': [
+                    {
+                        'name': 'flow1',
+                        'edges': [
+                            {'from': None, 'to': 'Task1'},
+                            {'from': 'Task1', 'to': 'task2'}
+                        ]
+                    }
+                ]
+            }
+        ]
+
+        try:
+            Config.set_config_dict(nodes, [flows])
+        finally:
+            GlobalConfig.write_behind_buffer_size = GlobalConfig.DEFAULT_WRITER_BUFFER_SIZE
+            GlobalConfig.write_behind_batch_size = GlobalConfig.DEFAULT_WRITER_BATCH_SIZE
+            GlobalConfig.write_behind_timeout = GlobalConfig.DEFAULT_WRITER_TIMEOUT
+
+        assert Config.write_behind == {'Task1': True}
+        assert Config.write_behind_buffer_size == 16
+        assert Config.write_behind_batch_size == GlobalConfig.DEFAULT_WRITER_BATCH_SIZE
+        assert Config.write_behind_timeout == 2.5
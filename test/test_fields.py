@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import SelinonTask
+from selinon import StoragePool
+from selinon.caches import LRU
+from selinon.helpers import covering_paths
+from selinon.helpers import project_fields
+from selinon.storages.memory import InMemoryStorage
+
+
+class _MyTask(SelinonTask):
+    def run(self, node_args):
+        pass
+
+
+_DOCUMENT = {'foo': {'bar': 1, 'baz': [1, {'qux': 2}]}, 'x': None}
+
+
+class TestFields(SelinonTestCase):
+    def _init_storages(self, cache=None):
+        self.storage = InMemoryStorage()
+        self.init({'flow1': []},
+                  storage_mapping={'Storage1': self.storage},
+                  task2storage_mapping={'Task1': 'Storage1'},
+                  storage2storage_cache={'Storage1': cache or LRU(max_cache_size=0)})
+        self.storage.store(None, 'flow1', 'Task1', '<id1>', _DOCUMENT)
+
+    def test_covering_paths(self):
+        assert covering_paths([['foo', 'bar'], ['foo'], ['x'], ('foo', 'baz'), ['x']]) == [['foo'], ['x']]
+        assert covering_paths([['foo'], []]) == [[]]
+
+    @pytest.mark.parametrize('paths,expected', (
+        ([['foo', 'bar']], {'foo': {'bar': 1}}),
+        ([['foo', 'bar'], ['x']], {'foo': {'bar': 1}, 'x': None}),
+        ([['foo', 'baz', 1, 'qux']], {'foo': {'baz': {1: {'qux': 2}}}}),
+        ([['foo', 'missing'], ['x', 'y']], {}),
+        ([[]], _DOCUMENT)
+    ))
+    def test_project_fields(self, paths, expected):
+        assert project_fields(_DOCUMENT, paths) == expected
+
+    def test_retrieve_fields(self):
+        self._init_storages()
+
+        assert self.storage.retrieve_fields('flow1', 'Task1', '<id1>', [['foo', 'bar']]) == {'foo': {'bar': 1}}
+        with pytest.raises(FileNotFoundError):
+            self.storage.retrieve_fields('flow1', 'Task1', '<id2>', [['foo', 'bar']])
+
+    def test_storage_pool_retrieve_fields(self):
+        cache = LRU(max_cache_size=2)
+        self._init_storages(cache)
+
+        assert StoragePool.retrieve_fields('flow1', 'Task1', '<id1>', [['foo', 'bar']]) == {'foo': {'bar': 1}}
+        # projected results are kept in the cache separately from whole results
+        assert StoragePool.retrieve('flow1', 'Task1', '<id1>') == _DOCUMENT
+
+        flexmock(self.storage).should_receive('retrieve_fields').never()
+        assert StoragePool.retrieve_fields('flow1', 'Task1', '<id1>', [['foo', 'bar']]) == {'foo': {'bar': 1}}
+
+    def test_get_fields_prefetched(self):
+        self._init_storages()
+        flexmock(StoragePool).should_receive('retrieve_fields').never()
+
+        storage_pool = StoragePool({'Task1': '<id1>'}, 'flow1', {('Task1', '<id1>'): _DOCUMENT})
+
+        assert storage_pool.get_fields('Task1', [['x']]) == {'x': None}
+
+    def test_parent_task_result(self):
+        self._init_storages()
+        task = _MyTask(task_name='Task2', flow_name='flow1', parent={'Task1': '<id1>'}, task_id='<id2>',
+                       dispatcher_id='<dispatcher-id>')
+        flexmock(self.storage).should_receive('retrieve').never()
+
+        assert task.parent_task_result('Task1', paths=[['foo', 'baz']]) == {'foo': {'baz': [1, {'qux': 2}]}}
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from flexmock import flexmock
+from key_value_backend_mock import KeyValueBackendMock
+from key_value_backend_mock import NoIncrBackendMock
+from selinon_test_case import SelinonTestCase
+
+from selinon import Config
+from selinon import SystemState
+from selinon.foreach_group import ForeachGroup
+from selinon.state_encoding import StateEncoding
+
+_FOREACH_COUNT = 10
+
+
+class TestForeachGroup(SelinonTestCase):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.backend = KeyValueBackendMock()
+        Config.celery_app = flexmock(backend=self.backend)
+
+    def teardown_method(self, method):
+        super().teardown_method(method)
+        Config.celery_app = None
+
+    def _run_foreach(self):
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true,
+                       'foreach': lambda x, y: range(_FOREACH_COUNT), 'foreach_propagate_result': False},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        self.set_finished(self.get_task('Task1'))
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+
+        return system_state.to_dict()
+
+    def _finish(self, task):
+        self.set_finished(task)
+        ForeachGroup.report(task.kwargs['foreach_group'], task.task_id)
+
+    def _polled_node_ids(self):
+        polled = []
+
+        def get_node_metas(arr):
+            polled.extend(node['id'] for node in arr)
+            return {}
+
+        flexmock(SystemState).should_receive('_get_node_metas').replace_with(get_node_metas)
+        return polled
+
+    def test_report_poll(self):
+        assert ForeachGroup.poll({'<group>': 0}) == {'<group>': (0, [])}
+
+        ForeachGroup.report('<group>', '<id1>')
+        ForeachGroup.report('<group>', '<id2>')
+
+        assert ForeachGroup.poll({'<group>': 0}) == {'<group>': (2, ['<id1>', '<id2>'])}
+        assert ForeachGroup.poll({'<group>': 1}) == {'<group>': (2, ['<id2>'])}
+
+        ForeachGroup.discard('<group>')
+        assert ForeachGroup.poll({'<group>': 2}) == {'<group>': (0, [])}
+
+    def test_poll_missing_slot(self):
+        self.backend.incr(ForeachGroup._key('<group>'))
+        assert ForeachGroup.poll({'<group>': 0}) == {'<group>': (1, None)}
+
+    def test_disabled_without_key_value_backend(self):
+        Config.celery_app = flexmock(backend=object())
+
+        assert ForeachGroup.is_enabled() is False
+        assert ForeachGroup.poll({'<group>': 0}) == {}
+        state_dict = self._run_foreach()
+
+        assert 'foreach_groups' not in state_dict
+        assert all('group' not in node for node in state_dict['active_nodes'])
+
+    def test_disabled_without_incr(self):
+        backend = NoIncrBackendMock()
+        Config.celery_app = flexmock(backend=backend)
+
+        assert ForeachGroup.is_enabled() is False
+        ForeachGroup.report('<group>', '<id1>')
+        assert backend.data == {}
+        state_dict = self._run_foreach()
+
+        # nodes are polled one by one
+        assert 'foreach_groups' not in state_dict
+        assert all('group' not in node for node in state_dict['active_nodes'])
+
+    def test_foreach_group_start(self):
+        state_dict = self._run_foreach()
+
+        task2_nodes = [node for node in state_dict['active_nodes'] if node['name'] == 'Task2']
+        assert len(task2_nodes) == _FOREACH_COUNT
+        group_id = task2_nodes[0]['group']
+        assert all(node['group'] == group_id for node in task2_nodes)
+        assert state_dict['foreach_groups'] == {group_id: {'seen': 0, 'idle': 0}}
+        assert all(task.kwargs['foreach_group'] == group_id for task in self.get_all_tasks('Task2'))
+
+    def test_poll_reported_only(self):
+        state_dict = self._run_foreach()
+        task2 = self.get_all_tasks('Task2')
+        self._finish(task2[3])
+
+        polled = self._polled_node_ids()
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        # only the node that reported its completion is inspected
+        assert polled == [task2[3].task_id]
+        assert state_dict['finished_nodes']['Task2'] == [task2[3].task_id]
+        assert len(state_dict['active_nodes']) == _FOREACH_COUNT - 1
+        assert list(state_dict['foreach_groups'].values()) == [{'seen': 1, 'idle': 0}]
+
+    def test_group_discarded(self):
+        state_dict = self._run_foreach()
+        group_id = state_dict['active_nodes'][0]['group']
+        for task in self.get_all_tasks('Task2'):
+            self._finish(task)
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is None
+        assert len(state_dict['finished_nodes']['Task2']) == _FOREACH_COUNT
+        assert 'foreach_groups' not in state_dict
+        assert ForeachGroup._key(group_id) not in self.backend.data
+
+    def test_full_poll_when_idle(self):
+        state_dict = self._run_foreach()
+        task2 = self.get_all_tasks('Task2')
+        # finished without reporting, e.g. the worker was killed in after_return
+        self.set_finished(task2[0])
+
+        for _ in range(ForeachGroup.FULL_POLL_IDLE_RUNS - 1):
+            system_state = SystemState(id(self), 'flow1', state=state_dict)
+            system_state.update()
+            state_dict = system_state.to_dict()
+            assert 'Task2' not in state_dict['finished_nodes']
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert state_dict['finished_nodes']['Task2'] == [task2[0].task_id]
+        assert list(state_dict['foreach_groups'].values()) == [{'seen': 0, 'idle': 0}]
+
+    def test_failure(self):
+        state_dict = self._run_foreach()
+        task2 = self.get_task('Task2', 0)
+        self.set_failed(task2)
+        ForeachGroup.report(task2.kwargs['foreach_group'], task2.task_id)
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        assert state_dict['failed_nodes'] == {'Task2': [task2.task_id]}
+
+    def test_state_encoding(self):
+        state_dict = self._run_foreach()
+
+        encoded = StateEncoding.encode(state_dict, StateEncoding.COMPACT)
+        assert StateEncoding.decode(encoded) == state_dict
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from celery.result import AsyncResult
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon import SystemState
+from selinon.edge import Edge
+from selinon.errors import ConfigurationError
+from selinon.selective import compute_selective_run
+from selinon.state_encoding import StateEncoding
+
+_FOREACH_COUNT = 5
+
+
+class TestJoin(SelinonTestCase):
+    def _run(self, state_dict=None, **kwargs):
+        system_state = SystemState(id(self), 'flow1', state=state_dict, **kwargs)
+        retry = system_state.update()
+        return retry, system_state.to_dict()
+
+    def _init_foreach_join(self, join):
+        #
+        # flow1:
+        #
+        #               Task1
+        #                 |
+        #        -------------------     foreach
+        #        |                 |
+        #   Task2 ... Task2   Task3 ... Task3
+        #        |                 |
+        #        -------------------     join
+        #                 |
+        #           Task4 ... Task4
+        #
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2', 'Task3'], 'condition': self.cond_true,
+                       'foreach': lambda x, y: range(_FOREACH_COUNT), 'foreach_propagate_result': False},
+                      {'from': ['Task2', 'Task3'], 'to': ['Task4'], 'condition': self.cond_true, 'join': join},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        _, state_dict = self._run()
+        self.set_finished(self.get_task('Task1'))
+        _, state_dict = self._run(state_dict)
+
+        return state_dict
+
+    def test_join_foreach_index(self):
+        state_dict = self._init_foreach_join(('foreach_index', None))
+        task2 = self.get_all_tasks('Task2')
+        task3 = self.get_all_tasks('Task3')
+
+        for task in task2 + task3:
+            self.set_finished(task)
+
+        retry, state_dict = self._run(state_dict)
+
+        assert retry is not None
+        # only nodes started for the same foreach item are paired
+        task4 = self.get_all_tasks('Task4')
+        assert len(task4) == _FOREACH_COUNT
+        assert sorted((task.parent['Task2'], task.parent['Task3']) for task in task4) == \
+            sorted((task2[idx].task_id, task3[idx].task_id) for idx in range(_FOREACH_COUNT))
+
+    def test_join_incremental(self):
+        state_dict = self._init_foreach_join(('foreach_index', None))
+        task2 = self.get_all_tasks('Task2')
+        task3 = self.get_all_tasks('Task3')
+
+        self.set_finished(task2[0])
+        self.set_finished(task3[1])
+        _, state_dict = self._run(state_dict)
+
+        assert 'Task4' not in self.instantiated_tasks
+        assert state_dict['join_index'] == {'1': {'Task2': {'0': [task2[0].task_id]},
+                                                  'Task3': {'1': [task3[1].task_id]}}}
+
+        self.set_finished(task3[0])
+        _, state_dict = self._run(state_dict)
+
+        assert [task.parent for task in self.get_all_tasks('Task4')] == \
+            [{'Task2': task2[0].task_id, 'Task3': task3[0].task_id}]
+
+    def test_join_result(self):
+        state_dict = self._init_foreach_join(('result', ['key']))
+        task2 = self.get_all_tasks('Task2')
+        task3 = self.get_all_tasks('Task3')
+        results = {task2[0].task_id: {'key': 'foo'}, task2[1].task_id: {'key': 'bar'},
+                   task3[0].task_id: {'key': 'bar'}, task3[1].task_id: {}}
+        flexmock(StoragePool).should_receive('retrieve').\
+            replace_with(lambda flow_name, task_name, task_id: results[task_id])
+
+        for task in task2[:2] + task3[:2]:
+            self.set_finished(task)
+
+        _, state_dict = self._run(state_dict)
+
+        # a node without the key is not paired at all
+        assert [task.parent for task in self.get_all_tasks('Task4')] == \
+            [{'Task2': task2[1].task_id, 'Task3': task3[0].task_id}]
+        assert task3[1].task_id in state_dict['finished_nodes']['Task3']
+
+    def test_join_node_args(self):
+        edge_table = {
+            'flow1': [{'from': ['Task1', 'Task2'], 'to': ['Task3'], 'condition': self.cond_true,
+                       'join': ('node_args', ['foo'])},
+                      {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        _, state_dict = self._run(node_args={'foo': 'bar'})
+        assert all(node['join'] == {'0': '"bar"'} for node in state_dict['active_nodes'])
+
+        self.set_finished(self.get_task('Task1'))
+        self.set_finished(self.get_task('Task2'))
+        self._run(state_dict, node_args={'foo': 'bar'})
+
+        assert len(self.get_all_tasks('Task3')) == 1
+
+    def test_join_selective_reuse(self):
+        #
+        # flow1:
+        #
+        #     Task0
+        #       |
+        #     Task1    Task2
+        #       |        |
+        #       ----------     join
+        #           |
+        #         Task3
+        #
+        # Note: result of Task1 is reused in the selective run
+        #
+        edge_table = {
+            'flow1': [{'from': ['Task1', 'Task2'], 'to': ['Task3'], 'condition': self.cond_true,
+                       'join': ('node_args', ['foo'])},
+                      {'from': ['Task0'], 'to': ['Task1'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task0', 'Task2'], 'condition': self.cond_true}]
+        }
+        selective_run_task = {
+            'Task0': lambda *args: None,
+            'Task1': lambda *args: '<reused-task1-id>',
+            'Task2': lambda *args: None
+        }
+        self.init(edge_table, selective_run_task=selective_run_task)
+        AsyncResult.set_finished('<reused-task1-id>')
+        selective = compute_selective_run('flow1', ['Task3'], follow_subflows=False, run_subsequent=False)
+
+        _, state_dict = self._run(node_args={'foo': 'bar'}, selective=selective)
+        self.set_finished(self.get_task('Task0'))
+        _, state_dict = self._run(state_dict, node_args={'foo': 'bar'}, selective=selective)
+
+        assert state_dict['join_index'] == {'0': {'Task1': {'"bar"': ['<reused-task1-id>']}}}
+
+        self.set_finished(self.get_task('Task2'))
+        self._run(state_dict, node_args={'foo': 'bar'}, selective=selective)
+
+        # the reused node is paired as if it was run
+        assert [task.parent for task in self.get_all_tasks('Task3')] == \
+            [{'Task1': '<reused-task1-id>', 'Task2': self.get_task('Task2').task_id}]
+
+    def test_join_fallback_config_error(self):
+        flow = flexmock(name='flow1', failures=flexmock(all_fallback_nodes=lambda: [task2]))
+        task1 = flexmock(name='Task1')
+        task2 = flexmock(name='Task2')
+        edge = Edge([task1, task2], [flexmock(name='Task3')], flexmock(nodes_used=lambda: []), flow,
+                    foreach=None, selective=None, join=('foreach_index', None))
+
+        # nodes started as fallbacks have no foreach index to be paired by
+        with pytest.raises(ConfigurationError):
+            edge.check()
+
+    def test_state_encoding(self):
+        state_dict = self._init_foreach_join(('foreach_index', None))
+        self.set_finished(self.get_task('Task2', 0))
+        _, state_dict = self._run(state_dict)
+
+        assert state_dict['join_index']
+        encoded = StateEncoding.encode(state_dict, StateEncoding.COMPACT)
+        assert StateEncoding.decode(encoded) == state_dict
+
+    @pytest.mark.parametrize('join_def', ('foo', {'result': []}, {'result': 'a', 'node_args': 'b'}, {'foo': 'bar'},
+                                          {'result': [{'a': 'b'}]}))
+    def test_join_config_error(self, join_def):
+        with pytest.raises(ConfigurationError):
+            Edge._parse_join(flexmock(name='flow1'), join_def)
+
+    def test_join_config(self):
+        assert Edge._parse_join(flexmock(name='flow1'), None) is None
+        assert Edge._parse_join(flexmock(name='flow1'), 'foreach_index') == ('foreach_index', None)
+        assert Edge._parse_join(flexmock(name='flow1'), {'result': 'foo'}) == ('result', ['foo'])
+        assert Edge._parse_join(flexmock(name='flow1'), {'node_args': ['foo', 0]}) == ('node_args', ['foo', 0])
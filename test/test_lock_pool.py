@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+
+from selinon.lock_pool import LockPool
+
+
+class TestLockPool:
+    def test_same_lock(self):
+        lock_pool = LockPool()
+
+        assert lock_pool.get_lock('flow1') is lock_pool.get_lock('flow1')
+        assert lock_pool.get_lock(('cache', 'Storage1')) is lock_pool.get_lock(('cache', 'Storage1'))
+
+    def test_bounded(self):
+        lock_pool = LockPool(stripes=4)
+
+        # the pool does not grow with the number of lock ids
+        locks = {id(lock_pool.get_lock('flow{}'.format(idx))) for idx in range(1000)}
+        assert len(locks) <= 4
+
+    def test_reentrant(self):
+        lock_pool = LockPool(stripes=1)
+
+        # colliding lock ids acquired in one thread do not deadlock
+        with lock_pool.get_lock('Storage1'):
+            with lock_pool.get_lock('Storage2'):
+                pass
+
+    def test_stripes(self):
+        with pytest.raises(ValueError):
+            LockPool(stripes=-1)
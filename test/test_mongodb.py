@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from pymongo.errors import DuplicateKeyError
+
+from selinon.data_storage import SelinonMissingDataException
+from selinon.storages import mongodb
+from selinon.storages.mongodb import MongoDB
+
+
+class _CollectionMock:
+    """MongoDB collection keeping documents in a list, only queries used by the adapter are supported."""
+
+    def __init__(self):
+        self.documents = []
+        self.indexes = []
+        self.round_trips = 0
+
+    def _match(self, query):
+        task_ids = query['task_id']['$in'] if isinstance(query['task_id'], dict) else [query['task_id']]
+        return [document for document in self.documents if document['task_id'] in task_ids]
+
+    def create_index(self, field, unique=False):
+        if unique and len({document[field] for document in self.documents}) != len(self.documents):
+            raise DuplicateKeyError("E11000 duplicate key error collection")
+        self.indexes.append((field, unique))
+
+    def insert_one(self, document):
+        self.round_trips += 1
+        self.documents.append(dict(document))
+
+    def insert_many(self, documents, ordered=True):
+        self.round_trips += 1
+        self.documents.extend(dict(document) for document in documents)
+
+    def find(self, query, projection, limit=0):
+        self.round_trips += 1
+        found = [{key: document[key] for key in projection if projection[key] and key in document}
+                 for document in self._match(query)]
+        return found[:limit] if limit else found
+
+    def delete_one(self, query):
+        self.round_trips += 1
+        found = self._match(query)[:1]
+        for document in found:
+            self.documents.remove(document)
+        return flexmock(deleted_count=len(found))
+
+
+class _ClientMock(dict):
+    def close(self):
+        pass
+
+
+class TestMongoDB:
+    @staticmethod
+    def _storage(**kwargs):
+        collection = _CollectionMock()
+        client = _ClientMock(db={'collection': collection})
+        flexmock(mongodb).should_receive('MongoClient').and_return(client)
+        storage = MongoDB('db', 'collection', **kwargs)
+        storage.connect()
+        return storage, collection
+
+    def test_indexes(self):
+        _, collection = self._storage(indexes=['flow_name', 'task_name'])
+
+        assert collection.indexes == [('task_id', True), ('flow_name', False), ('task_name', False)]
+
+    def test_no_indexes(self):
+        _, collection = self._storage(create_indexes=False)
+
+        assert collection.indexes == []
+
+    def test_unknown_index(self):
+        with pytest.raises(ValueError):
+            MongoDB('db', 'collection', indexes=['result'])
+
+    def test_retrieve(self):
+        storage, collection = self._storage()
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        collection.round_trips = 0
+
+        assert storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+        assert collection.round_trips == 1
+
+        with pytest.raises(FileNotFoundError):
+            storage.retrieve('flow1', 'Task1', '<id2>')
+
+    def test_retrieve_duplicates(self):
+        storage, _ = self._storage(create_indexes=False)
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        with pytest.raises(ValueError):
+            storage.retrieve('flow1', 'Task1', '<id1>')
+
+    def test_delete(self):
+        storage, collection = self._storage()
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        collection.round_trips = 0
+
+        storage.delete('flow1', 'Task1', '<id1>')
+        assert collection.round_trips == 1
+
+        with pytest.raises(SelinonMissingDataException):
+            storage.delete('flow1', 'Task1', '<id1>')
+
+    def test_delete_duplicates(self):
+        storage, collection = self._storage(create_indexes=False)
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        with pytest.raises(ValueError):
+            storage.delete('flow1', 'Task1', '<id1>')
+        assert len(collection.documents) == 2
+
+    def test_bulk(self):
+        storage, collection = self._storage()
+        records = [(None, '<id{}>'.format(idx), {'foo': idx}) for idx in range(3)]
+
+        storage.store_many('flow1', 'Task1', records)
+        assert storage.retrieve_many('flow1', 'Task1', ['<id2>', '<id0>']) == [{'foo': 2}, {'foo': 0}]
+        assert collection.round_trips == 2
+
+    def test_connect_duplicates(self):
+        storage, collection = self._storage(create_indexes=False)
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        storage.create_indexes = True
+        with pytest.raises(ValueError):
+            storage.connect()
+        assert collection.indexes == []
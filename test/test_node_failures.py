@@ -30,7 +30,7 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {}, 'fallback': []}}
+            'flow1': {frozenset(('Task1',)): {'fallback': []}}
         }
         self.init(edge_table, failures=failures)
 
@@ -73,10 +73,10 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {}, 'fallback': [True],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']
-                                }}
+            'flow1': {frozenset(('Task1',)): {'fallback': [True],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']
+                                             }}
 
         }
         self.init(edge_table, failures=failures)
@@ -126,10 +126,10 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': ['Task3'], 'to': ['Task4'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {}, 'fallback': [['Task3']],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']
-                                }}
+            'flow1': {frozenset(('Task1',)): {'fallback': [['Task3']],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']
+                                             }}
 
         }
         self.init(edge_table, failures=failures)
@@ -190,10 +190,10 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': ['Task4'], 'to': ['Task6'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {}, 'fallback': [['Task3', 'Task4']],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']
-                                }}
+            'flow1': {frozenset(('Task1',)): {'fallback': [['Task3', 'Task4']],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']
+                                             }}
 
         }
         self.init(edge_table, failures=failures)
@@ -288,10 +288,10 @@ class TestNodeFailures(SelinonTestCase):
             'flow2': [{'from': [], 'to': ['Task3'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {}, 'fallback': [['flow2']],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']
-                                }}
+            'flow1': {frozenset(('Task1',)): {'fallback': [['flow2']],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']
+                                             }}
         }
         self.init(edge_table, failures=failures)
 
@@ -342,10 +342,10 @@ class TestNodeFailures(SelinonTestCase):
             'flow2': []
         }
         failures = {
-            'flow1': {'flow2': {'next:': {}, 'fallback': [['Task2']],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']
-                                }}
+            'flow1': {frozenset(('flow2',)): {'fallback': [['Task2']],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']
+                                             }}
         }
         self.init(edge_table, failures=failures)
 
@@ -394,8 +394,9 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}],
         }
         failures = {
-            'flow1': {'Task1': {'next': {'Task2': {'next': {}, 'fallback': []}}, 'fallback': []},
-                      'Task2': {'next': {'Task1': {'next': {}, 'fallback': []}}, 'fallback': []}
+            'flow1': {frozenset(('Task1',)): {'fallback': []},
+                      frozenset(('Task2',)): {'fallback': []},
+                      frozenset(('Task1', 'Task2')): {'fallback': []}
                      }
         }
         self.init(edge_table, failures=failures)
@@ -480,18 +481,11 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}],
         }
         failures = {
-            'flow1': {'Task1': {'next': {'Task2': {'next': {},
-                                                   'fallback': [['Task5']],
-                                                   'conditions': [self.cond_true],
-                                                   'condition_strs': ['cond_true'],
-                                                   }},
-                                'fallback': []},
-                      'Task2': {'next': {'Task1': {'next': {},
-                                                   'fallback': [['Task5']],
-                                                   'conditions': [self.cond_true],
-                                                   'condition_strs': ['cond_true'],
-                                                   }},
-                                'fallback': []}
+            'flow1': {frozenset(('Task1',)): {'fallback': []},
+                      frozenset(('Task2',)): {'fallback': []},
+                      frozenset(('Task1', 'Task2')): {'fallback': [['Task5']],
+                                                      'conditions': [self.cond_true],
+                                                      'condition_strs': ['cond_true']}
                       }
         }
         self.init(edge_table, failures=failures)
@@ -573,8 +567,9 @@ class TestNodeFailures(SelinonTestCase):
                       {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}],
         }
         failures = {
-            'flow1': {'Task1': {'next': {'Task2': {'next': {}, 'fallback': []}}, 'fallback': []},
-                      'Task2': {'next': {'Task1': {'next': {}, 'fallback': []}}, 'fallback': []}
+            'flow1': {frozenset(('Task1',)): {'fallback': []},
+                      frozenset(('Task2',)): {'fallback': []},
+                      frozenset(('Task1', 'Task2')): {'fallback': []}
                       }
         }
         self.init(edge_table, failures=failures)
@@ -694,27 +689,12 @@ class TestNodeFailures(SelinonTestCase):
         }
         failures = {
             'flow1': {
-                'Task2_f1': {
-                    'next': {
-                        'flow2': {
-                            'next': {
-                                'flow4': {
-                                    'next': {},
-                                    'fallback': [['TaskX']],
-                                    'conditions': [self.cond_true],
-                                    'condition_strs': ['cond_true']
-                                },
-                                'fallback': []
-                            },
-                            'fallback': []
-                        },
-                        'fallback': []
-                    },
-                    'fallback': []
-                },
-                'fallback': []
-            },
-            'fallback': []
+                frozenset(('Task2_f1', 'flow2', 'flow4')): {
+                    'fallback': [['TaskX']],
+                    'conditions': [self.cond_true],
+                    'condition_strs': ['cond_true']
+                }
+            }
         }
         self.init(edge_table, failures=failures, propagate_parent=dict.fromkeys(edge_table, True))
 
@@ -908,8 +888,8 @@ class TestNodeFailures(SelinonTestCase):
         edge_table = {'flow1': [{'from': [], 'to': ['flow2'], 'condition': self.cond_true}],
                       'flow2': []}  # flow2 handled manually
         failures = {
-            'flow1': {'flow2': {'next': {}, 'fallback': [True], 'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']}},
+            'flow1': {frozenset(('flow2',)): {'fallback': [True], 'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']}},
             'flow2': {}
         }
         self.init(edge_table, failures=failures)
@@ -941,10 +921,10 @@ class TestNodeFailures(SelinonTestCase):
         #  flow1 will have three tasks, Task1 will be instantiated twice. We will provide fallback for Task1
         edge_table = {'flow1': [{'from': [], 'to': ['Task0', 'Task1'], 'condition': self.cond_true}]}
         failures = {
-            'flow1': {'Task1': {'next': {}, 'fallback': [True],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['cond_true']
-                                }},
+            'flow1': {frozenset(('Task1',)): {'fallback': [True],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['cond_true']
+                                             }},
         }
         self.init(edge_table, failures=failures)
 
@@ -1039,3 +1019,41 @@ class TestNodeFailures(SelinonTestCase):
         assert {node['name'] for node in reported_state['active_nodes']} == {'Task3'}
         assert set(reported_state['finished_nodes'].keys()) == {'Task1'}
         assert set(reported_state['failed_nodes'].keys()) == {'Task2'}
+
+    def test_largest_failure_first(self):
+        #
+        # flow1:
+        #
+        #    Task1 X     Task2 X     Task3 X
+        #
+        # Note:
+        #   All tasks fail, the failure covering all of them takes precedence over the smaller one
+        #
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1', 'Task2', 'Task3'], 'condition': self.cond_true}]
+        }
+        failures = {
+            'flow1': {frozenset(('Task1', 'Task2')): {'fallback': [['Task4']],
+                                                      'conditions': [self.cond_true],
+                                                      'condition_strs': ['cond_true']},
+                      frozenset(('Task1', 'Task2', 'Task3')): {'fallback': [['Task5']],
+                                                               'conditions': [self.cond_true],
+                                                               'condition_strs': ['cond_true']}}
+        }
+        self.init(edge_table, failures=failures)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        for task_name in ('Task1', 'Task2', 'Task3'):
+            self.set_failed(self.get_task(task_name))
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        assert 'Task4' not in self.instantiated_tasks
+        assert 'Task5' in self.instantiated_tasks
+        assert state_dict['failed_nodes'] == {}
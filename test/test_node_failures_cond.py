@@ -30,10 +30,9 @@ class TestNodeFailuresCond(SelinonTestCase):
                       {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {},
-                                'fallback': [['Task2']],
-                                'conditions': [self.cond_false],
-                                'condition_strs': ['false']}}
+            'flow1': {frozenset(('Task1',)): {'fallback': [['Task2']],
+                                              'conditions': [self.cond_false],
+                                              'condition_strs': ['false']}}
         }
         self.init(edge_table, failures=failures)
 
@@ -77,10 +76,9 @@ class TestNodeFailuresCond(SelinonTestCase):
                       {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {},
-                                'fallback': [['Task3']],
-                                'conditions': [self.cond_true],
-                                'condition_strs': ['true']}}
+            'flow1': {frozenset(('Task1',)): {'fallback': [['Task3']],
+                                              'conditions': [self.cond_true],
+                                              'condition_strs': ['true']}}
         }
         self.init(edge_table, failures=failures)
 
@@ -124,10 +122,9 @@ class TestNodeFailuresCond(SelinonTestCase):
                       {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
         }
         failures = {
-            'flow1': {'Task1': {'next:': {},
-                                'fallback': [['Task3'], ['Task4', 'Task5'], ['Task6', 'Task7']],
-                                'conditions': [self.cond_true, self.cond_false, self.cond_true],
-                                'condition_strs': ['true', 'false', 'true']}}
+            'flow1': {frozenset(('Task1',)): {'fallback': [['Task3'], ['Task4', 'Task5'], ['Task6', 'Task7']],
+                                              'conditions': [self.cond_true, self.cond_false, self.cond_true],
+                                              'condition_strs': ['true', 'false', 'true']}}
         }
         self.init(edge_table, failures=failures)
 
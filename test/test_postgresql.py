@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import sqlalchemy
+from flexmock import flexmock
+
+from selinon.data_storage import SelinonMissingDataException
+from selinon.storages.postgresql import PostgreSQL
+from selinon.storages.postgresql import adapter
+
+
+class TestPostgreSQL:
+    @staticmethod
+    def _storage(tmpdir, **kwargs):
+        # result table is portable enough to be exercised on SQLite
+        engine = sqlalchemy.create_engine('sqlite:///' + str(tmpdir.join('results.db')))
+        flexmock(adapter).should_receive('create_engine').and_return(engine)
+        storage = PostgreSQL('postgresql://localhost/selinon', **kwargs)
+        storage.connect()
+        return storage
+
+    def test_engine_pool(self):
+        flexmock(adapter).should_receive('create_engine')\
+            .with_args('postgresql://localhost/selinon', echo=False, pool_size=8, max_overflow=0).once()
+
+        PostgreSQL('postgresql://localhost/selinon', pool_size=8, max_overflow=0)
+
+    def test_check_schema(self, tmpdir):
+        storage = self._storage(tmpdir)
+
+        indexes = {index['name'] for index in sqlalchemy.inspect(storage.engine).get_indexes('result')}
+        assert {'ix_result_flow_name', 'ix_result_task_name'} <= indexes
+
+    def test_skip_check_schema(self, tmpdir):
+        flexmock(adapter).should_receive('database_exists').never()
+        flexmock(adapter.Result.metadata).should_receive('create_all').never()
+
+        storage = self._storage(tmpdir, check_schema=False)
+        assert storage.is_connected()
+
+    def test_store_retrieve(self, tmpdir):
+        storage = self._storage(tmpdir)
+
+        first_id = storage.store(None, 'flow1', 'Task1', '<id0>', {'foo': 0})
+        ids = storage.store_many('flow1', 'Task1', [(None, '<id{}>'.format(idx), {'foo': idx}) for idx in (1, 2)])
+
+        assert ids == [first_id + 1, first_id + 2]
+        assert storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+        assert storage.retrieve_many('flow1', 'Task1', ['<id2>', '<id0>']) == [{'foo': 2}, {'foo': 0}]
+
+    def test_delete(self, tmpdir):
+        storage = self._storage(tmpdir)
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        storage.delete('flow1', 'Task1', '<id1>')
+
+        # deletion is committed
+        storage.disconnect()
+        storage.connect()
+        with pytest.raises(SelinonMissingDataException):
+            storage.delete('flow1', 'Task1', '<id1>')
+
+    def test_thread_sessions(self, tmpdir):
+        storage = self._storage(tmpdir)
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            sessions = executor.map(lambda _: id(storage.session()), range(2))
+        assert id(storage.session()) not in set(sessions)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon import SystemState
+from selinon.builtin_predicate import AndPredicate
+from selinon.builtin_predicate import NotPredicate
+from selinon.leaf_predicate import LeafPredicate
+from selinon.predicates import argsFieldExist
+from selinon.predicates import fieldExist
+from selinon.storages.memory import InMemoryStorage
+
+
+class TestPrefetch(SelinonTestCase):
+    def _init_storages(self, edge_table=None):
+        self.storage1 = InMemoryStorage()
+        self.storage2 = InMemoryStorage()
+        self.init(edge_table or {'flow1': []},
+                  storage_mapping={'Storage1': self.storage1, 'Storage2': self.storage2},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage2', 'Task3': 'Storage2'})
+
+    def test_prefetch(self):
+        self._init_storages()
+        self.storage1.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        self.storage2.store(None, 'flow1', 'Task2', '<id2>', {'foo': 2})
+        self.storage2.store(None, 'flow1', 'Task3', '<id3>', {'foo': 3})
+        # one retrieval per storage
+        flexmock(StoragePool).should_call('_prefetch_from_storage').twice()
+
+        prefetched = StoragePool.prefetch('flow1', [('Task1', '<id1>'), ('Task2', '<id2>'), ('Task3', '<id3>')])
+
+        assert prefetched == {('Task1', '<id1>'): {'foo': 1},
+                              ('Task2', '<id2>'): {'foo': 2},
+                              ('Task3', '<id3>'): {'foo': 3}}
+
+    def test_prefetch_failure(self):
+        self._init_storages()
+        self.storage1.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        # the result of Task2 is not available, it will be retrieved once needed
+        prefetched = StoragePool.prefetch('flow1', [('Task1', '<id1>'), ('Task2', '<id2>')])
+
+        assert prefetched == {('Task1', '<id1>'): {'foo': 1}}
+
+    def test_get_prefetched(self):
+        self._init_storages()
+        flexmock(StoragePool).should_receive('retrieve').never()
+
+        storage_pool = StoragePool({'Task1': '<id1>'}, 'flow1', {('Task1', '<id1>'): {'foo': 1}})
+
+        assert storage_pool.get('Task1') == {'foo': 1}
+
+    def test_edge_prefetch(self):
+        #
+        # flow1:
+        #
+        #     Task1    Task2
+        #       |        |
+        #        --------
+        #           |
+        #         Task3
+        #
+        def _cond(db, node_args):
+            return db.get('Task1') == db.get('Task2')
+
+        edge_table = {
+            'flow1': [{'from': ['Task1', 'Task2'], 'to': ['Task3'], 'condition': _cond,
+                       'inspects': ['Task1', 'Task2']},
+                      {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}]
+        }
+        self._init_storages(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        task1 = self.get_task('Task1')
+        task2 = self.get_task('Task2')
+        self.set_finished(task1)
+        self.set_finished(task2)
+        self.storage1.store(None, 'flow1', 'Task1', task1.task_id, {'foo': 'bar'})
+        self.storage2.store(None, 'flow1', 'Task2', task2.task_id, {'foo': 'bar'})
+
+        flexmock(StoragePool).should_call('prefetch').\
+            with_args('flow1', {('Task1', task1.task_id): None, ('Task2', task2.task_id): None}).\
+            once()
+        # results are stored in different storages
+        flexmock(StoragePool).should_call('retrieve_many').twice()
+        flexmock(StoragePool).should_receive('retrieve').never()
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+
+        assert 'Task3' in self.instantiated_tasks
+
+    def test_edge_single_result(self):
+        def _cond(db, node_args):
+            return db.get('Task1') is not None
+
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': _cond, 'inspects': ['Task1']},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self._init_storages(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        task1 = self.get_task('Task1')
+        self.set_finished(task1)
+        self.storage1.store(None, 'flow1', 'Task1', task1.task_id, {'foo': 'bar'})
+
+        # nothing to gain from prefetching a single result
+        flexmock(StoragePool).should_receive('prefetch').never()
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+
+        assert 'Task2' in self.instantiated_tasks
+
+    def test_nodes_inspected(self):
+        task1 = flexmock(name='Task1', storage='Storage1')
+        task2 = flexmock(name='Task2', storage='Storage1')
+        flow = flexmock(name='flow1')
+
+        predicate = AndPredicate([LeafPredicate(fieldExist, task1, flow, {'key': 'foo'}),
+                                  NotPredicate(LeafPredicate(argsFieldExist, task2, flow, {'key': 'foo'}))])
+
+        assert predicate.nodes_inspected() == [task1]
+        assert predicate.nodes_used() == [task1, task2]
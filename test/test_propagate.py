@@ -5,6 +5,7 @@
 # This file is part of Selinon project.
 # ######################################################################
 
+from flexmock import flexmock
 from selinon_test_case import SelinonTestCase
 from selinon import SystemState, Dispatcher, Config
 
@@ -451,3 +452,98 @@ class TestPropagate(SelinonTestCase):
         assert set(task_x.parent['flow2']['flow4']) == set(task_x_parent['flow2']['flow4'])
 
 
+
+    def test_propagate_nested_finished_published(self):
+        #
+        # flow1:
+        #
+        #     Task1       Task2
+        #       |           |
+        #     flow2         |
+        #       |           |
+        #        -----------
+        #             |
+        #           TaskX
+        #
+        # flow2:
+        #    Run explicitly, result carries precomputed nested finished nodes so flow3 is never inspected
+        #
+        edge_table = {
+            'flow1': [{'from': ['flow2', 'Task2'], 'to': ['TaskX'], 'condition': self.cond_true},
+                      {'from': ['Task1'], 'to': ['flow2'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}],
+            'flow2': [],
+            'flow3': []
+        }
+        self.init(edge_table, propagate_parent={'flow1': True}, propagate_finished={'flow1': True})
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        self.set_finished(self.get_task('Task1'), None)
+        self.set_finished(self.get_task('Task2'), None)
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        nested_finished_nodes = {'Task2': ['<task2-id1>'], 'flow3': {'Task4': ['<task4-id1>']}}
+        self.set_finished(self.get_flow('flow2'), {'finished_nodes': {'Task2': ['<task2-id1>'],
+                                                                      'flow3': ['<flow3-id>']},
+                                                   'nested_finished_nodes': nested_finished_nodes,
+                                                   'failed_nodes': {}})
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        inspected = []
+        get_async_result = system_state._get_async_result
+        flexmock(system_state).should_receive('_get_async_result').\
+            replace_with(lambda node_name, node_id, meta=None:
+                         inspected.append(node_name) or get_async_result(node_name, node_id, meta))
+        system_state.update()
+
+        assert 'flow3' not in inspected
+
+        assert self.get_task('TaskX').parent == {'Task2': self.get_task('Task2').task_id,
+                                                 'flow2': nested_finished_nodes}
+
+    def test_nested_finished_nodes(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1', 'flow2'], 'condition': self.cond_true}],
+            'flow2': [],
+            'flow3': []
+        }
+        self.init(edge_table, propagate_finished={'flow1': True})
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+
+        flow3 = Dispatcher().apply_async(kwargs={'flow_name': 'flow3'}, queue=Config.dispatcher_queues['flow3'])
+        self.get_task_instance.register_node(flow3)
+        self.set_finished(flow3, {'finished_nodes': {'Task2': ['<task2-id2>']}, 'failed_nodes': {}})
+        self.set_finished(self.get_flow('flow2'), {'finished_nodes': {'Task2': ['<task2-id1>'],
+                                                                      'flow3': [flow3.task_id]},
+                                                   'failed_nodes': {}})
+        self.set_finished(self.get_task('Task1'), None)
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+
+        assert system_state.nested_finished_nodes() == {
+            'Task1': [self.get_task('Task1').task_id],
+            'flow2': {'Task2': ['<task2-id1>'], 'flow3': {'Task2': ['<task2-id2>']}}
+        }
+
+    def test_nested_finished_nodes_not_propagated(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['flow2'], 'condition': self.cond_true}],
+            'flow2': []
+        }
+        self.init(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        self.set_finished(self.get_flow('flow2'), {'finished_nodes': {}, 'failed_nodes': {}})
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+
+        assert system_state.nested_finished_nodes() is None
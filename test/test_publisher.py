@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import contextlib
+from selinon_test_case import SelinonTestCase
+
+from celery import Task
+from selinon import Config
+from selinon import SystemState
+from selinon.task_envelope import SelinonTaskEnvelope
+
+_FOREACH_COUNT = 20
+
+
+class _CeleryAppMock:
+    """Mock of Celery application with producer pool."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.released = 0
+
+    @contextlib.contextmanager
+    def producer_or_acquire(self):
+        self.acquired += 1
+        yield '<producer>'
+        self.released += 1
+
+
+class TestPublisher(SelinonTestCase):
+    def teardown_method(self, method):
+        super().teardown_method(method)
+        Config.celery_app = None
+
+    def _init_foreach(self):
+        #
+        # flow1:
+        #
+        #       |      |             |
+        #     Task1  Task1   ...   Task1
+        #
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true,
+                       'foreach': lambda x, y: range(_FOREACH_COUNT), 'foreach_propagate_result': False}]
+        }
+        self.init(edge_table)
+
+    def test_shared_producer(self):
+        self._init_foreach()
+        Config.celery_app = _CeleryAppMock()
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+
+        tasks = self.get_all_tasks('Task1')
+        assert len(tasks) == _FOREACH_COUNT
+        assert all(task.producer == '<producer>' for task in tasks)
+        assert Config.celery_app.acquired == 1
+        assert Config.celery_app.released == 1
+
+    def test_no_producer_pool(self):
+        self._init_foreach()
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+
+        tasks = self.get_all_tasks('Task1')
+        assert len(tasks) == _FOREACH_COUNT
+        assert all(task.producer is None for task in tasks)
+
+    def test_fallback(self, monkeypatch):
+        def apply_async(task, kwargs, queue, countdown=None, task_id=None, producer=None):
+            if producer is not None:
+                raise ConnectionError()
+            task_ids.append(task_id)
+            return Task.apply_async(task, kwargs, queue, countdown=countdown, task_id=task_id)
+
+        task_ids = []
+        self._init_foreach()
+        Config.celery_app = _CeleryAppMock()
+        monkeypatch.setattr(SelinonTaskEnvelope, 'apply_async', apply_async)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+
+        assert len(self.get_all_tasks('Task1')) == _FOREACH_COUNT
+        assert Config.celery_app.released == 1
+        # the first message keeps its id on fallback, others are published without the shared producer
+        assert task_ids[0] is not None
+        assert task_ids[1:] == [None] * (_FOREACH_COUNT - 1)
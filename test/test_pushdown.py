@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon import SystemState
+from selinon.errors import StorageError
+from selinon.predicates import fieldEqual
+from selinon.predicates import fieldExist
+from selinon.storages.memory import InMemoryStorage
+
+
+class _PushdownStorage(InMemoryStorage):
+    PUSHDOWN_PREDICATES = frozenset(('fieldEqual',))
+
+    def evaluate(self, flow_name, task_name, task_id, predicate_name, args):
+        if args.get('value') == 'unsupported':
+            raise NotImplementedError()
+        return fieldEqual(self.database[task_id]['result'], **args)
+
+
+class TestPushdown(SelinonTestCase):
+    def _init_storages(self, edge_table=None):
+        self.storage1 = _PushdownStorage()
+        self.storage2 = InMemoryStorage()
+        self.init(edge_table or {'flow1': []},
+                  storage_mapping={'Storage1': self.storage1, 'Storage2': self.storage2},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage2', 'Task3': 'Storage2'})
+        self.storage1.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+    def test_evaluate(self):
+        self._init_storages()
+        flexmock(StoragePool).should_receive('retrieve').never()
+        flexmock(self.storage1).should_call('evaluate').\
+            with_args('flow1', 'Task1', '<id1>', 'fieldEqual', {'key': ['foo'], 'value': 1}).\
+            once()
+
+        assert StoragePool({'Task1': '<id1>'}, 'flow1').evaluate('Task1', fieldEqual, key='foo', value=1) is True
+
+    @pytest.mark.parametrize('predicate,args,expected', (
+        (fieldExist, {'key': 'foo'}, True),
+        (fieldEqual, {'key': 'foo', 'value': 'unsupported'}, False)
+    ))
+    def test_evaluate_unsupported(self, predicate, args, expected):
+        self._init_storages()
+        flexmock(StoragePool).should_call('retrieve').once()
+
+        assert StoragePool({'Task1': '<id1>'}, 'flow1').evaluate('Task1', predicate, **args) is expected
+
+    def test_evaluate_prefetched(self):
+        self._init_storages()
+        flexmock(self.storage1).should_receive('evaluate').never()
+
+        storage_pool = StoragePool({'Task1': '<id1>'}, 'flow1', {('Task1', '<id1>'): {'foo': 2}})
+
+        assert storage_pool.evaluate('Task1', fieldEqual, key='foo', value=2) is True
+
+    def test_evaluate_error(self):
+        self._init_storages()
+        flexmock(self.storage1).should_receive('evaluate').and_raise(ConnectionError)
+
+        with pytest.raises(StorageError):
+            StoragePool({'Task1': '<id1>'}, 'flow1').evaluate('Task1', fieldEqual, key='foo', value=1)
+
+    def test_supports_pushdown(self):
+        self._init_storages()
+
+        assert StoragePool.supports_pushdown('Task1', ['fieldEqual']) is True
+        assert StoragePool.supports_pushdown('Task1', ['fieldEqual', 'fieldExist']) is False
+        assert StoragePool.supports_pushdown('Task2', ['fieldEqual']) is False
+
+    def test_prefetch_pushdown(self):
+        def _cond(db, node_args):
+            return db.evaluate('Task1', fieldEqual, key='foo', value='bar') and db.get('Task2') == db.get('Task3')
+
+        edge_table = {
+            'flow1': [{'from': ['Task1', 'Task2', 'Task3'], 'to': ['Task4'], 'condition': _cond,
+                       'inspects': ['Task1', 'Task2', 'Task3'], 'pushdown': {'Task1': ['fieldEqual']}},
+                      {'from': [], 'to': ['Task1', 'Task2', 'Task3'], 'condition': self.cond_true}]
+        }
+        self._init_storages(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        task1 = self.get_task('Task1')
+        task2 = self.get_task('Task2')
+        task3 = self.get_task('Task3')
+        for task in (task1, task2, task3):
+            self.set_finished(task)
+        self.storage1.store(None, 'flow1', 'Task1', task1.task_id, {'foo': 'bar'})
+        self.storage2.store(None, 'flow1', 'Task2', task2.task_id, {'foo': 'bar'})
+        self.storage2.store(None, 'flow1', 'Task3', task3.task_id, {'foo': 'bar'})
+
+        # the result of Task1 is inspected only by the storage
+        flexmock(StoragePool).should_call('prefetch').\
+            with_args('flow1', {('Task2', task2.task_id): None, ('Task3', task3.task_id): None}).\
+            once()
+        flexmock(self.storage1).should_receive('retrieve').never()
+
+        system_state = SystemState(id(self), 'flow1', state=system_state.to_dict())
+        system_state.update()
+
+        assert 'Task4' in self.instantiated_tasks
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+import redis
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon.data_storage import SelinonMissingDataException
+from selinon.storages.memory import InMemoryStorage
+from selinon.storages.redis import Redis
+
+
+@pytest.fixture
+def connect():
+    """Connect Redis storage adapter to an in-process Redis server with Lua scripting."""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    server = fakeredis.FakeServer()
+
+    def connect_storage(**kwargs):
+        flexmock(redis).should_receive('Redis').replace_with(lambda **_: fakeredis.FakeRedis(server=server))
+        storage = Redis(**kwargs)
+        storage.connect()
+        return storage
+
+    return connect_storage
+
+
+class TestRedis:
+    def test_ttl(self, connect):
+        storage = connect(ttl=60, task_ttl={'Task1': 10})
+
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        storage.store_many('flow1', 'Task2', [(None, '<id2>', {'foo': 2}), (None, '<id3>', {'foo': 3})])
+
+        assert [storage.conn.ttl(task_id) for task_id in ('<id1>', '<id2>', '<id3>')] == [10, 60, 60]
+        assert storage.retrieve_many('flow1', 'Task2', ['<id3>', '<id2>']) == [{'foo': 3}, {'foo': 2}]
+
+    def test_no_ttl(self, connect):
+        storage = connect()
+
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        assert storage.conn.ttl('<id1>') == -1
+        assert storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+
+    def test_hash_layout(self, connect):
+        storage = connect(layout='hash')
+
+        storage.store_many('flow1', 'Task1', [(None, '<id1>', {'foo': 1}), (None, '<id2>', {'foo': 2})],
+                           dispatcher_id='<dispatcher1>')
+        storage.store(None, 'flow1', 'Task1', '<id3>', {'foo': 3}, dispatcher_id='<dispatcher2>')
+
+        # results are retrieved by task id regardless of the flow run
+        assert storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+        assert storage.retrieve_many('flow1', 'Task1', ['<id3>', '<id1>']) == [{'foo': 3}, {'foo': 1}]
+        assert storage.retrieve_flow('flow1', '<dispatcher1>') == {'<id1>': {'foo': 1}, '<id2>': {'foo': 2}}
+
+        storage.delete('flow1', 'Task1', '<id1>')
+        with pytest.raises(FileNotFoundError):
+            storage.retrieve('flow1', 'Task1', '<id1>')
+        with pytest.raises(SelinonMissingDataException):
+            storage.delete('flow1', 'Task1', '<id1>')
+
+        # other runs of the flow are not affected
+        storage.delete_flow('flow1', '<dispatcher1>')
+        with pytest.raises(FileNotFoundError):
+            storage.retrieve('flow1', 'Task1', '<id2>')
+        with pytest.raises(SelinonMissingDataException):
+            storage.delete_flow('flow1', '<dispatcher1>')
+        assert storage.retrieve('flow1', 'Task1', '<id3>') == {'foo': 3}
+
+    def test_hash_layout_ttl(self, connect):
+        storage = connect(layout='hash', ttl=60, task_ttl={'Task1': 600, 'Task2': 10})
+        flow_key = storage._flow_key('flow1', '<dispatcher1>')
+
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1}, dispatcher_id='<dispatcher1>')
+        storage.store(None, 'flow1', 'Task2', '<id2>', {'foo': 2}, dispatcher_id='<dispatcher1>')
+
+        # a result with shorter expiration does not shorten expiration of results stored earlier
+        assert 590 < storage.conn.ttl(flow_key) <= 600
+        assert storage.conn.ttl(storage._task_key('<id2>')) == 10
+        assert storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+
+        storage.expire_flow('flow1', '<dispatcher1>', 5)
+        assert storage.conn.ttl(flow_key) == 5
+        assert storage.conn.ttl(storage._task_key('<id1>')) == 5
+
+    def test_hash_layout_no_ttl(self, connect):
+        storage = connect(layout='hash', task_ttl={'Task2': 10})
+        flow_key = storage._flow_key('flow1', '<dispatcher1>')
+
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1}, dispatcher_id='<dispatcher1>')
+        storage.store(None, 'flow1', 'Task2', '<id2>', {'foo': 2}, dispatcher_id='<dispatcher1>')
+
+        # results that do not expire keep the whole flow run
+        assert storage.conn.ttl(flow_key) == -1
+
+    def test_flow_operations_key_layout(self, connect):
+        storage = connect()
+
+        with pytest.raises(ValueError):
+            storage.retrieve_flow('flow1', '<dispatcher1>')
+
+    def test_unknown_layout(self):
+        with pytest.raises(ValueError):
+            Redis(layout='list')
+
+    def test_connection_pool(self):
+        storage = Redis(max_connections=4, pool_timeout=1)
+        storage.connect()
+
+        # no connection is made until the first command
+        assert isinstance(storage.conn.connection_pool, redis.BlockingConnectionPool)
+        assert storage.conn.connection_pool.max_connections == 4
+        assert storage.conn.connection_pool.timeout == 1
+
+        storage.disconnect()
+        assert not storage.is_connected()
+
+
+class TestRedisStoragePool(SelinonTestCase):
+    def test_set_dispatcher_id(self, connect):
+        storage = connect(layout='hash')
+        self.init({'flow1': []},
+                  storage_mapping={'Storage1': storage, 'Storage2': InMemoryStorage()},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage2'})
+
+        StoragePool.set(None, 'flow1', 'Task1', '<id1>', {'foo': 1}, dispatcher_id='<dispatcher1>')
+        StoragePool.set_many('flow1', 'Task1', [(None, '<id2>', {'foo': 2})], dispatcher_id='<dispatcher1>')
+        # storages that do not distinguish flow runs are not given dispatcher id
+        StoragePool.set(None, 'flow1', 'Task2', '<id3>', {'foo': 3}, dispatcher_id='<dispatcher1>')
+
+        assert storage.retrieve_flow('flow1', '<dispatcher1>') == {'<id1>': {'foo': 1}, '<id2>': {'foo': 2}}
+        assert StoragePool.retrieve('flow1', 'Task2', '<id3>') == {'foo': 3}
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import json
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from celery.result import AsyncResult
+from selinon import Config
+from selinon.celery import KeyValueStoreBackend
+from selinon import SystemState
+from selinon.result_backend import ResultBackend
+
+
+class _KeyValueBackendMock:
+    """Mock of Celery's key-value result backend."""
+
+    def __init__(self, metas=None):
+        self.metas = metas or {}
+        self.mget_calls = []
+
+    @staticmethod
+    def get_key_for_task(task_id):
+        return 'celery-task-meta-%s' % task_id
+
+    def mget(self, keys):
+        self.mget_calls.append(keys)
+        return [self.metas.get(key) for key in keys]
+
+    @staticmethod
+    def decode_result(value):
+        return json.loads(value)
+
+
+class _NoMgetBackendMock(KeyValueStoreBackend):
+    """Mock of Celery's key-value result backend without mget support (e.g. S3 result backend)."""
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        pass
+
+    @staticmethod
+    def get_key_for_task(task_id):
+        return 'celery-task-meta-%s' % task_id
+
+    @staticmethod
+    def decode_result(value):
+        return json.loads(value)
+
+
+class TestResultBackend(SelinonTestCase):
+    def teardown_method(self, method):
+        super().teardown_method(method)
+        Config.celery_app = None
+
+    def test_no_bulk_support(self):
+        assert ResultBackend.get_metas(['<id1>']) is None
+
+        Config.celery_app = flexmock(backend=object())
+        assert ResultBackend.get_metas(['<id1>']) is None
+
+    def test_no_mget_support(self):
+        Config.celery_app = flexmock(backend=_NoMgetBackendMock())
+        # states are retrieved one by one without reporting a result backend issue
+        assert ResultBackend.get_metas(['<id1>']) is None
+
+    def test_key_value_get_metas(self):
+        backend = _KeyValueBackendMock({
+            'celery-task-meta-<id1>': json.dumps({'status': 'SUCCESS', 'result': None})
+        })
+        Config.celery_app = flexmock(backend=backend)
+
+        metas = ResultBackend.get_metas(['<id1>', '<id2>'])
+
+        assert backend.mget_calls == [['celery-task-meta-<id1>', 'celery-task-meta-<id2>']]
+        assert ResultBackend.is_finished(metas['<id1>']) is True
+        assert ResultBackend.is_finished(metas['<id2>']) is False
+
+    def test_running_nodes_not_queried(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #       |
+        #       |
+        #     Task2
+        #
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        task1 = self.get_task('Task1')
+
+        backend = _KeyValueBackendMock({
+            'celery-task-meta-%s' % task1.task_id: json.dumps({'status': 'STARTED', 'result': None})
+        })
+        Config.celery_app = flexmock(backend=backend)
+        flexmock(AsyncResult).should_receive('successful').never()
+        flexmock(AsyncResult).should_receive('failed').never()
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict, node_args=system_state.node_args)
+        retry = system_state.update()
+
+        assert retry is not None
+        assert len(backend.mget_calls) == 1
+        assert 'Task2' not in self.instantiated_tasks
+
+    def test_bulk_failure_fallback(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #       |
+        #       |
+        #     Task2
+        #
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        task1 = self.get_task('Task1')
+        self.set_finished(task1, 1)
+
+        backend = _KeyValueBackendMock()
+        flexmock(backend).should_receive('mget').and_raise(ConnectionError)
+        Config.celery_app = flexmock(backend=backend)
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict, node_args=system_state.node_args)
+        retry = system_state.update()
+
+        assert retry is not None
+        assert 'Task2' in self.instantiated_tasks
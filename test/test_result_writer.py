@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from concurrent.futures import Future
+import os
+import queue
+import threading
+
+import pytest
+from flexmock import flexmock
+from request_mock import RequestMock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon.result_writer import ResultWriter
+from selinon.storages.memory import InMemoryStorage
+from selinon.task_envelope import SelinonTaskEnvelope
+from selinon.trace import Trace
+
+
+class TestResultWriter(SelinonTestCase):
+    def _init_storages(self, **kwargs):
+        self.storage = InMemoryStorage()
+        self.init({'flow1': []},
+                  storage_mapping={'Storage1': self.storage},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage1'},
+                  **kwargs)
+
+    def teardown_method(self):
+        # start a new writer for the next test
+        ResultWriter._pid = None
+
+    def test_set(self):
+        self._init_storages()
+
+        assert ResultWriter.set(None, 'flow1', 'Task1', '<id1>', {'foo': 1}) == '<id1>'
+        assert self.storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+
+    def test_set_many(self):
+        self._init_storages()
+        records = [(None, '<id1>', {'foo': 1}), (None, '<id2>', {'foo': 2})]
+
+        assert ResultWriter.set_many('flow1', 'Task1', records) == ['<id1>', '<id2>']
+        assert self.storage.retrieve('flow1', 'Task1', '<id2>') == {'foo': 2}
+
+    def test_set_many_timeout(self):
+        self._init_storages(write_behind_timeout=0.1)
+        # the writer is not running, nothing consumes the buffer
+        ResultWriter._queue = queue.Queue(maxsize=1)
+        ResultWriter._pid = os.getpid()
+        records = [(None, '<id1>', {'foo': 1}), (None, '<id2>', {'foo': 2})]
+        # results the writer did not store are stored in one storage operation
+        flexmock(self.storage).should_call('store_many').once()
+
+        assert ResultWriter.set_many('flow1', 'Task1', records) == ['<id1>', '<id2>']
+        assert self.storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+
+    def test_flush(self):
+        self._init_storages()
+        items = [('flow1', 'Task1', '<dispatcher-id>', (None, '<id1>', 1), Future()),
+                 ('flow1', 'Task2', '<dispatcher-id>', (None, '<id2>', 2), Future()),
+                 ('flow1', 'Task1', '<dispatcher-id>', (None, '<id3>', 3), Future())]
+        # one storage operation per task name
+        flexmock(self.storage).should_call('store_many').twice()
+
+        ResultWriter._flush(items)
+
+        assert [future.result() for _, _, _, _, future in items] == ['<id1>', '<id2>', '<id3>']
+
+    def test_set_error(self):
+        self._init_storages()
+        flexmock(self.storage).should_receive('store_many').and_raise(ConnectionError)
+
+        with pytest.raises(ConnectionError):
+            ResultWriter.set(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+    def test_flush_error(self):
+        self._init_storages()
+        items = [('flow1', 'Task1', None, (None, '<id1>', 1), Future()),
+                 ('flow1', 'Task1', None, (None, '<id2>', 2), Future()),
+                 ('flow1', 'Task2', None, (None, '<id3>', 3), Future())]
+        flexmock(self.storage).should_receive('store_many').and_return(['<id1>']).and_raise(ConnectionError)
+
+        ResultWriter._flush(items)
+
+        # a storage returning less result ids than stored results must not leave any task waiting
+        for _, _, _, _, future in items[:2]:
+            with pytest.raises(ValueError):
+                future.result(timeout=0)
+        with pytest.raises(ConnectionError):
+            items[2][4].result(timeout=0)
+
+    def test_writer_survives_error(self):
+        self._init_storages()
+        flush = ResultWriter._flush
+        calls = []
+
+        def flaky_flush(items):
+            calls.append(items)
+            if len(calls) == 1:
+                raise RuntimeError()
+            flush(items)
+
+        flexmock(ResultWriter).should_receive('_flush').replace_with(flaky_flush)
+
+        with pytest.raises(RuntimeError):
+            ResultWriter.set(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        assert ResultWriter.set(None, 'flow1', 'Task1', '<id2>', {'foo': 2}) == '<id2>'
+
+    def test_set_timeout(self):
+        self._init_storages(write_behind_timeout=0.1)
+        # the writer is not running, nothing consumes the buffer
+        ResultWriter._queue = queue.Queue(maxsize=1)
+        ResultWriter._pid = os.getpid()
+        events = []
+        flexmock(Trace).should_receive('log').replace_with(lambda event, *_: events.append(event))
+
+        assert ResultWriter.set(None, 'flow1', 'Task1', '<id1>', {'foo': 1}) == '<id1>'
+        # the buffer is full now
+        assert ResultWriter.set(None, 'flow1', 'Task1', '<id2>', {'foo': 2}) == '<id2>'
+        assert events.count(Trace.RESULT_WRITER_TIMEOUT) == 2
+
+        # the result whose task stopped waiting is not stored again by the writer
+        flexmock(self.storage).should_receive('store_many').never()
+        ResultWriter._flush([ResultWriter._queue.get_nowait()])
+        assert self.storage.retrieve('flow1', 'Task1', '<id1>') == {'foo': 1}
+
+    def test_backpressure(self):
+        self._init_storages()
+        buffer = queue.Queue(maxsize=1)
+        buffer.put('<pending>')
+        ResultWriter._queue = buffer
+        ResultWriter._pid = os.getpid()
+        flexmock(Trace).should_call('log').with_args(Trace.RESULT_WRITER_FULL, dict).once()
+
+        threading.Timer(0.1, buffer.get).start()
+        ResultWriter.submit(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+
+        assert buffer.get_nowait()[3] == (None, '<id1>', {'foo': 1})
+
+    def test_task_envelope(self):
+        def get_task_instance(**kwargs):
+            return flexmock(run=lambda node_args: {'foo': 1})
+
+        self._init_storages(get_task_instance=get_task_instance, write_behind={'Task1': True},
+                            storage_readonly={'Task1': False})
+        flexmock(StoragePool).should_receive('set').never()
+
+        task = SelinonTaskEnvelope()
+        task.request = RequestMock()
+        task.run('Task1', 'flow1', parent={}, node_args=None, dispatcher_id='<dispatcher-id>')
+
+        # the result is stored once the task finishes
+        assert self.storage.retrieve('flow1', 'Task1', task.request.id) == {'foo': 1}
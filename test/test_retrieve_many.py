@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import SelinonTask
+from selinon import StoragePool
+from selinon.caches import LRU
+from selinon.errors import StorageError
+from selinon.storages.filesystem import Filesystem
+from selinon.storages.memory import InMemoryStorage
+
+
+class _MyTask(SelinonTask):
+    def run(self, node_args):
+        pass
+
+
+class TestRetrieveMany(SelinonTestCase):
+    def _init_storages(self, cache=None):
+        self.storage = InMemoryStorage()
+        self.init({'flow1': []},
+                  storage_mapping={'Storage1': self.storage},
+                  task2storage_mapping={'Task1': 'Storage1'},
+                  storage2storage_cache={'Storage1': cache or LRU(max_cache_size=0)})
+        for idx in range(3):
+            self.storage.store(None, 'flow1', 'Task1', '<id{}>'.format(idx), {'foo': idx})
+
+    def test_retrieve_many(self):
+        self._init_storages()
+
+        assert self.storage.retrieve_many('flow1', 'Task1', ['<id2>', '<id0>']) == [{'foo': 2}, {'foo': 0}]
+        with pytest.raises(FileNotFoundError):
+            self.storage.retrieve_many('flow1', 'Task1', ['<id0>', '<id3>'])
+
+    def test_storage_pool_retrieve_many(self):
+        cache = LRU(max_cache_size=3)
+        self._init_storages(cache)
+        StoragePool.retrieve('flow1', 'Task1', '<id1>')
+
+        # only results that are not cached are retrieved, all of them at once
+        flexmock(self.storage).should_call('retrieve_many').with_args('flow1', 'Task1', ['<id0>', '<id2>']).once()
+        flexmock(self.storage).should_receive('retrieve').never()
+
+        assert StoragePool.retrieve_many('flow1', 'Task1', ['<id0>', '<id1>', '<id2>', '<id0>']) == \
+            [{'foo': 0}, {'foo': 1}, {'foo': 2}, {'foo': 0}]
+
+    def test_storage_pool_retrieve_many_error(self):
+        self._init_storages()
+
+        with pytest.raises(StorageError):
+            StoragePool.retrieve_many('flow1', 'Task1', ['<id0>', '<id3>'])
+
+    def test_prefetch_fallback(self):
+        self._init_storages()
+
+        # results that are available are prefetched even if some of them are missing
+        assert StoragePool.prefetch('flow1', [('Task1', '<id0>'), ('Task1', '<id3>')]) == \
+            {('Task1', '<id0>'): {'foo': 0}}
+
+    def test_parent_flow_results(self):
+        self._init_storages()
+        task = _MyTask(task_name='Task2', flow_name='flow2', parent={'flow1': {'Task1': ['<id0>', '<id2>']}},
+                       task_id='<id>', dispatcher_id='<dispatcher-id>')
+
+        assert task.parent_flow_results('flow1', 'Task1') == [{'foo': 0}, {'foo': 2}]
+
+    def test_filesystem(self, tmpdir):
+        storage = Filesystem(path=str(tmpdir), max_workers=2)
+        storage.connect()
+        records = [(None, '<id{}>'.format(idx), {'foo': idx}) for idx in range(5)]
+
+        assert len(storage.store_many('flow1', 'Task1', records)) == len(records)
+        assert storage.retrieve_many('flow1', 'Task1', ['<id4>', '<id1>']) == [{'foo': 4}, {'foo': 1}]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+
+from selinon import StoragePool
+from selinon.caches import LRU
+from selinon.single_flight import SingleFlight
+from selinon.storages.memory import InMemoryStorage
+
+
+class TestSingleFlight(SelinonTestCase):
+    def test_same_key(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(single_flight.do, 'key', fetch)
+            started.wait(5)
+            followers = [executor.submit(single_flight.do, 'key', fetch) for _ in range(3)]
+            release.set()
+
+            assert leader.result() == 42
+            assert [follower.result() for follower in followers] == [42, 42, 42]
+
+        # followers that arrived while the fetch was in flight did not fetch on their own
+        assert len(calls) <= 2
+        # once finished, the key is fetched again
+        assert single_flight.do('key', lambda: 43) == 43
+
+    def test_different_keys(self):
+        single_flight = SingleFlight()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fetch():
+            # both fetches have to be in flight at the same time to pass the barrier
+            barrier.wait()
+            return True
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(single_flight.do, key, fetch) for key in ('key1', 'key2')]
+            assert all(future.result() for future in futures)
+
+    def test_error(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            raise KeyError('key')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(single_flight.do, 'key', fetch)
+            started.wait(5)
+            follower = executor.submit(single_flight.do, 'key', fetch)
+            release.set()
+
+            with pytest.raises(KeyError):
+                leader.result()
+            with pytest.raises(KeyError):
+                follower.result()
+
+    def test_storage_pool_parallel_retrieve(self):
+        storage = InMemoryStorage()
+        self.init({'flow1': []},
+                  storage_mapping={'Storage1': storage},
+                  task2storage_mapping={'Task1': 'Storage1'},
+                  storage2storage_cache={'Storage1': LRU(max_cache_size=0)})
+        storage.store(None, 'flow1', 'Task1', '<id1>', {'foo': 1})
+        storage.store(None, 'flow1', 'Task1', '<id2>', {'foo': 2})
+        barrier = threading.Barrier(2, timeout=5)
+        retrieve = storage.retrieve
+
+        def parallel_retrieve(flow_name, task_name, task_id):
+            # retrievals of different results from a thread-safe storage are not serialized
+            barrier.wait()
+            return retrieve(flow_name, task_name, task_id)
+
+        flexmock(storage).should_receive('retrieve').replace_with(parallel_retrieve)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(StoragePool.retrieve, 'flow1', 'Task1', task_id)
+                       for task_id in ('<id1>', '<id2>')]
+            assert [future.result() for future in futures] == [{'foo': 1}, {'foo': 2}]
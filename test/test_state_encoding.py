@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import json
+import uuid
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+from request_mock import RequestMock
+
+from selinon import Dispatcher
+from selinon.errors import ConfigurationError
+from selinon.state_encoding import StateEncoding
+
+
+class TestStateEncoding(SelinonTestCase):
+    @staticmethod
+    def _get_state():
+        return {
+            'active_nodes': [{'name': 'Task3', 'id': str(uuid.uuid4())}, {'name': 'flow2', 'id': 'not-an-uuid'}],
+            'finished_nodes': {
+                'Task1': [str(uuid.uuid4()) for _ in range(100)],
+                'Task2': [42, -1]
+            },
+            'failed_nodes': {'Task4': [str(uuid.uuid4()).upper()]},
+            'waiting_edges': [7, 0, 3],
+            'triggered_edges': [1, 300]
+        }
+
+    @pytest.mark.parametrize('encoding', (StateEncoding.COMPACT, StateEncoding.COMPACT_ZLIB))
+    def test_encode_decode(self, encoding):
+        state = self._get_state()
+
+        encoded = StateEncoding.encode(state, encoding)
+
+        assert StateEncoding.is_encoded(encoded)
+        # encoded state has to be transferable in JSON messages
+        encoded = json.loads(json.dumps(encoded))
+        assert len(json.dumps(encoded)) < len(json.dumps(state))
+
+        decoded = StateEncoding.decode(encoded)
+        state['waiting_edges'].sort()
+        assert decoded == state
+
+    def test_json_passthrough(self):
+        state = self._get_state()
+
+        assert StateEncoding.encode(state, StateEncoding.JSON) is state
+        assert StateEncoding.decode(state) is state
+        assert StateEncoding.encode(None, StateEncoding.COMPACT) is None
+        assert StateEncoding.decode(None) is None
+
+    def test_unknown_version(self):
+        encoded = StateEncoding.encode(self._get_state(), StateEncoding.COMPACT)
+        encoded['version'] += 1
+
+        with pytest.raises(ValueError):
+            StateEncoding.decode(encoded)
+
+    def test_unknown_encoding(self):
+        with pytest.raises(ConfigurationError):
+            StateEncoding.check_encoding('msgpack')
+
+    def test_dispatcher_retry(self):
+        def my_retry(args, kwargs, countdown, queue):
+            assert StateEncoding.is_encoded(kwargs['state'])
+            retried_kwargs.update(kwargs)
+            raise RuntimeError()
+
+        retried_kwargs = {}
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, state_encoding={'flow1': StateEncoding.COMPACT_ZLIB})
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(RuntimeError):
+            dispatcher.run('flow1')
+
+        task1 = self.get_task('Task1')
+        self.set_finished(task1)
+
+        # a dispatcher run with encoded state continues where the previous one ended
+        with pytest.raises(RuntimeError):
+            dispatcher.run(**retried_kwargs)
+
+        assert 'Task2' in self.instantiated_tasks
+        assert StateEncoding.decode(retried_kwargs['state'])['finished_nodes'] == {'Task1': [task1.task_id]}
+
+    def test_dispatcher_old_state(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, state_encoding={'flow1': StateEncoding.COMPACT})
+        state = {'active_nodes': [], 'finished_nodes': {'Task1': ['<id>']}, 'failed_nodes': {},
+                 'waiting_edges': [], 'triggered_edges': [0]}
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+
+        assert dispatcher.run('flow1', state=state)['finished_nodes'] == {'Task1': ['<id>']}
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2018  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import json
+import pytest
+from flexmock import flexmock
+from key_value_backend_mock import KeyValueBackendMock
+from key_value_backend_mock import NoIncrBackendMock
+from selinon_test_case import SelinonTestCase
+from request_mock import RequestMock
+
+from selinon import Config
+from selinon import Dispatcher
+from selinon import SystemState
+from selinon.celery import Ignore
+from selinon.wakeup import Wakeup
+
+
+class TestWakeup(SelinonTestCase):
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.backend = KeyValueBackendMock()
+        Config.celery_app = flexmock(backend=self.backend)
+
+    def teardown_method(self, method):
+        super().teardown_method(method)
+        Config.celery_app = None
+
+    def test_claim(self):
+        assert Wakeup.claim('<id>', 1) is True
+        # the countdown retry or a duplicate wakeup for the same sequence is dropped
+        assert Wakeup.claim('<id>', 1) is False
+        assert Wakeup.claim('<id>', 2) is True
+
+    def test_disabled_without_key_value_backend(self):
+        self.init({'flow1': []}, eager_wakeup={'flow1': True})
+        assert Wakeup.is_enabled('flow1') is True
+
+        Config.celery_app = flexmock(backend=object())
+        assert Wakeup.is_enabled('flow1') is False
+        assert Wakeup.claim('<id>', 1) is True
+        assert Wakeup.claim('<id>', 1) is True
+
+    def test_disabled_without_incr(self):
+        self.init({'flow1': []}, eager_wakeup={'flow1': True})
+        backend = NoIncrBackendMock()
+        Config.celery_app = flexmock(backend=backend)
+
+        assert Wakeup.is_enabled('flow1') is False
+        assert Wakeup.claim('<id>', 1) is True
+        assert Wakeup.park('<id>', {'flow_name': 'flow1', 'wakeup_sequence': 1}, 'queue_flow1') is False
+        Wakeup.notify('<id>')
+        assert backend.data == {}
+
+    def test_notify_merge(self):
+        kwargs = {'flow_name': 'flow1', 'wakeup_sequence': 1}
+        assert Wakeup.park('<id>', kwargs, 'queue_flow1') is False
+
+        flexmock(Dispatcher).should_receive('apply_async').\
+            with_args(kwargs=kwargs, queue='queue_flow1', task_id='<id>').\
+            once()
+
+        Wakeup.notify('<id>')
+        Wakeup.notify('<id>')
+
+    def test_notify_running_dispatcher(self):
+        flexmock(Dispatcher).should_receive('apply_async').never()
+
+        # Dispatcher is running, there is no parked continuation - it should be rescheduled immediately once parked.
+        assert Wakeup.claim('<id>', 1) is True
+        Wakeup.notify('<id>')
+        assert Wakeup.park('<id>', {'flow_name': 'flow1', 'wakeup_sequence': 2}, 'queue_flow1') is True
+
+    def test_dispatcher_park(self):
+        def my_retry(args, kwargs, countdown, queue):
+            assert countdown == 2
+            assert queue == 'queue_flow1'
+            assert kwargs['wakeup_sequence'] == 1
+            raise RuntimeError()
+
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, eager_wakeup={'flow1': True})
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(RuntimeError):
+            dispatcher.run('flow1')
+
+        continuation = json.loads(self.backend.get('selinon-wakeup-<id>'))
+        assert continuation['queue'] == 'queue_flow1'
+        assert continuation['kwargs']['wakeup_sequence'] == 1
+        assert continuation['kwargs']['flow_name'] == 'flow1'
+
+    def test_dispatcher_merged(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, eager_wakeup={'flow1': True})
+        flexmock(SystemState).should_receive('update').never()
+
+        assert Wakeup.claim('<id>', 3) is True
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+
+        with pytest.raises(Ignore):
+            dispatcher.run('flow1', wakeup_sequence=3)
+
+    def test_subflow_parent_dispatcher_id(self):
+        #
+        # flow1:
+        #
+        #     flow2     flow3
+        #
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['flow2', 'flow3'], 'condition': self.cond_true}],
+            'flow2': [],
+            'flow3': []
+        }
+        self.init(edge_table, eager_wakeup={'flow1': True}, nowait_nodes={'flow1': ['flow3']})
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+
+        assert self.get_flow('flow2').kwargs['parent_dispatcher_id'] == id(self)
+        assert 'parent_dispatcher_id' not in self.get_flow('flow3').kwargs
@@ -9,9 +9,10 @@ from selinon import DataStorage
 
 
 class MySimpleStorage(DataStorage):
-    def __init__(self, connection_string):
+    def __init__(self, connection_string, ttl=None):
         super().__init__()
         self.connection_string = connection_string
+        self.ttl = ttl
 
     def is_connected(self):
         pass